@@ -0,0 +1,252 @@
+import json
+import math
+import multiprocessing
+import threading
+import time
+import zlib
+
+from blinker import Namespace
+from flask import g
+from flask import request
+from flask import session
+
+
+# views changing the data, which rate limiting and admission control apply to
+BOOKING_ENDPOINTS = (
+    'pages.purchase_places', 'pages.cancel_places', 'pages.join_waitlist', 'pages.leave_waitlist',
+    'api.create_booking', 'api.create_bookings', 'api.create_cancellation', 'api.join_waitlist',
+)
+
+# buckets per kind of key in shared memory, keys hashing to the same slot sharing a bucket
+SHARED_SLOTS = 65536
+
+LOCK_STRIPES = 64
+
+# set in the WSGI environ by a server which already took the token of the client address
+IP_ADMITTED = 'gudlft.ip_admitted'
+
+signals = Namespace()
+# sent for every booking request refused, with the reason: 'club', 'ip' or 'overloaded'
+booking_refused = signals.signal('booking-refused')
+
+
+def take_token(tokens, last, now, rate, burst):
+    """
+    Tokens left in a bucket once refilled up to now and one token taken, and the seconds to wait when there was none
+    """
+    tokens = min(burst, tokens + (now - last) * rate)
+    if tokens < 1:
+        return tokens, (1 - tokens) / rate
+    return tokens - 1, 0
+
+
+class TokenBuckets:
+    """
+    A token bucket per key, such as a club name or a client address, in process memory.
+
+    Each bucket holds up to burst tokens and gains rate tokens per second, a
+    request taking one. A bucket back to full is the same as no bucket, so
+    once there are more than max_keys of them the full ones are dropped,
+    which bounds the memory to the keys seen in the last burst / rate seconds.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> (tokens, time of the last take)
+        self._buckets = {}
+        self._purge_at = max_keys
+        self._lock = threading.Lock()
+
+    def take(self, key, now=None):
+        """
+        Takes a token for the key, returning 0, or the seconds until one is available when there is none
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens, wait = take_token(tokens, last, now, self.rate, self.burst)
+            self._buckets[key] = tokens, now
+            if len(self._buckets) > self._purge_at:
+                self._purge(now)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _purge(self, now):
+        self._buckets = {
+            key: (tokens, last) for key, (tokens, last) in self._buckets.items()
+            if tokens + (now - last) * self.rate < self.burst
+        }
+        # buckets all in use are not scanned again before their number doubled
+        self._purge_at = max(self.max_keys, 2 * len(self._buckets))
+
+
+class SharedTokenBuckets:
+    """
+    Token buckets in shared memory, for the worker processes forked afterwards to limit their clients together.
+
+    Keys are hashed onto a fixed number of slots, allocated up front: two keys
+    falling in the same slot share their bucket, which only makes the limit
+    stricter for both. Slots are guarded by striped process-shared locks.
+    """
+
+    def __init__(self, rate, burst, slots=SHARED_SLOTS, context=None):
+        context = context or multiprocessing.get_context('fork')
+        self.rate = rate
+        self.burst = burst
+        self.slots = slots
+        self.tokens = context.RawArray('d', [float(burst)] * slots)
+        # time of the last take, monotonic clocks being the same in every process
+        self.last = context.RawArray('d', slots)
+        self.locks = [context.Lock() for _ in range(LOCK_STRIPES)]
+
+    def take(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        slot = zlib.crc32(key.encode()) % self.slots
+        with self.locks[slot % LOCK_STRIPES]:
+            # a slot never taken from is full
+            last = self.last[slot] or now
+            self.tokens[slot], wait = take_token(self.tokens[slot], last, now, self.rate, self.burst)
+            self.last[slot] = now
+        return wait
+
+
+class Admission:
+    """
+    Bounds the bookings handled at once by a process, shedding the ones that cannot be handled soon.
+
+    Up to concurrency bookings run, up to queue_size more wait for one of them
+    to finish, in arrival order, for at most timeout seconds. Bookings beyond
+    the queue, or still waiting at the timeout, are refused right away rather
+    than taking a thread the reads need.
+    """
+
+    def __init__(self, concurrency, queue_size, timeout):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.running = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def enter(self):
+        """
+        Admits a booking, returning False when it is shed
+        """
+        with self._condition:
+            if self.running < self.concurrency:
+                self.running += 1
+                return True
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+            try:
+                admitted = self._condition.wait_for(lambda: self.running < self.concurrency, self.timeout)
+            finally:
+                self.waiting -= 1
+            if admitted:
+                self.running += 1
+            return admitted
+
+    def leave(self):
+        with self._condition:
+            self.running -= 1
+            self._condition.notify()
+
+
+def retry_after(seconds):
+    # whole seconds, the header allowing no fraction
+    return str(max(1, math.ceil(seconds)))
+
+
+class AdmissionControl:
+    """
+    Flask extension rate limiting the booking requests per club and per client address, and bounding them per process.
+
+    Each club and each address gets a token bucket of GUDLFT_CLUB_RATE and
+    GUDLFT_IP_RATE bookings per second, refused with 429 when it is empty. With
+    GUDLFT_ADMISSION_QUEUE set, at most GUDLFT_BOOKINGS_ADMITTED bookings run
+    at once, the queue of the next ones being bounded too, and the others are
+    refused with 503. Both answer right away with a Retry-After header, before
+    anything is looked up. The buckets are in shared memory with GUDLFT_SHARED,
+    shared by the workers; the admission bounds each process.
+
+    The club of a page is the one logged in, the club of an API call is the one
+    in its body, batches being limited per address only.
+    """
+
+    def __init__(self, app=None):
+        self.club_buckets = None
+        self.ip_buckets = None
+        self.admission = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        buckets = SharedTokenBuckets if config['GUDLFT_SHARED'] else TokenBuckets
+        if config['GUDLFT_CLUB_RATE']:
+            self.club_buckets = buckets(config['GUDLFT_CLUB_RATE'], config['GUDLFT_CLUB_BURST'])
+        if config['GUDLFT_IP_RATE']:
+            self.ip_buckets = buckets(config['GUDLFT_IP_RATE'], config['GUDLFT_IP_BURST'])
+        if config['GUDLFT_ADMISSION_QUEUE'] is not None:
+            self.admission = Admission(
+                config['GUDLFT_BOOKINGS_ADMITTED'], config['GUDLFT_ADMISSION_QUEUE'], config['GUDLFT_ADMISSION_TIMEOUT']
+            )
+        app.extensions['admission'] = self
+        app.before_request(self._admit)
+        app.teardown_request(self._leave)
+
+    def refusal(self, reason, wait, api=False):
+        """
+        Status, headers and body of a booking refused for the reason, to be retried in wait seconds
+        """
+        booking_refused.send(self, reason=reason)
+        if reason == 'overloaded':
+            status, message = 503, "Too many bookings are being handled, please try again shortly."
+        elif reason == 'club':
+            status, message = 429, "Too many bookings for this club, please try again shortly."
+        else:
+            status, message = 429, "Too many bookings from this address, please try again shortly."
+        if api:
+            body = json.dumps({'status': 'overloaded' if status == 503 else 'rate_limited', 'message': message})
+            content_type = 'application/json'
+        else:
+            body, content_type = message, 'text/plain; charset=utf-8'
+        return status, [('Content-Type', content_type), ('Retry-After', retry_after(wait))], body.encode()
+
+    def _admit(self):
+        if request.endpoint not in BOOKING_ENDPOINTS:
+            return None
+        if self.ip_buckets is not None and not request.environ.get(IP_ADMITTED):
+            wait = self.ip_buckets.take(request.remote_addr or '')
+            if wait:
+                return self._refuse('ip', wait)
+        club = self._club()
+        if self.club_buckets is not None and club is not None:
+            wait = self.club_buckets.take(club)
+            if wait:
+                return self._refuse('club', wait)
+        if self.admission is not None:
+            if not self.admission.enter():
+                return self._refuse('overloaded', self.admission.timeout)
+            g.admitted = True
+        return None
+
+    def _leave(self, exception):
+        if g.pop('admitted', False):
+            self.admission.leave()
+
+    def _club(self):
+        if request.blueprint != 'api':
+            return session.get('club')
+        body = request.get_json(silent=True)
+        club = body.get('club') if isinstance(body, dict) else None
+        return club if isinstance(club, str) else None
+
+    def _refuse(self, reason, wait):
+        status, headers, body = self.refusal(reason, wait, api=request.blueprint == 'api')
+        return body, status, headers
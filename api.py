@@ -0,0 +1,234 @@
+from flask import Blueprint
+from flask import current_app
+from flask import jsonify
+from flask import request
+from flask import session
+
+from booking import BookingError
+from schedule import now
+
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+MAX_BATCH_SIZE = 1000
+
+
+class InvalidBooking(BookingError):
+    status = 'invalid'
+
+
+class UnknownEntity(BookingError):
+    status = 'not_found'
+
+
+class NotLoggedIn(BookingError):
+    status = 'forbidden'
+
+
+STATUS_CODES = {
+    'ok': 200,
+    'invalid': 400,
+    'not_found': 404,
+    'sold_out': 409,
+    'insufficient_points': 409,
+    'over_limit': 409,
+    'not_booked': 409,
+    'started': 409,
+    'forbidden': 403,
+    'available': 409,
+    'waiting': 202,
+    'overloaded': 503,
+}
+
+
+def services():
+    return current_app.extensions['gudlft']
+
+
+def etag(moment=None):
+    """
+    ETag of the data, and with a moment of which competitions are past then
+    """
+    store = services()
+    if moment is None:
+        return store.data_tag
+    started = store.registry.last_started(moment)
+    return store.data_tag if started is None else f'{store.data_tag}-{started.isoformat()}'
+
+
+def not_modified(tag):
+    """
+    Answers a conditional GET without building the payload, when the client copy is current
+    """
+    # compressed responses carry the tag as a weak one
+    if request.if_none_match.contains_weak(tag):
+        response = current_app.response_class(status=304)
+        response.set_etag(tag)
+        return response
+    return None
+
+
+def competition_json(competition, moment):
+    return {
+        'name': competition.name,
+        'date': competition.date.isoformat(sep=' '),
+        'numberOfPlaces': competition.number_of_places,
+        'isPast': competition.date < moment,
+    }
+
+
+def club_json(club):
+    return {'name': club.name, 'points': club.points}
+
+
+def resolve(booking):
+    """
+    Club, competition and places of a booking payload, or raises the BookingError to report for it
+    """
+    if not isinstance(booking, dict):
+        raise InvalidBooking("A booking must be an object.")
+    places = booking.get('places')
+    if not isinstance(places, int) or isinstance(places, bool) or places < 1:
+        raise InvalidBooking("places must be a positive integer.")
+    for key in ('club', 'competition'):
+        if not isinstance(booking.get(key), str):
+            raise InvalidBooking(f"{key} must be a name.")
+    registry = services().registry
+    club = registry.find_club_by_name(booking.get('club'))
+    if club is None:
+        raise UnknownEntity(f"Unknown club {booking.get('club')!r}.")
+    competition = registry.find_competition(booking.get('competition'))
+    if competition is None:
+        raise UnknownEntity(f"Unknown competition {booking.get('competition')!r}.")
+    return club, competition, places
+
+
+def resolve_own(booking):
+    """
+    Club, competition and places of a payload changing the places of the club logged in, as the pages do
+    """
+    club, competition, places = resolve(booking)
+    if session.get('club') != club.name:
+        raise NotLoggedIn(f"Log in as {club.name} to change its places.")
+    return club, competition, places
+
+
+def booking_result(result, counters=True):
+    if isinstance(result, BookingError):
+        return {'status': result.status, 'message': str(result)}
+    if not counters:
+        return {'status': 'ok'}
+    return {
+        'status': 'ok',
+        'club': club_json(result.club),
+        'competition': competition_json(result.competition, now(current_app.config['GUDLFT_TIMEZONE'])),
+    }
+
+
+@api.route('/competitions')
+def list_competitions():
+    # isPast changes when a competition starts, not only with the data
+    moment = now(current_app.config['GUDLFT_TIMEZONE'])
+    tag = etag(moment)
+    response = not_modified(tag)
+    if response is None:
+        competitions = services().registry.competitions
+        response = jsonify(competitions=[competition_json(competition, moment) for competition in competitions])
+        response.set_etag(tag)
+    return response
+
+
+@api.route('/clubs')
+def list_clubs():
+    tag = etag()
+    response = not_modified(tag)
+    if response is None:
+        response = jsonify(clubs=[club_json(club) for club in services().registry.clubs])
+        response.set_etag(tag)
+    return response
+
+
+@api.route('/clubs/<club>/bookings')
+def list_club_bookings(club):
+    """
+    Places a club holds, per competition
+    """
+    found_club = services().registry.find_club_by_name(club)
+    if found_club is None:
+        return jsonify(status='not_found', message=f"Unknown club {club!r}."), 404
+    holdings = services().booking.holdings(found_club)
+    bookings = [{'competition': name, 'places': places} for name, places in sorted(holdings.items())]
+    waiting = [
+        {'competition': name, 'places': entry.places}
+        for name, entry in sorted(services().booking.waitlist.entries(found_club.name).items())
+    ]
+    return jsonify(club=club_json(found_club), bookings=bookings, waiting=waiting)
+
+
+@api.route('/bookings', methods=['POST'])
+def create_booking():
+    """
+    Books places for the club logged in, e.g. {"club": "Simply Lift", "competition": "Spring Festival", "places": 2}
+    """
+    try:
+        club, competition, places = resolve_own(request.get_json(silent=True))
+        result = services().booking.purchase(club, competition, places)
+    except BookingError as error:
+        result = error
+    result = booking_result(result)
+    return jsonify(result), STATUS_CODES[result['status']]
+
+
+@api.route('/cancellations', methods=['POST'])
+def create_cancellation():
+    """
+    Gives back places of the club logged in, e.g. {"club": "Simply Lift", "competition": "Spring Festival", "places": 2}
+    """
+    try:
+        club, competition, places = resolve_own(request.get_json(silent=True))
+        result = services().booking.cancel(club, competition, places, now(current_app.config['GUDLFT_TIMEZONE']))
+    except BookingError as error:
+        result = error
+    result = booking_result(result)
+    return jsonify(result), STATUS_CODES[result['status']]
+
+
+@api.route('/waitlist', methods=['POST'])
+def join_waitlist():
+    """
+    Puts the club logged in on the waitlist of a competition, answering 202 with the places it asked for
+    """
+    try:
+        club, competition, places = resolve_own(request.get_json(silent=True))
+        services().booking.join_waitlist(club, competition, places)
+        # the places left may be booked meanwhile, in the background
+        result = {'status': 'waiting', 'places': places}
+    except BookingError as error:
+        result = booking_result(error)
+    return jsonify(result), STATUS_CODES[result['status']]
+
+
+@api.route('/bookings/batch', methods=['POST'])
+def create_bookings():
+    """
+    Applies a batch of bookings under a single acquisition of their locks, reporting a result per booking.
+
+    Every booking must be for the club logged in, the others being refused.
+    """
+    payload = request.get_json(silent=True)
+    bookings = payload.get('bookings') if isinstance(payload, dict) else None
+    if not isinstance(bookings, list) or len(bookings) > MAX_BATCH_SIZE:
+        message = f"bookings must be a list of at most {MAX_BATCH_SIZE} bookings."
+        return jsonify(status='invalid', message=message), 400
+
+    results = [None] * len(bookings)
+    resolved = []
+    for index, booking in enumerate(bookings):
+        try:
+            resolved.append((index, resolve_own(booking)))
+        except BookingError as error:
+            results[index] = error
+    purchased = services().booking.purchase_many([booking for _, booking in resolved])
+    for (index, _), result in zip(resolved, purchased):
+        results[index] = result
+    return jsonify(results=[booking_result(result, counters=False) for result in results])
@@ -0,0 +1,270 @@
+"""
+ASGI entry point, serving the application of server.py from an event loop:
+
+    uvicorn asgi:app
+
+Connections are held by the event loop, so thousands of them cost a coroutine
+each rather than a thread. The Flask views are unchanged and still run in
+threads: reads in a pool of GUDLFT_ASGI_THREADS threads, bookings one at a time
+in arrival order through the booking queue, so that neither ever blocks the
+event loop.
+
+Booking requests over the rate limit of their client address are refused from
+the event loop, and with GUDLFT_ADMISSION_QUEUE set, so are the ones finding
+the booking queue full, see admission.py.
+"""
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import server
+from admission import BOOKING_ENDPOINTS
+from admission import IP_ADMITTED
+
+
+logger = logging.getLogger(__name__)
+
+
+class BookingQueue:
+    """
+    Bookings waiting for the booking thread, which handles them one at a time in arrival order.
+
+    A burst of bookings waits here as coroutines rather than taking the threads
+    serving the reads, and the locks of the booking service are never
+    contended. Once maxsize bookings are pending, the next ones wait for room,
+    or are shed when shed is set.
+    """
+
+    def __init__(self, maxsize=1024, shed=False):
+        self.maxsize = maxsize
+        self.shed = shed
+        self.executor = ThreadPoolExecutor(1, thread_name_prefix='gudlft-booking')
+        self._queue = None
+        self._worker = None
+
+    def start(self):
+        self._queue = asyncio.Queue(self.maxsize)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def put(self, call):
+        """
+        Queues the booking, returning False when it is shed
+        """
+        # started on first use when the server sends no lifespan events
+        if self._worker is None or self._worker.done():
+            self.start()
+        if self.shed and self._queue.full():
+            return False
+        await self._queue.put(call)
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # the bookings pending are handed over together, each hand over waiting for the GIL twice
+            calls = [await self._queue.get()]
+            while not self._queue.empty():
+                calls.append(self._queue.get_nowait())
+            try:
+                await loop.run_in_executor(self.executor, run_all, calls)
+            finally:
+                for _ in calls:
+                    self._queue.task_done()
+
+    async def close(self):
+        """
+        Waits for the pending bookings, then stops the booking thread
+        """
+        if self._worker is not None:
+            await self._queue.join()
+            self._worker.cancel()
+            self._worker = None
+        self.executor.shutdown()
+
+
+def run_all(calls):
+    for call in calls:
+        try:
+            call()
+        except Exception:
+            logger.exception("Booking failed")
+
+
+def wsgi_environ(scope, body):
+    """
+    WSGI environ of an ASGI HTTP request
+    """
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        # WSGI strings are bytes decoded as latin-1
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin1'),
+        'PATH_INFO': scope['path'].encode().decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    host, port = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'], environ['SERVER_PORT'] = host, str(port or 80)
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        key = name.decode('latin1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        value = value.decode('latin1')
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    # the body is read in full, chunked uploads included
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+class AsgiApp:
+    """
+    ASGI application running a WSGI application off the event loop
+    """
+
+    def __init__(self, wsgi_app, threads=32, booking_queue_size=1024):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='gudlft-read')
+        self.admission = wsgi_app.extensions.get('admission')
+        self.bookings = BookingQueue(
+            booking_queue_size, shed=self.admission is not None and self.admission.admission is not None
+        )
+        self.booking_paths = {
+            rule.rule for rule in wsgi_app.url_map.iter_rules() if rule.endpoint in BOOKING_ENDPOINTS
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.bookings.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.bookings.close()
+                self.executor.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        body = await read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+        ip_admitted = False
+
+        def call():
+            environ = wsgi_environ(scope, body)
+            environ[IP_ADMITTED] = ip_admitted
+            self.serve(environ, loop, messages)
+
+        if scope['method'] == 'POST' and scope['path'] in self.booking_paths:
+            refusal = None
+            ip_buckets = self.admission.ip_buckets if self.admission is not None else None
+            if ip_buckets is not None and scope.get('client'):
+                wait = ip_buckets.take(scope['client'][0])
+                if wait:
+                    refusal = 'ip', wait
+                ip_admitted = True
+            if refusal is None and not await self.bookings.put(call):
+                refusal = 'overloaded', self.admission.admission.timeout
+            if refusal is not None:
+                await self.refuse(send, scope['path'], *refusal)
+                return
+        else:
+            loop.run_in_executor(self.executor, call)
+        while True:
+            message = await messages.get()
+            await send(message)
+            if message['type'] == 'http.response.body' and not message['more_body']:
+                return
+
+    async def refuse(self, send, path, reason, wait):
+        """
+        Answers a booking request refused by the admission control, without handing it to a thread
+        """
+        status, headers, body = self.admission.refusal(reason, wait, api=path.startswith('/api/'))
+        headers = headers + [('Content-Length', str(len(body)))]
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+        })
+        await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+    def serve(self, environ, loop, messages):
+        """
+        Runs the WSGI application in a worker thread, handing its response over to the event loop as ASGI messages
+        """
+        def hand_over(message):
+            loop.call_soon_threadsafe(messages.put_nowait, message)
+
+        def start_response(status, headers, exc_info=None):
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status[:3]),
+                'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+            }
+
+        response = {}
+        # a chunk is held until the next one, the last being sent as such
+        held = b''
+        started = False
+        try:
+            body = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in body:
+                    if not chunk:
+                        continue
+                    if not started:
+                        hand_over(response['start'])
+                        started = True
+                    elif held:
+                        hand_over({'type': 'http.response.body', 'body': held, 'more_body': True})
+                    held = chunk
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        except Exception:
+            logger.exception("Request to %s failed", environ['PATH_INFO'])
+            if not started:
+                response['start'] = {'type': 'http.response.start', 'status': 500, 'headers': []}
+                held = b''
+        if not started:
+            hand_over(response['start'])
+        hand_over({'type': 'http.response.body', 'body': held, 'more_body': False})
+
+
+app = AsgiApp(
+    server.app,
+    threads=server.app.config['GUDLFT_ASGI_THREADS'],
+    booking_queue_size=server.app.config['GUDLFT_BOOKING_QUEUE'],
+)
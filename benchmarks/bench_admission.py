@@ -0,0 +1,52 @@
+"""
+Overhead of the rate limiting and admission control on the booking path.
+
+    python -m benchmarks.bench_admission [--keys 1000 100000 1000000] [--number 200000]
+
+First the cost of taking a token, from buckets in process and in shared
+memory, with that many clubs or addresses sending bookings in turn, and of
+admitting then releasing a booking. The bookings per second with every
+limit on are measured by bench_routes, as purchasePlaces:limited.
+"""
+import argparse
+import time
+
+from admission import Admission
+from admission import SharedTokenBuckets
+from admission import TokenBuckets
+
+
+def take_ns(buckets, keys, number):
+    start = time.perf_counter()
+    for i in range(number):
+        buckets.take(keys[i % len(keys)])
+    return (time.perf_counter() - start) / number * 1e9
+
+
+def admission_ns(number):
+    admission = Admission(concurrency=4, queue_size=64, timeout=1)
+    start = time.perf_counter()
+    for _ in range(number):
+        admission.enter()
+        admission.leave()
+    return (time.perf_counter() - start) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keys', type=int, nargs='+', default=[1000, 100000, 1000000])
+    parser.add_argument('--number', type=int, default=200000, help="tokens taken per measure")
+    args = parser.parse_args()
+
+    print(f"{'keys':>9}{'process ns':>12}{'shared ns':>11}")
+    for count in args.keys:
+        keys = [f"10.0.{i // 256 % 256}.{i % 256}/{i}" for i in range(count)]
+        # rates high enough to never refuse, a refusal costing the same anyway
+        in_process = take_ns(TokenBuckets(10 ** 9, 10 ** 9), keys, max(args.number, count))
+        shared = take_ns(SharedTokenBuckets(10 ** 9, 10 ** 9), keys, max(args.number, count))
+        print(f"{count:>9}{in_process:>12.0f}{shared:>11.0f}")
+    print(f"admission enter and leave: {admission_ns(args.number):.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+Throughput and latency of the WSGI server against the ASGI one, under many concurrent connections.
+
+    python -m benchmarks.bench_asgi [--connections 1000 2000] [--duration 10] [--write-ratio 0.1] [--size 1000]
+
+Each mode serves a generated dataset from its own process: Werkzeug's threaded
+server, a thread per connection, for WSGI, and `uvicorn asgi:app` for ASGI,
+uvicorn being pinned in requirements.txt. --connections keep-alive
+connections, all logged in as the same club, then send requests back to back
+for --duration seconds: the summary, booking and clubs pages, and bookings
+for --write-ratio of them.
+Connections are all opened before the clock starts.
+
+Reported are the requests per second, latency percentiles of the reads and
+of the bookings, requests failed
+(connection refused or reset, timeout, 5xx) and the threads and resident
+memory of the server at the end of the run. The client shares the machine
+with the server: compare the modes with each other, not with other benchmarks.
+"""
+import argparse
+import asyncio
+import http.client
+import os
+import random
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+from urllib.parse import urlencode
+
+import server
+from benchmarks.fixtures import write_dataset
+
+
+ROOT = os.path.dirname(os.path.abspath(server.__file__))
+
+WSGI_SERVER = (
+    "import logging, server; from werkzeug.serving import run_simple; "
+    "logging.getLogger('werkzeug').setLevel(logging.ERROR); "
+    "run_simple('127.0.0.1', {port}, server.app, threaded=True)"
+)
+
+CONTENT_LENGTH = re.compile(rb'\r\ncontent-length: *(\d+)', re.IGNORECASE)
+CHUNKED = re.compile(rb'\r\ntransfer-encoding: *chunked', re.IGNORECASE)
+CLOSE = re.compile(rb'\r\nconnection: *close', re.IGNORECASE)
+
+
+def competition_date(i):
+    return f"2{100 + i % 800}-01-01 10:00:00"
+
+
+def start_server(mode, port, paths):
+    environment = dict(
+        os.environ,
+        GUDLFT_CLUBS=paths[0],
+        GUDLFT_COMPETITIONS=paths[1],
+        GUDLFT_SNAPSHOT_CACHE='',
+        GUDLFT_PRELOAD='1',
+        # the bookings go to a hundred competitions, the max limit would reject most of them
+        GUDLFT_PLACES_MAX_LIMIT=str(10 ** 9),
+    )
+    if mode == 'wsgi':
+        command = [sys.executable, '-c', WSGI_SERVER.format(port=port)]
+    else:
+        command = [
+            sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+            '--log-level', 'warning', '--no-access-log', '--backlog', '4096',
+        ]
+    process = subprocess.Popen(command, cwd=ROOT, env=environment)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{mode} server exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def log_in(port, email):
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    body = urlencode({'email': email})
+    connection.request('POST', '/showSummary', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response.getheader('Set-Cookie').split(';', 1)[0]
+
+
+def server_usage(pid):
+    """
+    Threads and resident MiB of a process, from /proc
+    """
+    try:
+        with open(f'/proc/{pid}/status') as status_file:
+            fields = dict(line.split(':', 1) for line in status_file)
+    except OSError:
+        return None, None
+    return int(fields['Threads']), int(fields['VmRSS'].split()[0]) / 1024
+
+
+def build_requests(cookie, size):
+    """
+    Raw HTTP requests the connections pick from, bookings apart
+    """
+    def get(path):
+        return f"GET {path} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n".encode()
+
+    reads = [get('/showSummary'), get('/clubs')]
+    reads += [get(f"/book/{quote(f'competition{i}')}/club1") for i in range(min(size, 100))]
+    bookings = []
+    for i in range(min(size, 100)):
+        body = urlencode({'competition': f'competition{i}', 'places': '1'})
+        bookings.append((
+            f"POST /purchasePlaces HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n"
+            f"Content-Type: application/x-www-form-urlencoded\r\nContent-Length: {len(body)}\r\n\r\n{body}"
+        ).encode())
+    return reads, bookings
+
+
+async def read_response(reader):
+    """
+    Reads a response, returning its status and whether the server keeps the connection open
+    """
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head[9:12])
+    length = CONTENT_LENGTH.search(head)
+    if length:
+        await reader.readexactly(int(length.group(1)))
+    elif CHUNKED.search(head):
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+    return status, not CLOSE.search(head)
+
+
+async def open_connection(port, attempts=10):
+    for attempt in range(attempts):
+        try:
+            return await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            if attempt == attempts - 1:
+                raise
+            await asyncio.sleep(0.1 * (attempt + 1))
+
+
+async def load(port, connections, duration, write_ratio, requests, timeout):
+    reads, bookings = requests
+    # connections are opened a batch at a time, the WSGI server listening with a short backlog
+    batch = asyncio.Semaphore(64)
+
+    async def connect():
+        async with batch:
+            return await open_connection(port)
+
+    opened = await asyncio.gather(*(connect() for _ in range(connections)), return_exceptions=True)
+    latencies = {'read': [], 'booking': []}
+    errors = sum(isinstance(connection, Exception) for connection in opened)
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def run(connection):
+        nonlocal errors
+        reader, writer = connection
+        rng = random.Random()
+        keep_alive = True
+        while time.perf_counter() < deadline:
+            kind = 'booking' if rng.random() < write_ratio else 'read'
+            request = rng.choice(bookings if kind == 'booking' else reads)
+            sent = time.perf_counter()
+            try:
+                if not keep_alive:
+                    # a connection closed by the server is opened again, as part of the request
+                    writer.close()
+                    reader, writer = await open_connection(port)
+                writer.write(request)
+                status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+            except (OSError, EOFError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                errors += 1
+                keep_alive = False
+                continue
+            if status >= 500:
+                errors += 1
+            else:
+                latencies[kind].append(time.perf_counter() - sent)
+        writer.close()
+
+    await asyncio.gather(*(run(connection) for connection in opened if not isinstance(connection, Exception)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(ordered, share):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))] * 1000 if ordered else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+    parser.add_argument('--connections', type=int, nargs='+', default=[1000])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--size', type=int, default=1000, help="clubs and competitions in the dataset")
+    parser.add_argument('--timeout', type=float, default=30, help="seconds before a request counts as failed")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    # a descriptor per connection, on both ends
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    print(f"{'mode':<6}{'conns':>7}{'req/s':>9}{'read p50 ms':>13}{'read p99 ms':>13}"
+          f"{'booking p50 ms':>16}{'booking p99 ms':>16}{'errors':>8}{'threads':>9}{'RSS MiB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_dataset(directory, args.size, date=competition_date)
+        for connections in args.connections:
+            for mode in args.modes:
+                process = start_server(mode, args.port, paths)
+                try:
+                    requests = build_requests(log_in(args.port, 'club1@mail.com'), args.size)
+                    latencies, errors, elapsed = asyncio.run(load(
+                        args.port, connections, args.duration, args.write_ratio, requests, args.timeout
+                    ))
+                    threads, rss = server_usage(process.pid)
+                finally:
+                    process.terminate()
+                    process.wait()
+                reads, bookings = sorted(latencies['read']), sorted(latencies['booking'])
+                print(f"{mode:<6}{connections:>7}{(len(reads) + len(bookings)) / elapsed:>9.0f}"
+                      f"{percentile(reads, 0.5):>13.1f}{percentile(reads, 0.99):>13.1f}"
+                      f"{percentile(bookings, 0.5):>16.1f}{percentile(bookings, 0.99):>16.1f}{errors:>8}"
+                      f"{threads or 0:>9}{rss or 0:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Bandwidth saved against CPU spent compressing the pages, per encoding and level.
+
+    python -m benchmarks.bench_compression [--size 5000] [--levels gzip:1 gzip:6 gzip:9 br:1 br:4 br:11]
+
+Pages of a dataset of size clubs and competitions are rendered once, then
+compressed at every level: reported are their size, the compressed size and
+ratio, the time to compress one and the rate in MB/s. Brotli levels are
+skipped when the brotli package is not installed. Last, the requests per
+second of the index, sent as it is with compression off and precompressed
+with it on, the client accepting gzip.
+"""
+import argparse
+import datetime
+import time
+import timeit
+
+import compression
+import server
+from compression import compress
+from entities import Club
+from entities import Competition
+
+
+def make_client(size, enabled):
+    app = server.create_app({'GUDLFT_COMPRESSION': enabled, 'GUDLFT_PAGE_CACHE_BYTES': 0})
+    clubs = [Club(f"club{i}", f"club{i}@mail.com", 10 ** 6) for i in range(size)]
+    competitions = [
+        Competition(f"competition{i}", datetime.datetime(2100, 1, 1 + i % 28, 10), 10 ** 6) for i in range(size)
+    ]
+    app.extensions['gudlft'].registry.load(clubs, competitions)
+    client = app.test_client()
+    client.post('/showSummary', data={'email': 'club0@mail.com'})
+    return client
+
+
+def pages(client, size):
+    yield 'summary 50', client.get('/showSummary').data
+    yield f'summary {size}', client.get('/showSummary', query_string={'per_page': size}).data
+    yield f'clubs {size}', client.get('/clubs', query_string={'per_page': size}).data
+    yield 'api clubs', client.get('/api/clubs').data
+
+
+def compress_seconds(body, encoding, level):
+    number = max(1, 2 * 10 ** 6 // len(body))
+    return min(timeit.repeat(lambda: compress(body, encoding, level), number=number, repeat=3)) / number
+
+
+def index_throughput(client, requests):
+    headers = {'Accept-Encoding': 'gzip'}
+    client.get('/', headers=headers)
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.get('/', headers=headers)
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=5000)
+    parser.add_argument(
+        '--levels', nargs='+', default=['gzip:1', 'gzip:6', 'gzip:9', 'br:1', 'br:4', 'br:6', 'br:11'],
+        help="encoding:level pairs"
+    )
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+    levels = [(encoding, int(level)) for encoding, level in (pair.split(':') for pair in args.levels)]
+    if compression.brotli is None:
+        levels = [(encoding, level) for encoding, level in levels if encoding != 'br']
+
+    print(f"{'page':<16}{'bytes':>10}{'encoding':>10}{'level':>7}{'compressed':>12}{'ratio':>8}{'ms':>9}{'MB/s':>8}")
+    for name, body in pages(make_client(args.size, False), args.size):
+        for encoding, level in levels:
+            compressed = len(compress(body, encoding, level))
+            seconds = compress_seconds(body, encoding, level)
+            print(f"{name:<16}{len(body):>10}{encoding:>10}{level:>7}{compressed:>12}{len(body) / compressed:>8.1f}"
+                  f"{seconds * 1e3:>9.3f}{len(body) / seconds / 1e6:>8.0f}")
+
+    off = index_throughput(make_client(10, False), args.requests)
+    precompressed = index_throughput(make_client(10, True), args.requests)
+    print(f"index req/s: {off:.0f} uncompressed, {precompressed:.0f} precompressed")
+
+
+if __name__ == '__main__':
+    main()
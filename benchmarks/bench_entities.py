@@ -0,0 +1,125 @@
+"""
+Memory per club and per competition, as the string-valued dicts decoded from JSON vs. as entities.
+
+    python -m benchmarks.bench_entities [--clubs 1000000] [--competitions 100000]
+
+Each representation is built from a freshly decoded JSON document, the way
+the data is loaded, and measured with tracemalloc once the document is
+dropped: the names, emails and dates an entity holds are included, the
+registry indexes are not, being the same for both. The dicts get their dates
+parsed in place, as they were before the entities. Also reported are the
+size of the container object alone, the seconds spent decoding and
+converting, and the time of one counter update as a booking does it,
+int() and str() around the subtraction for the dicts.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+import timeit
+import tracemalloc
+
+from datastore import parse_clubs
+from datastore import parse_competitions
+from schedule import parse_date
+
+
+def clubs_document(count):
+    clubs = [{"name": f"club{i}", "email": f"secretary@club{i}.example", "points": str(i % 100)} for i in range(count)]
+    return json.dumps({"clubs": clubs})
+
+
+def competitions_document(count):
+    competitions = [
+        {"name": f"competition{i}", "date": f"20{30 + i % 60}-0{1 + i % 9}-1{i % 10} 10:00:00",
+         "numberOfPlaces": str(i % 100)}
+        for i in range(count)
+    ]
+    return json.dumps({"competitions": competitions})
+
+
+def retained(build):
+    """
+    Bytes still allocated by build() once it returned
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        entities = build()
+        gc.collect()
+        return entities, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def load_seconds(build):
+    gc.collect()
+    start = time.perf_counter()
+    build()
+    return time.perf_counter() - start
+
+
+def update_ns(entity, update, number=200000):
+    return timeit.timeit(lambda: update(entity), number=number) / number * 1e9
+
+
+def measure(kind, document, count, key, parse_dicts, parse, counter, attribute):
+    def as_dicts():
+        return parse_dicts(json.loads(document)[key])
+
+    def as_entities():
+        return parse(json.loads(document)[key])
+
+    def update_dict(entity):
+        entity[counter] = str(int(entity[counter]) - 1)
+
+    def update_entity(entity):
+        setattr(entity, attribute, getattr(entity, attribute) - 1)
+
+    rows = []
+    for representation, build, update in (('dict', as_dicts, update_dict), ('slots', as_entities, update_entity)):
+        entities, size = retained(build)
+        sample = entities[0]
+        # a counter far from 0, so that no update goes below it
+        if representation == 'dict':
+            sample[counter] = str(10 ** 9)
+        else:
+            setattr(sample, attribute, 10 ** 9)
+        rows.append((
+            kind, count, representation, size / 2 ** 20, size / count, sys.getsizeof(sample),
+            load_seconds(build), update_ns(sample, update),
+        ))
+        del entities, sample
+    return rows
+
+
+def parse_dates(competitions):
+    # dicts as they were loaded, their dates parsed in place
+    for competition in competitions:
+        competition['date'] = parse_date(competition['date'])
+    return competitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clubs', type=int, default=1000000)
+    parser.add_argument('--competitions', type=int, default=100000)
+    args = parser.parse_args()
+
+    rows = measure(
+        'clubs', clubs_document(args.clubs), args.clubs, 'clubs', list, parse_clubs, 'points', 'points'
+    )
+    rows += measure(
+        'competitions', competitions_document(args.competitions), args.competitions, 'competitions',
+        parse_dates, parse_competitions, 'numberOfPlaces', 'number_of_places'
+    )
+    print(f"{'entities':<14}{'count':>9}{'model':>7}{'MiB':>9}{'bytes/entity':>14}{'object bytes':>14}"
+          f"{'load s':>8}{'update ns':>11}")
+    for kind, count, representation, mib, per_entity, object_bytes, elapsed, update in rows:
+        print(f"{kind:<14}{count:>9}{representation:>7}{mib:>9.1f}{per_entity:>14.0f}{object_bytes:>14}"
+              f"{elapsed:>8.2f}{update:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Cost of the booking ledger as it grows: the max limit check, a booking, a reconciliation and the memory per entry.
+
+    python -m benchmarks.bench_ledger [--entries 10000 100000 1000000] [--clubs 10000] [--competitions 1000]
+
+The ledger is filled with bookings of one place spread at random over the
+clubs and competitions, recorded directly. Then are measured: the places a
+club holds on a competition, as the max limit check reads them, a booking
+through the service, a full reconciliation of the counters with the ledger,
+and the memory the entries and running totals hold, traced while recording.
+"""
+import argparse
+import datetime
+import gc
+import random
+import time
+import timeit
+import tracemalloc
+
+from booking import BookingService
+from entities import Club
+from entities import Competition
+from ledger import Ledger
+from registry import Registry
+
+
+def make_registry(clubs_count, competitions_count):
+    clubs = [Club(f"club{i}", f"club{i}@mail.com", 10 ** 9) for i in range(clubs_count)]
+    competitions = [
+        Competition(f"competition{i}", datetime.datetime(2100, 1, 1), 10 ** 9) for i in range(competitions_count)
+    ]
+    return Registry(clubs, competitions)
+
+
+def fill(ledger, registry, entries, randomizer):
+    """
+    Records entries bookings of one place and applies them to the counters, returning the bytes they hold
+    """
+    clubs, competitions = registry.clubs, registry.competitions
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for _ in range(entries):
+            club, competition = randomizer.choice(clubs), randomizer.choice(competitions)
+            ledger.record(club.name, competition.name, 1)
+            club.points -= 1
+            competition.number_of_places -= 1
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--clubs', type=int, default=10000)
+    parser.add_argument('--competitions', type=int, default=1000)
+    parser.add_argument('--number', type=int, default=20000, help="checks and bookings timed")
+    args = parser.parse_args()
+
+    print(f"{'entries':>9}{'check ns':>10}{'booking us':>12}{'reconcile s':>13}{'bytes/entry':>13}")
+    for entries in args.entries:
+        randomizer = random.Random(5)
+        registry = make_registry(args.clubs, args.competitions)
+        ledger = Ledger()
+        ledger.open(registry)
+        size = fill(ledger, registry, entries, randomizer)
+        # the counters, entries and bookings timed must not hit any limit
+        service = BookingService(registry, places_max_limit=10 ** 9, ledger=ledger)
+
+        pairs = [
+            (randomizer.choice(registry.clubs), randomizer.choice(registry.competitions)) for _ in range(args.number)
+        ]
+        names = [(club.name, competition.name) for club, competition in pairs]
+        start = time.perf_counter()
+        for club_name, competition_name in names:
+            ledger.held(club_name, competition_name)
+        check = (time.perf_counter() - start) / args.number * 1e9
+        start = time.perf_counter()
+        for club, competition in pairs:
+            service.purchase(club, competition, 1)
+        purchase = (time.perf_counter() - start) / args.number * 1e6
+        reconcile = min(timeit.repeat(service.reconcile, number=1, repeat=3))
+        assert service.reconcile() == [], "the ledger disagrees with the counters"
+        print(f"{entries:>9}{check:>10.0f}{purchase:>12.1f}{reconcile:>13.3f}{size / entries:>13.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Overhead of the /metrics instrumentation on each page, in requests per second with and without it.
+
+    python -m benchmarks.bench_metrics [--requests 2000]
+"""
+import argparse
+import tempfile
+import time
+
+from benchmarks.fixtures import best_interleaved
+from benchmarks.fixtures import make_client
+from benchmarks.fixtures import write_dataset
+
+
+ROUTES = [
+    ('index', 'get', '/', None),
+    ('login', 'post', '/showSummary', {'email': 'club0@mail.com'}),
+    ('show_summary', 'get', '/showSummary', None),
+    ('book', 'get', '/book/competition0/club0', None),
+    ('purchase_places', 'post', '/purchasePlaces', {'competition': 'competition0', 'places': '1'}),
+    ('display_clubs', 'get', '/clubs', None),
+]
+
+
+def throughput(client, method, url, data, requests):
+    send = getattr(client, method)
+    send(url, data=data)
+    start = time.perf_counter()
+    for _ in range(requests):
+        send(url, data=data)
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--size', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'route':<18}{'off req/s':>12}{'on req/s':>12}{'overhead':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_dataset(directory, args.size)
+        clients = make_client(paths, {'GUDLFT_METRICS': False}), make_client(paths, {'GUDLFT_METRICS': True})
+        for name, method, url, data in ROUTES:
+            off, on = best_interleaved(
+                [lambda client=client: throughput(client, method, url, data, args.requests) for client in clients],
+                args.rounds
+            )
+            print(f"{name:<18}{off:>12.0f}{on:>12.0f}{(off - on) / off:>10.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Render time of welcome.html and clubs.html vs. list size, with and without cached fragments.
+
+    python -m benchmarks.bench_rendering [--sizes 10 100 1000 10000]
+"""
+import argparse
+import datetime
+import time
+
+import server
+from booking import BookingService
+from entities import Club
+from entities import Competition
+from listing import Page
+
+
+def make_dataset(size):
+    clubs = [Club(f"club{i}", f"club{i}@mail.com", 1000) for i in range(size)]
+    competitions = [
+        Competition(f"competition{i}", datetime.datetime(2000 if i % 2 == 0 else 2100, 1, 1), 1000)
+        for i in range(size)
+    ]
+    return clubs, competitions
+
+
+def timed(render, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'page':<10}{'rows':>8}{'uncached ms':>14}{'cached ms':>12}{'1 booking ms':>14}")
+    for size in args.sizes:
+        app = server.create_app()
+        registry = app.extensions['gudlft'].registry
+        registry.load(*make_dataset(size))
+        # each repetition books on the same competition again, past the max limit
+        service = BookingService(registry, places_max_limit=10 ** 9)
+        club = registry.clubs[0]
+        pages = [
+            ('welcome', app.extensions['fragments']['competition'],
+             lambda: server.render_template('welcome.html', club=club, competitions=registry.competitions,
+                                            page=Page(registry.competitions, 1, size))),
+            ('clubs', app.extensions['fragments']['club'],
+             lambda: server.render_template('clubs.html', clubs=registry.clubs, club=club,
+                                            page=Page(registry.clubs, 1, size))),
+        ]
+        with app.test_request_context():
+            for name, fragments, render in pages:
+                def render_uncached():
+                    fragments.clear()
+                    render()
+
+                def render_after_booking():
+                    service.purchase(club, registry.competitions[1], 1)
+                    render()
+
+                uncached = timed(render_uncached, args.repeat)
+                render()
+                cached = timed(render, args.repeat)
+                after_booking = timed(render_after_booking, args.repeat)
+                print(f"{name:<10}{size:>8}{uncached:>14.2f}{cached:>12.2f}{after_booking:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
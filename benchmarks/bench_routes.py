@@ -0,0 +1,166 @@
+"""
+Requests per second and memory allocated per request of every page, on synthetic datasets.
+
+    python -m benchmarks.bench_routes [--sizes 10 1000 100000] [--threshold 0.25] [--update-baseline]
+
+Requests go through app.test_client(), no server needed. Each measure is the
+best of several rounds, each round running the route for at least --min-time
+seconds, which keeps the numbers steady from one run to the next on a given
+machine. Allocation is the peak memory traced by tracemalloc while handling a
+request, the lowest of three, which does not depend on timing at all. The
+bookings are measured again with the rate limits and the admission on, as
+purchasePlaces:limited.
+
+Results are compared with the baseline file, and the command exits with status
+1 when a route got slower or allocates more than the threshold allows, or is
+missing from the baseline. The baseline is machine specific: regenerate it
+with --update-baseline on the machine running the comparison.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fixtures import make_client
+from benchmarks.fixtures import write_dataset
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+ROUTES = [
+    ('index', 'get', '/', None),
+    ('login', 'post', '/showSummary', {'email': 'club1@mail.com'}),
+    ('showSummary', 'get', '/showSummary', None),
+    ('book', 'get', '/book/competition1/club1', None),
+    ('purchasePlaces', 'post', '/purchasePlaces', {'competition': 'competition1', 'places': '1'}),
+    ('clubs', 'get', '/clubs', None),
+]
+
+# every rate limit and the admission on, set high enough to never refuse, so that only the checks are timed
+LIMITED = {
+    'GUDLFT_CLUB_RATE': 10 ** 9,
+    'GUDLFT_CLUB_BURST': 10 ** 9,
+    'GUDLFT_IP_RATE': 10 ** 9,
+    'GUDLFT_IP_BURST': 10 ** 9,
+    'GUDLFT_ADMISSION_QUEUE': 64,
+}
+
+# reads are never limited
+LIMITED_ROUTES = [route for route in ROUTES if route[0] == 'purchasePlaces']
+
+
+def spread_date(i):
+    # past and upcoming competitions, as in a real dataset
+    return f"{2000 + i % 200}-{1 + i % 12:02}-{1 + i % 28:02} 10:00:00"
+
+
+def ops_per_second(request, rounds, min_time):
+    request()
+    start = time.perf_counter()
+    request()
+    iterations = max(1, int(min_time / max(time.perf_counter() - start, 1e-6)))
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            request()
+        best = min(best, (time.perf_counter() - start) / iterations)
+    return 1 / best
+
+
+def allocated_kib(request, repeat=3):
+    request()
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            request()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    # the lowest, a request sometimes also pays for a one-off cache fill
+    return min(peaks) / 1024
+
+
+def measure_routes(client, routes, rounds, min_time):
+    for name, method, url, data in routes:
+        def request():
+            response = getattr(client, method)(url, data=data)
+            assert response.status_code < 400, f"{name} answered {response.status}"
+            response.close()
+
+        yield name, {
+            'ops': round(ops_per_second(request, rounds, min_time), 1),
+            'kib': round(allocated_kib(request), 1),
+        }
+
+
+def measure(sizes, rounds, min_time):
+    results = {}
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = write_dataset(directory, size, date=spread_date)
+            client = make_client(paths, email='club1@mail.com')
+            for name, result in measure_routes(client, ROUTES, rounds, min_time):
+                results[f'{name}/{size}'] = result
+            client = make_client(paths, LIMITED, email='club1@mail.com')
+            for name, result in measure_routes(client, LIMITED_ROUTES, rounds, min_time):
+                results[f'{name}:limited/{size}'] = result
+    return results
+
+
+def regressions(results, baseline, threshold):
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            yield f"{key}: not in the baseline, regenerate it with --update-baseline"
+            continue
+        if result['ops'] < reference['ops'] * (1 - threshold):
+            yield f"{key}: {result['ops']:.0f} req/s, baseline {reference['ops']:.0f} req/s"
+        if result['kib'] > reference['kib'] * (1 + threshold):
+            yield f"{key}: {result['kib']:.1f} KiB/req, baseline {reference['kib']:.1f} KiB/req"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000])
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2)
+    parser.add_argument('--threshold', type=float, default=0.25, help="tolerated slowdown, 0.25 for 25%%")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = measure(args.sizes, args.rounds, args.min_time)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    print(f"{'route':<28}{'req/s':>10}{'baseline':>10}{'KiB/req':>10}{'baseline':>10}")
+    for key, result in results.items():
+        reference = baseline.get(key, {})
+        print(f"{key:<28}{result['ops']:>10.0f}{reference.get('ops', float('nan')):>10.0f}"
+              f"{result['kib']:>10.1f}{reference.get('kib', float('nan')):>10.1f}")
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f"Baseline written to {args.baseline}.")
+        return 0
+
+    failures = list(regressions(results, baseline, args.threshold))
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Lookups and bookings per second, in-memory JSON registry vs. SQLite repository.
+
+    python -m benchmarks.bench_sqlite [--clubs 10000] [--competitions 1000] [--operations 20000]
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from booking import BookingService
+from entities import Club
+from entities import Competition
+from registry import Registry
+from sqlite_store import SqliteBookingService
+from sqlite_store import SqliteRegistry
+
+
+def make_dataset(clubs_count, competitions_count):
+    clubs = [
+        Club(f"club{i}", f"club{i}@mail.com", 10 ** 9)
+        for i in range(clubs_count)
+    ]
+    competitions = [
+        Competition(f"competition{i}", datetime.datetime(2030, 1, 1), 10 ** 9)
+        for i in range(competitions_count)
+    ]
+    return clubs, competitions
+
+
+def measure(registry, service, operations, clubs_count, competitions_count):
+    randomizer = random.Random(7)
+    emails = [f"club{randomizer.randrange(clubs_count)}@mail.com" for _ in range(operations)]
+    start = time.perf_counter()
+    for email in emails:
+        registry.find_club_by_email(email)
+    lookups = operations / (time.perf_counter() - start)
+
+    pairs = [
+        (f"club{randomizer.randrange(clubs_count)}", f"competition{randomizer.randrange(competitions_count)}")
+        for _ in range(operations)
+    ]
+    start = time.perf_counter()
+    for club_name, competition_name in pairs:
+        club = registry.find_club_by_name(club_name)
+        competition = registry.find_competition(competition_name)
+        service.purchase(club, competition, 1)
+    bookings = operations / (time.perf_counter() - start)
+    return lookups, bookings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clubs', type=int, default=10000)
+    parser.add_argument('--competitions', type=int, default=1000)
+    parser.add_argument('--operations', type=int, default=20000)
+    args = parser.parse_args()
+
+    clubs, competitions = make_dataset(args.clubs, args.competitions)
+    print(f"{'backend':<12}{'lookups/s':>14}{'bookings/s':>14}")
+
+    registry = Registry(clubs, competitions)
+    rates = measure(registry, BookingService(registry), args.operations, args.clubs, args.competitions)
+    print(f"{'json':<12}{rates[0]:>14.0f}{rates[1]:>14.0f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        registry = SqliteRegistry(os.path.join(directory, 'gudlft.db'))
+        registry.import_json(*make_dataset(args.clubs, args.competitions))
+        rates = measure(registry, SqliteBookingService(registry), args.operations, args.clubs, args.competitions)
+    print(f"{'sqlite':<12}{rates[0]:>14.0f}{rates[1]:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
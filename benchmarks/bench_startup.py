@@ -0,0 +1,74 @@
+"""
+Startup time from the JSON files vs. from the binary snapshot cache.
+
+    python -m benchmarks.bench_startup [--sizes 1000 100000]
+
+Times both the data loading alone and an application importing and loading it in a fresh interpreter.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import server
+from dataset_cache import load_json_documents
+from datastore import parse_clubs
+from datastore import parse_competitions
+
+
+def write_dataset(directory, size):
+    clubs = [{"name": f"club {i}", "email": f"club{i}@mail.com", "points": str(i % 30)} for i in range(size)]
+    competitions = [
+        {"name": f"competition {i}", "date": f"20{20 + i % 20}-0{1 + i % 9}-1{i % 10} 10:00:00",
+         "numberOfPlaces": str(i % 40)}
+        for i in range(size)
+    ]
+    with open(os.path.join(directory, 'clubs.json'), 'w') as clubs_file:
+        json.dump({'clubs': clubs}, clubs_file)
+    with open(os.path.join(directory, 'competitions.json'), 'w') as competitions_file:
+        json.dump({'competitions': competitions}, competitions_file)
+
+
+def time_import(directory, cache):
+    environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(server.__file__)))
+    environment['GUDLFT_SNAPSHOT_CACHE'] = cache
+    start = time.perf_counter()
+    code = "import server; server.app.extensions['gudlft'].load()"
+    subprocess.run([sys.executable, '-c', code], cwd=directory, env=environment, check=True)
+    return time.perf_counter() - start
+
+
+def time_load(paths, cache_path):
+    start = time.perf_counter()
+    clubs_document, competitions_document = load_json_documents(paths, cache_path)
+    parse_clubs(clubs_document['clubs'])
+    parse_competitions(competitions_document['competitions'])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000])
+    args = parser.parse_args()
+
+    print(f"{'entities':>10}{'json load s':>14}{'cold cache s':>14}{'warm cache s':>14}"
+          f"{'import json s':>15}{'import cache s':>16}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            write_dataset(directory, size)
+            paths = [os.path.join(directory, 'clubs.json'), os.path.join(directory, 'competitions.json')]
+            cache_path = os.path.join(directory, 'cache.msgpack')
+            json_load = time_load(paths, None)
+            cold = time_load(paths, cache_path)
+            warm = time_load(paths, cache_path)
+            import_json = time_import(directory, '')
+            time_import(directory, 'cache.msgpack')
+            import_cache = time_import(directory, 'cache.msgpack')
+        print(f"{size:>10}{json_load:>14.3f}{cold:>14.3f}{warm:>14.3f}{import_json:>15.3f}{import_cache:>16.3f}")
+
+
+if __name__ == '__main__':
+    main()
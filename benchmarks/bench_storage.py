@@ -0,0 +1,69 @@
+"""
+Bookings per second with the write-ahead log, per-booking fsync vs. group commit.
+
+    python -m benchmarks.bench_storage [--bookings 2000] [--threads 1 8 32]
+"""
+import argparse
+import datetime
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from booking import BookingService
+from entities import Club
+from entities import Competition
+from registry import Registry
+from storage import Storage
+from storage import WalStorage
+
+
+def make_registry(competitions_count):
+    clubs = [
+        Club(f"club{i}", f"club{i}@mail.com", 10 ** 9)
+        for i in range(competitions_count)
+    ]
+    competitions = [
+        Competition(f"competition{i}", datetime.datetime(2030, 1, 1), 10 ** 9)
+        for i in range(competitions_count)
+    ]
+    return Registry(clubs, competitions)
+
+
+def run(storage, bookings, threads, competitions_count=64):
+    registry = make_registry(competitions_count)
+    # each club books on the same competition over and over, past the max limit
+    service = BookingService(registry, storage, places_max_limit=bookings)
+
+    def book(i):
+        # a distinct club per competition, so that bookings only contend on the log
+        service.purchase(registry.clubs[i % competitions_count], registry.competitions[i % competitions_count], 1)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(book, range(bookings)))
+    elapsed = time.perf_counter() - start
+    storage.close()
+    return bookings / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bookings', type=int, default=2000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+
+    print(f"{'mode':<24}{'threads':>8}{'bookings/s':>14}")
+    for threads in args.threads:
+        modes = [
+            ('in memory', lambda directory: Storage()),
+            ('fsync per booking', lambda directory: WalStorage(directory, group_commit=False)),
+            ('group commit', lambda directory: WalStorage(directory)),
+        ]
+        for name, make_storage in modes:
+            with tempfile.TemporaryDirectory() as directory:
+                rate = run(make_storage(directory), args.bookings, threads)
+            print(f"{name:<24}{threads:>8}{rate:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
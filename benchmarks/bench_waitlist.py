@@ -0,0 +1,77 @@
+"""
+Cost of the waitlist as it grows: joining, leaving and allocating the places released, per club, and the memory.
+
+    python -m benchmarks.bench_waitlist [--waiting 1000 10000 100000 1000000] [--number 10000]
+
+A sold out competition gets a waitlist of one place per club, joined in
+order, the memory it holds being traced meanwhile. Then number clubs picked
+at random leave it, and number places are released and allocated through the
+service, the clubs that left being skipped on the way. The times per club
+stay flat as the waitlist grows.
+"""
+import argparse
+import datetime
+import gc
+import random
+import time
+import tracemalloc
+
+from booking import BookingService
+from entities import Club
+from entities import Competition
+from registry import Registry
+
+
+def make_service(waiting):
+    clubs = [Club(f"club{i}", f"club{i}@mail.com", 10 ** 9) for i in range(waiting)]
+    competition = Competition("competition", datetime.datetime(2100, 1, 1), 0)
+    return BookingService(Registry(clubs, [competition]), places_max_limit=10 ** 9), competition
+
+
+def join(waitlist, clubs, competition):
+    """
+    Puts every club on the waitlist, returning the seconds and the bytes it took
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        for club in clubs:
+            waitlist.join(club.name, competition.name, 1)
+        elapsed = time.perf_counter() - start
+        return elapsed, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--waiting', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--number', type=int, default=10000, help="clubs leaving, and places allocated")
+    args = parser.parse_args()
+
+    print(f"{'waiting':>9}{'join us':>9}{'leave us':>10}{'allocate us':>13}{'bytes/club':>12}")
+    for waiting in args.waiting:
+        randomizer = random.Random(5)
+        service, competition = make_service(waiting)
+        clubs = service.registry.clubs
+        joined, size = join(service.waitlist, clubs, competition)
+        number = min(args.number, waiting // 2)
+
+        leaving = randomizer.sample(clubs, number)
+        start = time.perf_counter()
+        for club in leaving:
+            service.waitlist.leave(club.name, competition.name)
+        left = time.perf_counter() - start
+
+        service.registry.update_competition(competition, number_of_places=number)
+        start = time.perf_counter()
+        results = service.allocate(competition.name)
+        allocated = time.perf_counter() - start
+        assert len(results) == number and competition.number_of_places == 0, "places were not all allocated"
+        print(f"{waiting:>9}{joined / waiting * 1e6:>9.2f}{left / number * 1e6:>10.2f}"
+              f"{allocated / number * 1e6:>13.1f}{size / waiting:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
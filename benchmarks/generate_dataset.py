@@ -0,0 +1,75 @@
+"""
+Generates clubs.json and competitions.json of any size, for load tests.
+
+    python -m benchmarks.generate_dataset [--clubs 10000] [--competitions 1000] [--output-dir dataset]
+
+Entities are written in decreasing popularity: locustfile.py picks the club
+and competition at rank r with a probability proportional to 1 / r ** s
+(Zipf's law), so the first ones concentrate most of the traffic, as the few
+big clubs and events do in production. Club points and competition places
+follow the same skew, popular entities having more of them. The output is
+deterministic for a given --seed.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+
+
+def zipf_share(rank, exponent):
+    return 1 / rank ** exponent
+
+
+def generate_clubs(count, exponent, rng):
+    clubs = []
+    for rank in range(1, count + 1):
+        points = max(1, round(60 * zipf_share(rank, exponent) * rng.uniform(0.5, 1.5) * count ** 0.5))
+        clubs.append({"name": f"Club {rank:06}", "email": f"secretary@club{rank:06}.example", "points": str(points)})
+    return clubs
+
+
+def generate_competitions(count, exponent, past_ratio, rng, today=None):
+    today = today or datetime.date.today()
+    competitions = []
+    for rank in range(1, count + 1):
+        if rng.random() < past_ratio:
+            day = today - datetime.timedelta(days=rng.randint(1, 365))
+        else:
+            day = today + datetime.timedelta(days=rng.randint(1, 365))
+        moment = datetime.datetime.combine(day, datetime.time(rng.choice([9, 10, 13, 14]), rng.choice([0, 30])))
+        places = max(1, round(40 * zipf_share(rank, exponent) * rng.uniform(0.5, 1.5) * count ** 0.5))
+        competitions.append({
+            "name": f"Competition {rank:06}",
+            "date": moment.strftime("%Y-%m-%d %H:%M:%S"),
+            "numberOfPlaces": str(places)
+        })
+    return competitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clubs', type=int, default=10000)
+    parser.add_argument('--competitions', type=int, default=1000)
+    parser.add_argument('--exponent', type=float, default=1.1, help="Zipf exponent s, 0 for uniform popularity")
+    parser.add_argument('--past-ratio', type=float, default=0.2, help="share of competitions already past")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default='dataset')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    os.makedirs(args.output_dir, exist_ok=True)
+    clubs_path = os.path.join(args.output_dir, 'clubs.json')
+    competitions_path = os.path.join(args.output_dir, 'competitions.json')
+    with open(clubs_path, 'w') as clubs_file:
+        json.dump({'clubs': generate_clubs(args.clubs, args.exponent, rng)}, clubs_file, indent=4)
+    competitions = generate_competitions(args.competitions, args.exponent, args.past_ratio, rng)
+    with open(competitions_path, 'w') as competitions_file:
+        json.dump({'competitions': competitions}, competitions_file, indent=4)
+    print(f"Wrote {args.clubs} clubs to {clubs_path} and {args.competitions} competitions to {competitions_path}.")
+    print(f"Serve them with GUDLFT_CLUBS={clubs_path} GUDLFT_COMPETITIONS={competitions_path}, "
+          f"and load test with LOCUST_DATASET_DIR={args.output_dir}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+import threading
+import time
+from contextlib import ExitStack
+from contextlib import contextmanager
+
+from blinker import Namespace
+
+from ledger import Ledger
+from schedule import now
+from storage import Storage
+from waitlist import Waitlist
+from waitlist import WaitlistAllocator
+
+
+PLACES_MAX_LIMIT = 12
+
+LOCK_ORDER = {'competition': 0, 'club': 1}
+
+signals = Namespace()
+# sent with the seconds spent waiting for the locks of a booking, timed only while someone listens
+lock_waited = signals.signal('lock-waited')
+# sent for every purchase with its status, 'ok' or the status of the BookingError it was rejected with
+booking_done = signals.signal('booking-done')
+# sent with the mismatches found by every reconciliation of the counters with the ledger
+reconciled = signals.signal('reconciled')
+
+
+class BookingError(Exception):
+    status = 'error'
+
+
+class NotEnoughPlaces(BookingError):
+    status = 'sold_out'
+
+    def __init__(self, places_remaining):
+        super().__init__(f"Cannot book more places than remaining ({places_remaining}).")
+        self.places_remaining = places_remaining
+
+
+class NotEnoughPoints(BookingError):
+    status = 'insufficient_points'
+
+    def __init__(self, points):
+        super().__init__(f"Cannot book more places than points you have ({points}).")
+        self.points = points
+
+
+class OverMaxLimit(BookingError):
+    status = 'over_limit'
+
+    def __init__(self, places_max_limit, held=0):
+        if held:
+            message = f"Cannot book more than max limit ({places_max_limit}), {held} places already booked."
+        else:
+            message = f"Cannot book more than max limit ({places_max_limit})."
+        super().__init__(message)
+        self.places_max_limit = places_max_limit
+        self.held = held
+
+
+class NotBooked(BookingError):
+    status = 'not_booked'
+
+    def __init__(self, places_held):
+        super().__init__(f"Cannot cancel more places than booked ({places_held}).")
+        self.places_held = places_held
+
+
+class PlacesAvailable(BookingError):
+    status = 'available'
+
+    def __init__(self, places_remaining):
+        super().__init__(f"Places are still available ({places_remaining}), book them instead.")
+        self.places_remaining = places_remaining
+
+
+class InvalidPlaces(BookingError):
+    status = 'invalid'
+
+    def __init__(self):
+        super().__init__("Places must be a positive number.")
+
+
+class CompetitionStarted(BookingError):
+    status = 'started'
+
+    def __init__(self):
+        super().__init__("Cannot cancel places on a competition already started.")
+
+
+class Reservation:
+    """
+    Places and points held for a club on a competition, until committed or cancelled
+    """
+
+    def __init__(self, service, club, competition, places):
+        self.service = service
+        self.club = club
+        self.competition = competition
+        self.places = places
+        self.state = 'reserved'
+
+    def commit(self):
+        if self.state != 'reserved':
+            raise BookingError(f"Cannot commit a {self.state} reservation.")
+        self.state = 'committed'
+        return self
+
+    def cancel(self):
+        if self.state != 'reserved':
+            raise BookingError(f"Cannot cancel a {self.state} reservation.")
+        self.service._release(self.club, self.competition, self.places)
+        self.state = 'cancelled'
+        self.service.offer(self.competition)
+        return self
+
+
+class BookingService:
+    """
+    Books places on competitions, atomically per competition and per club.
+
+    Each competition and each club gets its own lock, so that bookings on
+    different competitions do not wait on each other. Locks are always taken
+    competition first then club, which keeps concurrent bookings deadlock free.
+
+    Every change is recorded in the storage before being applied, while the
+    locks are held, so the storage sees the changes of a competition in order.
+    It is also recorded in the ledger, which the places_max_limit applies to:
+    a club holds at most that many places on a competition, whatever the
+    number of bookings it took them in.
+
+    Clubs can wait for places on a competition without enough of them. While
+    any club waits, the places of the competition go to its waitlist first:
+    a thread books them for the clubs waiting, in the order they joined, as
+    soon as cancellations release them.
+    """
+
+    # whether the counters only change through this service, which reconcile() then checks
+    reconcile_counters = True
+
+    def __init__(self, registry, storage=None, places_max_limit=PLACES_MAX_LIMIT, ledger=None):
+        self.registry = registry
+        self.storage = storage or Storage()
+        self.places_max_limit = places_max_limit
+        self.ledger = Ledger() if ledger is None else ledger
+        self.ledger.open(registry)
+        self.waitlist = Waitlist()
+        self.allocator = WaitlistAllocator(self.allocate)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def lock_key(self, kind, name):
+        """
+        Sort key of the lock guarding an entity, competitions sorting before clubs
+        """
+        return LOCK_ORDER[kind], name
+
+    def _lock(self, key):
+        lock = self._locks.get(key)
+        if lock is None:
+            with self._locks_lock:
+                lock = self._locks.setdefault(key, threading.Lock())
+        return lock
+
+    @contextmanager
+    def locked(self, competitions=(), clubs=()):
+        """
+        Holds the locks of the given competitions and clubs, taken in a global order
+        """
+        keys = {self.lock_key('competition', competition.name) for competition in competitions}
+        keys.update(self.lock_key('club', club.name) for club in clubs)
+        with ExitStack() as stack:
+            start = time.perf_counter() if lock_waited.receivers else None
+            for key in sorted(keys):
+                stack.enter_context(self._lock(key))
+            if start is not None:
+                lock_waited.send(self, seconds=time.perf_counter() - start)
+            yield
+
+    def quiesce(self):
+        """
+        Holds every competition lock, pausing all bookings
+        """
+        return self.locked(self.registry.competitions)
+
+    def compact(self):
+        with self.quiesce():
+            self.storage.compact(self.registry, self.ledger)
+
+    def holdings(self, club):
+        """
+        Places held by a club, per competition name
+        """
+        return self.ledger.holdings(club.name)
+
+    def reconcile(self):
+        """
+        Checks the counters and the places held against the ledger, bookings being paused meanwhile
+        """
+        with self.quiesce():
+            mismatches = self.ledger.reconcile(self.registry, counters=self.reconcile_counters)
+        reconciled.send(self, mismatches=mismatches)
+        return mismatches
+
+    def check(self, club, competition, places, waitlisted=False):
+        """
+        Raises the BookingError a booking breaks, the places being kept for the waitlist unless it is waitlisted
+        """
+        if places < 1:
+            raise InvalidPlaces()
+        if not waitlisted and self.waitlist.waiting(competition.name):
+            raise NotEnoughPlaces(0)
+        if places > competition.number_of_places:
+            raise NotEnoughPlaces(competition.number_of_places)
+        if places > club.points:
+            raise NotEnoughPoints(club.points)
+        held = self.ledger.held(club.name, competition.name)
+        if held + places > self.places_max_limit:
+            raise OverMaxLimit(self.places_max_limit, held)
+
+    def reserve(self, club, competition, places):
+        """
+        Checks the booking rules and takes the places and points, as a single atomic step
+        """
+        with self.locked([competition], [club]):
+            self.check(club, competition, places)
+            self._apply(club, competition, -places)
+        self._compact_if_needed()
+        return Reservation(self, club, competition, places)
+
+    def purchase(self, club, competition, places):
+        try:
+            reservation = self.reserve(club, competition, places).commit()
+        except BookingError as error:
+            self._report([error])
+            raise
+        self._report([reservation])
+        return reservation
+
+    def purchase_many(self, bookings):
+        """
+        Books a batch of (club, competition, places) in one pass, holding the locks of all of them.
+
+        Bookings are applied in order, each one seeing the counters left by the
+        previous ones. Returns, for each booking, its committed Reservation or
+        the BookingError it was rejected with.
+        """
+        results = self._purchase_many(bookings)
+        self._report(results)
+        return results
+
+    def _purchase_many(self, bookings):
+        results = []
+        with self.locked([competition for _, competition, _ in bookings], [club for club, _, _ in bookings]):
+            for club, competition, places in bookings:
+                try:
+                    self.check(club, competition, places)
+                except BookingError as error:
+                    results.append(error)
+                    continue
+                self._apply(club, competition, -places)
+                results.append(Reservation(self, club, competition, places).commit())
+        self._compact_if_needed()
+        return results
+
+    def cancel(self, club, competition, places, moment=None):
+        """
+        Gives back places a club holds on a competition, returning them as a cancelled Reservation.
+
+        The places go to the waitlist of the competition, if any. Places on a
+        competition started at moment, the current local time by default, are kept.
+        """
+        if places < 1:
+            raise InvalidPlaces()
+        if competition.date <= (now() if moment is None else moment):
+            raise CompetitionStarted()
+        with self.locked([competition], [club]):
+            self._give_back(club, competition, places)
+        self.offer(competition)
+        reservation = Reservation(self, club, competition, places)
+        reservation.state = 'cancelled'
+        return reservation
+
+    def join_waitlist(self, club, competition, places):
+        """
+        Puts the club on the waitlist of a competition without enough places free, returning its WaitlistEntry
+        """
+        if places < 1:
+            raise InvalidPlaces()
+        with self.locked([competition], [club]):
+            if places <= self.places_left(competition) and not self.waitlist.waiting(competition.name):
+                raise PlacesAvailable(self.places_left(competition))
+            held = self.ledger.held(club.name, competition.name)
+            held += self.waitlist.waiting_for(club.name, competition.name)
+            if held + places > self.places_max_limit:
+                raise OverMaxLimit(self.places_max_limit, held)
+            entry = self.waitlist.join(club.name, competition.name, places)
+        # some places may be free already
+        self.offer(competition)
+        return entry
+
+    def leave_waitlist(self, club, competition):
+        with self.locked([competition]):
+            entry = self.waitlist.leave(club.name, competition.name)
+        # the clubs behind may get the places it was waiting for
+        self.offer(competition)
+        return entry
+
+    def offer(self, competition):
+        """
+        Hands the places free on a competition to its waitlist, in the background
+        """
+        if self.waitlist.waiting(competition.name):
+            self.allocator.released(competition.name)
+
+    def allocate(self, competition_name):
+        """
+        Books the places free on a competition for the clubs on its waitlist, first come first served.
+
+        Each booking takes the locks of the competition and of the club at the
+        head of the queue, then releases them, so bookings and cancellations go
+        on meanwhile. A club gets as many of the places it waits for as are
+        free, waiting for the rest at the head of the queue. One that can no
+        longer book them, for lack of points or over the max limit, is dropped from the queue.
+        Returns the Reservation or BookingError of every booking tried.
+        """
+        results = []
+        while True:
+            competition = self.registry.find_competition(competition_name)
+            if competition is None:
+                break
+            with self.locked([competition]):
+                entry = self.waitlist.head(competition_name)
+                if entry is None:
+                    break
+                if entry.places < 1:
+                    # never bookable, it would hold the queue forever
+                    self.waitlist.reject(entry)
+                    continue
+                places = min(entry.places, self.places_left(competition))
+                if places <= 0:
+                    break
+                club = self.registry.find_club_by_name(entry.club)
+                if club is None:
+                    # removed by a reload
+                    self.waitlist.reject(entry)
+                    continue
+                with self.locked(clubs=[club]):
+                    try:
+                        self._book(club, competition, places)
+                    except NotEnoughPlaces:
+                        # taken by another process since they were counted
+                        continue
+                    except BookingError as error:
+                        self.waitlist.reject(entry)
+                        results.append(error)
+                        continue
+                    self.waitlist.allocate(entry, places)
+                results.append(Reservation(self, club, competition, places).commit())
+        self._report(results)
+        self._compact_if_needed()
+        return results
+
+    def places_left(self, competition):
+        return competition.number_of_places
+
+    def _book(self, club, competition, places):
+        """
+        Books places for a club on the waitlist, the locks of the club and of the competition being held
+        """
+        self.check(club, competition, places, waitlisted=True)
+        self._apply(club, competition, -places)
+
+    def _give_back(self, club, competition, places):
+        held = self.ledger.held(club.name, competition.name)
+        if places > held:
+            raise NotBooked(held)
+        self._apply(club, competition, places)
+
+    def _report(self, results):
+        if booking_done.receivers:
+            for result in results:
+                booking_done.send(self, status=result.status if isinstance(result, BookingError) else 'ok')
+
+    def _compact_if_needed(self):
+        if self.storage.should_compact():
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def _release(self, club, competition, places):
+        with self.locked([competition], [club]):
+            self._apply(club, competition, places)
+
+    def _apply(self, club, competition, places):
+        self.storage.record_booking(club.name, competition.name, -places)
+        self.ledger.record(club.name, competition.name, -places)
+        self.registry.update_club(club, points=club.points + places)
+        self.registry.update_competition(competition, number_of_places=competition.number_of_places + places)
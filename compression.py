@@ -0,0 +1,148 @@
+import functools
+import zlib
+
+from flask import current_app
+from flask import request
+from flask import session
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE = ('text/html', 'text/plain', 'application/json')
+
+# levels the precompressed pages are compressed at, once
+BEST_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def compressor(encoding, level):
+    """
+    compress, flush and finish functions of a stream compressed with the encoding, 'br' or 'gzip'
+    """
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=level)
+        return stream.process, stream.flush, stream.finish
+    # gzip format, its header dated 0 so that the same page gives the same bytes
+    stream = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return stream.compress, functools.partial(stream.flush, zlib.Z_SYNC_FLUSH), stream.flush
+
+
+def compress(data, encoding, level):
+    compress_chunk, _, finish = compressor(encoding, level)
+    return compress_chunk(data) + finish()
+
+
+def compress_stream(chunks, encoding, level):
+    """
+    Compresses a streamed body, the first chunk being flushed right away so that it still comes first
+    """
+    compress_chunk, flush, finish = compressor(encoding, level)
+    first = True
+    try:
+        for chunk in chunks:
+            data = compress_chunk(chunk.encode() if isinstance(chunk, str) else chunk)
+            if first and chunk:
+                data += flush()
+                first = False
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+class Compression:
+    """
+    Flask extension compressing the text responses with brotli or gzip, whichever the client prefers.
+
+    Brotli is preferred when both are accepted, and only offered when the
+    brotli package is installed. Responses under min_size bytes are sent as
+    they are, the headers of a compressed body taking more than they save.
+    Streamed pages are compressed as they are generated.
+
+    A compressed response gets a weak ETag, its bytes depending on the
+    encoding, which conditional requests compare weakly anyway. So does a 304
+    to a client accepting an encoding.
+    """
+
+    def __init__(self, app=None):
+        # (endpoint, encoding) -> (body, mimetype) of the precompressed pages
+        self.static = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.min_size = config['GUDLFT_COMPRESSION_MIN_SIZE']
+        self.levels = {'br': config['GUDLFT_BROTLI_QUALITY'], 'gzip': config['GUDLFT_GZIP_LEVEL']}
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        app.extensions['compression'] = self
+        app.after_request(self._compress)
+
+    def negotiate(self):
+        """
+        Encoding to send the response of the current request in, None to send it as it is
+        """
+        return request.accept_encodings.best_match(self.encodings)
+
+    def _compress(self, response):
+        if response.mimetype not in COMPRESSIBLE or response.direct_passthrough:
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code == 200 and 'Content-Encoding' not in response.headers:
+            self._encode(response)
+        # a 304 stands for the body the client would get, compressed when it accepts an encoding
+        if 'Content-Encoding' in response.headers or (response.status_code == 304 and self.negotiate() is not None):
+            etag, weak = response.get_etag()
+            if etag and not weak:
+                response.set_etag(etag, weak=True)
+        return response
+
+    def _encode(self, response):
+        encoding = self.negotiate()
+        if encoding is None:
+            return
+        level = self.levels[encoding]
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return
+            response.set_data(compress(data, encoding, level))
+        response.headers['Content-Encoding'] = encoding
+
+
+def precompressed(view):
+    """
+    Serves the page of a view, the same for every request, from bytes compressed once per encoding at the best level.
+
+    The page is rendered and compressed by the first request for each
+    encoding, then served without rendering nor compressing again. Pages
+    showing flashed messages are rendered every time.
+    """
+    @functools.wraps(view)
+    def precompressed_view(*args, **kwargs):
+        compression = current_app.extensions.get('compression')
+        if compression is None or '_flashes' in session:
+            return view(*args, **kwargs)
+        encoding = compression.negotiate()
+        key = request.endpoint, encoding
+        page = compression.static.get(key)
+        if page is None:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            if encoding is not None:
+                body = compress(body, encoding, BEST_LEVELS[encoding])
+            page = compression.static[key] = body, response.mimetype
+        response = current_app.response_class(page[0], mimetype=page[1])
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        return response
+    return precompressed_view
@@ -0,0 +1,57 @@
+import json
+import os
+
+try:
+    import msgpack
+    # the pure Python fallback of msgpack decodes several times slower than json
+    from msgpack import _cmsgpack  # noqa: F401
+except ImportError:
+    msgpack = None
+
+
+FORMAT = 1
+
+
+def stamp(path):
+    status = os.stat(path)
+    return [path, status.st_mtime_ns, status.st_size]
+
+
+def load_json_documents(paths, cache_path):
+    """
+    Decodes the JSON files at paths, from a msgpack snapshot at cache_path while none of them changed.
+
+    The snapshot records the modification time and size of every source file,
+    and is rebuilt as soon as one differs. Without msgpack, the files are decoded
+    directly.
+    """
+    if msgpack is None or cache_path is None:
+        return [read_json(path) for path in paths]
+    stamps = [stamp(path) for path in paths]
+    try:
+        with open(cache_path, 'rb') as cache:
+            snapshot = msgpack.unpackb(cache.read())
+        if snapshot['format'] == FORMAT and snapshot['sources'] == stamps:
+            return snapshot['documents']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    # stamps were taken before reading, a file changed meanwhile only makes the snapshot stale
+    documents = [read_json(path) for path in paths]
+    write_snapshot(cache_path, {'format': FORMAT, 'sources': stamps, 'documents': documents})
+    return documents
+
+
+def read_json(path):
+    with open(path) as source:
+        return json.load(source)
+
+
+def write_snapshot(cache_path, snapshot):
+    temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary_path, 'wb') as cache:
+            cache.write(msgpack.packb(snapshot))
+        os.replace(temporary_path, cache_path)
+    except OSError:
+        # a read-only deployment still starts, from the JSON files
+        pass
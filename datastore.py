@@ -0,0 +1,266 @@
+import gc
+import json
+import logging
+import os
+import threading
+import time
+
+from blinker import Namespace
+
+from booking import BookingService
+from dataset_cache import load_json_documents
+from entities import Club
+from entities import Competition
+from ledger import Ledger
+from ledger import Reconciler
+from registry import Registry
+from shared import SharedBookingService
+from shared import SharedRegistry
+from sqlite_store import SqliteBookingService
+from sqlite_store import SqliteRegistry
+from storage import Storage
+from storage import WalStorage
+from watcher import FileWatcher
+
+
+logger = logging.getLogger(__name__)
+
+signals = Namespace()
+# sent by a DataStore once its registry and booking service exist
+data_loaded = signals.signal('data-loaded')
+
+
+def load_clubs(path='clubs.json'):
+    with open(path) as c:
+        list_of_clubs = json.load(c)['clubs']
+        return parse_clubs(list_of_clubs)
+
+
+def load_competitions(path='competitions.json'):
+    with open(path) as comps:
+        list_of_competitions = json.load(comps)['competitions']
+        return parse_competitions(list_of_competitions)
+
+
+def parse_clubs(list_of_clubs):
+    return [Club.from_json(club) for club in list_of_clubs]
+
+
+def parse_competitions(list_of_competitions):
+    return [Competition.from_json(competition) for competition in list_of_competitions]
+
+
+def load_data(clubs_path, competitions_path, cache_path=None):
+    """
+    Clubs and competitions of the JSON files, read through the binary snapshot cache when given one
+    """
+    clubs_document, competitions_document = load_json_documents([clubs_path, competitions_path], cache_path)
+    return parse_clubs(clubs_document['clubs']), parse_competitions(competitions_document['competitions'])
+
+
+def counters(entities, counter):
+    return {entity.name: getattr(entity, counter) for entity in entities}
+
+
+def merge_entities(live, loaded_counters, entities, counter):
+    """
+    Entities of a reloaded file, the live entity being kept for every name still in the file.
+
+    Returns them along with the (live entity, fields) updates bringing the
+    kept entities to the file content. A counter changed in the file is shifted
+    by what was booked on the entity since the file was last loaded.
+    """
+    live_by_name = {entity.name: entity for entity in live}
+    merged = []
+    updates = []
+    for entity in entities:
+        current = live_by_name.get(entity.name)
+        if current is None:
+            merged.append(entity)
+            continue
+        loaded = loaded_counters[entity.name]
+        fields = {
+            key: value for key, value in entity.fields().items() if key != counter and getattr(current, key) != value
+        }
+        if getattr(entity, counter) != loaded:
+            booked = loaded - getattr(current, counter)
+            fields[counter] = max(0, getattr(entity, counter) - booked)
+        if fields:
+            updates.append((current, fields))
+        merged.append(current)
+    return merged, updates
+
+
+class DataStore:
+    """
+    Flask extension holding the registry and the booking service of an application.
+
+    Nothing is read when the application is created: the data is loaded on
+    first use, usually by the first request. preload() loads it right away,
+    which a server forking its workers (gunicorn --preload) calls beforehand so
+    that every worker starts from the same memory pages instead of loading its
+    own copy.
+
+    With GUDLFT_WATCH_INTERVAL set, the JSON files are watched and their
+    changes applied while the server runs, see reload(). With
+    GUDLFT_RECONCILE_INTERVAL set, the counters are checked against the
+    ledger of the bookings that often.
+    """
+
+    def __init__(self, app=None):
+        # tells two runs apart, data versions restarting from the same numbers
+        self.started = time.time()
+        self.boot = f'{time.time_ns():x}'
+        self._loading = threading.Lock()
+        self._modified = None
+        self._registry = None
+        self._booking = None
+        self._storage = None
+        self._watcher = None
+        self._reconciler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.config = app.config
+        app.extensions['gudlft'] = self
+
+    @property
+    def registry(self):
+        if self._registry is None:
+            self.load()
+        return self._registry
+
+    @property
+    def booking(self):
+        if self._registry is None:
+            self.load()
+        return self._booking
+
+    @property
+    def loaded(self):
+        return self._registry is not None
+
+    @property
+    def data_tag(self):
+        """
+        Version of the data as a string, changed by every booking and reload, for ETags
+        """
+        generation, updates = self.registry.data_version
+        return f'{self.boot}-{generation}-{updates}'
+
+    def last_modified(self):
+        """
+        Time the current data version was first seen, no earlier than the change itself
+        """
+        version = self.registry.data_version
+        modified = self._modified
+        if modified is None or modified[0] != version:
+            modified = self._modified = version, time.time()
+        return modified[1]
+
+    def load(self):
+        with self._loading:
+            if self._registry is not None:
+                return
+            registry, self._booking = self._open()
+            # published last, readers check it without taking the lock
+            self._registry = registry
+            if self.reloadable and self.config['GUDLFT_WATCH_INTERVAL']:
+                self._start_watcher()
+                # threads do not survive a fork, each worker watches the files itself
+                os.register_at_fork(after_in_child=self._start_watcher)
+            if self.config['GUDLFT_RECONCILE_INTERVAL']:
+                self._start_reconciler()
+                os.register_at_fork(after_in_child=self._start_reconciler)
+        data_loaded.send(self)
+
+    def preload(self):
+        """
+        Loads the data, then keeps the garbage collector off it.
+
+        The objects loaded are moved to the permanent generation, so collections
+        in forked workers do not write to their headers and the pages holding
+        them stay shared copy-on-write. Reference counting still dirties the
+        pages of the objects a worker reads.
+        """
+        self.load()
+        gc.freeze()
+
+    @property
+    def reloadable(self):
+        """
+        Whether the live data is the JSON files plus in-memory bookings, which reload() requires
+        """
+        return not (self.config['GUDLFT_DATABASE'] or self.config['GUDLFT_SHARED'] or self.config['GUDLFT_WAL_DIR'])
+
+    def reload(self):
+        """
+        Applies the changes of the JSON files to the live data, keeping the bookings made since they were loaded.
+
+        Only the entities added, removed or changed in the files are touched.
+        The new registry is built beside the live one and published with a
+        single assignment, so requests read one or the other without taking a
+        lock. Bookings are paused meanwhile, none being lost on the registry
+        being replaced.
+        """
+        clubs, competitions = load_data(*self._storage.snapshot_paths(), self.config['GUDLFT_SNAPSHOT_CACHE'])
+        loaded_counters = counters(clubs, 'points'), counters(competitions, 'number_of_places')
+        with self._loading:
+            registry = self._registry
+            with self._booking.quiesce():
+                clubs, club_updates = merge_entities(registry.clubs, self._loaded_counters[0], clubs, 'points')
+                competitions, competition_updates = merge_entities(
+                    registry.competitions, self._loaded_counters[1], competitions, 'number_of_places'
+                )
+                for entity, fields in club_updates + competition_updates:
+                    entity.update(**fields)
+                reloaded = type(registry)(clubs, competitions)
+                self._booking.registry = reloaded
+                # counters changed in the files are the new opening balances
+                self._booking.ledger.open(reloaded)
+                self._registry = reloaded
+            self._loaded_counters = loaded_counters
+        # places added to a competition go to its waitlist first
+        for competition, _ in competition_updates:
+            self._booking.offer(competition)
+        logger.info("Reloaded %d clubs and %d competitions", len(clubs), len(competitions))
+
+    def _start_watcher(self):
+        self._watcher = FileWatcher(
+            self._storage.snapshot_paths(),
+            lambda paths: self.reload(),
+            self.config['GUDLFT_WATCH_INTERVAL']
+        )
+        self._watcher.start()
+
+    def _start_reconciler(self):
+        self._reconciler = Reconciler(self._booking.reconcile, self.config['GUDLFT_RECONCILE_INTERVAL'])
+        self._reconciler.start()
+
+    def _open(self):
+        config = self.config
+        if config['GUDLFT_DATABASE']:
+            registry = SqliteRegistry(config['GUDLFT_DATABASE'])
+            return registry, SqliteBookingService(registry, config['GUDLFT_PLACES_MAX_LIMIT'])
+        if config['GUDLFT_SHARED']:
+            # counters are allocated here, workers must be forked after the store is loaded
+            registry = SharedRegistry(
+                *load_data(config['GUDLFT_CLUBS'], config['GUDLFT_COMPETITIONS'], config['GUDLFT_SNAPSHOT_CACHE'])
+            )
+            return registry, SharedBookingService(registry, places_max_limit=config['GUDLFT_PLACES_MAX_LIMIT'])
+        if config['GUDLFT_WAL_DIR']:
+            storage = WalStorage(
+                config['GUDLFT_WAL_DIR'],
+                clubs_path=config['GUDLFT_CLUBS'],
+                competitions_path=config['GUDLFT_COMPETITIONS']
+            )
+        else:
+            storage = Storage(config['GUDLFT_CLUBS'], config['GUDLFT_COMPETITIONS'])
+        clubs, competitions = load_data(*storage.snapshot_paths(), config['GUDLFT_SNAPSHOT_CACHE'])
+        self._storage = storage
+        self._loaded_counters = counters(clubs, 'points'), counters(competitions, 'number_of_places')
+        registry = Registry(clubs, competitions)
+        ledger = Ledger()
+        storage.replay(registry, ledger)
+        return registry, BookingService(registry, storage, config['GUDLFT_PLACES_MAX_LIMIT'], ledger)
@@ -0,0 +1,69 @@
+from schedule import parse_date
+
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class Entity:
+    """
+    Base of the clubs and competitions, with a fixed set of fields and no per-instance dict.
+
+    Entities compare by value and are unhashable, as the dicts they replace
+    were: caches key them by name, or by id() for the live ones.
+    """
+
+    __slots__ = ()
+
+    def fields(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def update(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ', '.join(f'{key}={value!r}' for key, value in self.fields().items())
+        return f'{type(self).__name__}({fields})'
+
+
+class Club(Entity):
+    __slots__ = ('name', 'email', 'points')
+
+    def __init__(self, name, email, points):
+        self.name = name
+        self.email = email
+        self.points = points
+
+    @classmethod
+    def from_json(cls, document):
+        return cls(document['name'], document['email'], int(document['points']))
+
+    def to_json(self):
+        return {'name': self.name, 'email': self.email, 'points': str(self.points)}
+
+
+class Competition(Entity):
+    __slots__ = ('name', 'date', 'number_of_places')
+
+    def __init__(self, name, date, number_of_places):
+        self.name = name
+        self.date = date
+        self.number_of_places = number_of_places
+
+    @classmethod
+    def from_json(cls, document):
+        return cls(document['name'], parse_date(document['date']), int(document['numberOfPlaces']))
+
+    def to_json(self):
+        return {
+            'name': self.name,
+            'date': self.date.strftime(DATE_FORMAT),
+            'numberOfPlaces': str(self.number_of_places),
+        }
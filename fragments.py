@@ -0,0 +1,36 @@
+import threading
+
+from markupsafe import Markup
+
+
+class FragmentCache:
+    """
+    Rendered fragments of a template, one per entity, re-rendered only when the entity version changes.
+
+    The template is compiled once. Each entry is replaced as a whole, so that
+    concurrent readers always get a fragment matching the version they asked for.
+    """
+
+    def __init__(self, environment, template_name):
+        self.environment = environment
+        self.template_name = template_name
+        self.template = environment.get_template(template_name)
+        self.hits = 0
+        self.misses = 0
+        self._fragments = {}
+        self._lock = threading.Lock()
+
+    def render(self, key, version, **context):
+        entry = self._fragments.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        fragment = Markup(self.template.render(**context))
+        with self._lock:
+            self._fragments[key] = (version, fragment)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
@@ -0,0 +1,191 @@
+import itertools
+import logging
+import threading
+import time
+
+from entities import Entity
+
+
+logger = logging.getLogger(__name__)
+
+# mismatches logged by a reconciliation, the others being counted only
+MISMATCHES_LOGGED = 10
+
+
+class LedgerEntry(Entity):
+    """
+    Places taken by a club on a competition, negative when given back
+    """
+
+    __slots__ = ('club', 'competition', 'places', 'time')
+
+    def __init__(self, club, competition, places, time):
+        self.club = club
+        self.competition = competition
+        self.places = places
+        self.time = time
+
+
+class Mismatch(Entity):
+    """
+    Counter disagreeing with the ledger: kind is 'club', 'competition' or 'booking', the latter for a running total
+    """
+
+    __slots__ = ('kind', 'name', 'expected', 'actual')
+
+    def __init__(self, kind, name, expected, actual):
+        self.kind = kind
+        self.name = name
+        self.expected = expected
+        self.actual = actual
+
+
+class Ledger:
+    """
+    Bookings made, in memory, with the places each club holds on each competition.
+
+    Entries are kept per club in the order they were made. The places held are
+    kept as running totals, per club then per competition, updated with every
+    entry, so checking a booking against the places a club already holds does
+    not depend on how many bookings were made.
+
+    Entries are recorded by the booking service while it holds the locks of
+    their club and competition, which orders the entries of a club and keeps
+    its totals consistent. Readers get copies.
+
+    The opening balances are the counters before the first entry, which lets
+    reconcile() check the counters of the registry against the entries.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._held = {}
+        self._carried = {}
+        self._opening = ({}, {})
+
+    def open(self, registry):
+        """
+        Takes the counters of the registry as they would be without the entries recorded so far.
+
+        Called once the data is loaded, and again when the registry is
+        replaced by one whose counters changed otherwise than by bookings.
+        """
+        clubs = {club.name: club.points for club in registry.clubs}
+        competitions = {competition.name: competition.number_of_places for competition in registry.competitions}
+        for entry in self.entries():
+            if entry.club in clubs:
+                clubs[entry.club] += entry.places
+            if entry.competition in competitions:
+                competitions[entry.competition] += entry.places
+        self._opening = clubs, competitions
+
+    def carry(self, club_name, competition_name, places):
+        """
+        Places held from before the ledger, already counted in the counters: they only add to the totals
+        """
+        key = club_name, competition_name
+        self._carried[key] = self._carried.get(key, 0) + places
+        held = self._held.setdefault(club_name, {})
+        held[competition_name] = held.get(competition_name, 0) + places
+
+    def record(self, club_name, competition_name, places):
+        self._entries.setdefault(club_name, []).append(
+            LedgerEntry(club_name, competition_name, places, time.time())
+        )
+        held = self._held.setdefault(club_name, {})
+        held[competition_name] = held.get(competition_name, 0) + places
+
+    def held(self, club_name, competition_name):
+        """
+        Places the club holds on the competition
+        """
+        return self._held.get(club_name, {}).get(competition_name, 0)
+
+    def holdings(self, club_name):
+        """
+        Places held by the club, per competition, competitions it no longer holds any place on left out
+        """
+        held = dict(self._held.get(club_name, {}))
+        return {competition: places for competition, places in held.items() if places}
+
+    def history(self, club_name):
+        return list(self._entries.get(club_name, ()))
+
+    def totals(self):
+        """
+        Places held per (club, competition), for the snapshot
+        """
+        return [
+            (club, competition, places)
+            for club, held in list(self._held.items())
+            for competition, places in list(held.items())
+            if places
+        ]
+
+    def entries(self):
+        return itertools.chain.from_iterable(list(self._entries.values()))
+
+    def __len__(self):
+        return sum(len(entries) for entries in list(self._entries.values()))
+
+    def reconcile(self, registry, counters=True):
+        """
+        Counters and running totals disagreeing with the entries, found in a single pass over them.
+
+        Bookings must be paused meanwhile. Entities no longer in the registry
+        are skipped, and so are the counters unless counters is true.
+        """
+        clubs, competitions = dict(self._opening[0]), dict(self._opening[1])
+        held = dict(self._carried)
+        for entry in self.entries():
+            if entry.club in clubs:
+                clubs[entry.club] -= entry.places
+            if entry.competition in competitions:
+                competitions[entry.competition] -= entry.places
+            key = entry.club, entry.competition
+            held[key] = held.get(key, 0) + entry.places
+        mismatches = []
+        for club in registry.clubs if counters else ():
+            expected = clubs.get(club.name, club.points)
+            if expected != club.points:
+                mismatches.append(Mismatch('club', club.name, expected, club.points))
+        for competition in registry.competitions if counters else ():
+            expected = competitions.get(competition.name, competition.number_of_places)
+            if expected != competition.number_of_places:
+                mismatches.append(Mismatch('competition', competition.name, expected, competition.number_of_places))
+        for club, competition, _ in self.totals():
+            held.setdefault((club, competition), 0)
+        for (club, competition), expected in held.items():
+            actual = self.held(club, competition)
+            if expected != actual:
+                mismatches.append(Mismatch('booking', f'{club}/{competition}', expected, actual))
+        return mismatches
+
+
+class Reconciler(threading.Thread):
+    """
+    Calls reconcile every interval seconds, logging the mismatches it returns
+    """
+
+    def __init__(self, reconcile, interval):
+        super().__init__(name='gudlft-reconciler', daemon=True)
+        self.reconcile = reconcile
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                mismatches = self.reconcile()
+            except Exception:
+                logger.exception("Reconciling the counters with the ledger failed")
+                continue
+            for mismatch in mismatches[:MISMATCHES_LOGGED]:
+                logger.warning(
+                    "%s %s is %s, %s by the ledger", mismatch.kind, mismatch.name, mismatch.actual, mismatch.expected
+                )
+            if len(mismatches) > MISMATCHES_LOGGED:
+                logger.warning("%d more mismatches with the ledger", len(mismatches) - MISMATCHES_LOGGED)
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,70 @@
+import collections.abc
+import itertools
+
+
+PER_PAGE = 50
+MAX_PER_PAGE = 5000
+
+
+class Page:
+    """
+    A page of a listing, whose items are pulled lazily from the full listing.
+
+    Only the items up to the end of the page are ever looked at, so has_next is
+    known once the page has been iterated. Sequences are indexed, only the
+    items of the page being read. A page can be iterated only once.
+    """
+
+    def __init__(self, items, number=1, size=PER_PAGE):
+        self.number = number
+        self.size = size
+        self.has_next = False
+        start = (number - 1) * size
+        if isinstance(items, collections.abc.Sequence):
+            # indexed, the items of the other pages are never read
+            end = min(start + size, len(items))
+            self._items = (items[index] for index in range(start, end))
+            self._more = end < len(items)
+        else:
+            self._items = itertools.islice(items, start, None)
+            self._more = False
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    def __iter__(self):
+        for count, item in enumerate(self._items):
+            if count == self.size:
+                self.has_next = True
+                return
+            yield item
+        self.has_next = self._more
+
+
+def page_arguments(values):
+    """
+    Page number and size from the request values, clamped to sensible bounds
+    """
+    try:
+        number = max(1, int(values.get('page', 1)))
+        size = min(MAX_PER_PAGE, max(1, int(values.get('per_page', PER_PAGE))))
+    except ValueError:
+        return 1, PER_PAGE
+    return number, size
+
+
+def filter_competitions(competitions, moment, upcoming=False, available=False):
+    if not (upcoming or available):
+        # kept as they are, so that a page reads only its own items
+        return competitions
+    return filtered_competitions(competitions, moment, upcoming, available)
+
+
+def filtered_competitions(competitions, moment, upcoming, available):
+    for competition in competitions:
+        if upcoming and competition.date < moment:
+            continue
+        if available and competition.number_of_places <= 0:
+            continue
+        yield competition
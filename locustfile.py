@@ -1,45 +1,162 @@
-from locust import HttpUser, SequentialTaskSet, task
+"""
+Load test of the booking flow, on the dataset the server runs with.
 
+Each simulated user is the secretary of a club, picked with the Zipfian
+popularity of benchmarks/generate_dataset.py: the entity at rank r of the
+files is picked with a probability proportional to 1 / r ** s. The secretary
+logs in, then keeps browsing and booking on competitions picked the same way.
+
+Settings, from the environment:
+    LOCUST_DATASET_DIR     directory of clubs.json and competitions.json, the ones served (default: .)
+    LOCUST_WRITE_RATIO     share of the actions that are bookings (default: 0.1)
+    LOCUST_ZIPF_EXPONENT   popularity skew s, 0 for uniform (default: 1.1)
+    LOCUST_MAX_PLACES      most places asked for by a booking (default: 4)
+    LOCUST_HTTP_CACHE      0 to disable the browser cache of the pages (default: 1)
+
+Besides the usual per-page statistics, every booking is reported again under
+its outcome (ok, sold_out, insufficient_points, over_limit), giving the
+latency percentiles of each outcome, and the success and rejection rates are
+printed when Locust quits.
+
+Like a browser, each user keeps the ETag of the pages it got and revalidates
+them with If-None-Match, pages not modified since being answered with 304.
+Running once with LOCUST_HTTP_CACHE=0 gives the cost of rendering them all.
+"""
+import itertools
+import json
+import os
+import random
+import time
+from urllib.parse import quote
+
+from locust import between
+from locust import events
+from locust import HttpUser
+from locust import task
+from locust.runners import WorkerRunner
+
+
+DATASET_DIR = os.environ.get('LOCUST_DATASET_DIR', '.')
+WRITE_RATIO = float(os.environ.get('LOCUST_WRITE_RATIO', '0.1'))
+ZIPF_EXPONENT = float(os.environ.get('LOCUST_ZIPF_EXPONENT', '1.1'))
+MAX_PLACES = int(os.environ.get('LOCUST_MAX_PLACES', '4'))
+HTTP_CACHE = os.environ.get('LOCUST_HTTP_CACHE', '1') not in ('', '0')
+
+# flashed message of each booking outcome, as rendered by the pages
+OUTCOMES = [
+    ("Great-booking complete!", "ok"),
+    ("Cannot book more places than remaining", "sold_out"),
+    ("Cannot book more places than points you have", "insufficient_points"),
+    ("Cannot book more than max limit", "over_limit"),
+]
+
+
+def load(name):
+    with open(os.path.join(DATASET_DIR, f'{name}.json')) as source:
+        return json.load(source)[name]
+
+
+def zipf_cumulative_weights(count, exponent):
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+CLUBS = load('clubs')
+COMPETITIONS = load('competitions')
+CLUB_WEIGHTS = zipf_cumulative_weights(len(CLUBS), ZIPF_EXPONENT)
+COMPETITION_WEIGHTS = zipf_cumulative_weights(len(COMPETITIONS), ZIPF_EXPONENT)
+
+
+def booking_outcome(page):
+    for message, outcome in OUTCOMES:
+        if message in page:
+            return outcome
+    return None
+
+
+class SecretaryUser(HttpUser):
+    wait_time = between(0.1, 5)
 
-class MyTasks(SequentialTaskSet):
-    # when locust file start executing on_start() will be called first
     def on_start(self):
-        self.client.get("/")
+        self.club = random.choices(CLUBS, cum_weights=CLUB_WEIGHTS)[0]
+        # URL -> ETag of the copy the browser holds
+        self.etags = {}
+        self.get("/")
+        # logs in, the session cookie being kept by the client
+        self.client.post("/showSummary", {"email": self.club["email"]})
 
-    @task
-    def login(self):
-        self.client.post("/showSummary",
-                         {
-                             "email": "john@simplylift.co"
-                         })
+    def get(self, url, name=None):
+        headers = {"If-None-Match": self.etags[url]} if url in self.etags else {}
+        response = self.client.get(url, headers=headers, name=name)
+        if HTTP_CACHE and response.status_code == 200 and "ETag" in response.headers:
+            self.etags[url] = response.headers["ETag"]
+        return response
 
-    @task
-    def booking_page(self):
-        self.client.get("/book/New%20Competition/Simply%20Lift")
+    def pick_competition(self):
+        return random.choices(COMPETITIONS, cum_weights=COMPETITION_WEIGHTS)[0]
 
     @task
-    def purchase_places(self):
-        self.client.post("/purchasePlaces",
-                         {
-                             "competition": "New Competition",
-                             "club": "Simply Lift",
-                             "places": "1"
-                         })
+    def act(self):
+        if random.random() < WRITE_RATIO:
+            self.purchase_places()
+        else:
+            random.choice([self.show_summary, self.booking_page, self.display_clubs])()
+
+    def show_summary(self):
+        self.get("/showSummary")
+
+    def booking_page(self):
+        competition = self.pick_competition()
+        self.get(
+            f"/book/{quote(competition['name'])}/{quote(self.club['name'])}",
+            name="/book/[competition]/[club]"
+        )
 
-    @task
     def display_clubs(self):
-        self.client.post("/clubs",
-                         {
-                             "email": "john@simplylift.co"
-                         })
+        self.get("/clubs")
 
-    @task
-    def logout(self):
-        self.client.get("/logout")
+    def purchase_places(self):
+        competition = self.pick_competition()
+        data = {
+            "competition": competition["name"],
+            "places": str(random.randint(1, MAX_PLACES))
+        }
+        start = time.perf_counter()
+        # followed to the page showing the flashed outcome
+        with self.client.post("/purchasePlaces", data, catch_response=True) as response:
+            if response.status_code != 200:
+                # reported by Locust as the failure it is
+                return
+            outcome = booking_outcome(response.text or "")
+            if outcome is None:
+                response.failure("Unknown booking outcome")
+                return
+            response.success()
+        self.environment.events.request.fire(
+            request_type="BOOKING",
+            name=outcome,
+            response_time=(time.perf_counter() - start) * 1000,
+            response_length=len(response.content or b""),
+            response=response,
+            context={},
+            exception=None,
+        )
 
 
-class MyWebsiteUser(HttpUser):
-    tasks = [MyTasks]
-    min_wait = 100  # miliseconds
-    max_wait = 5000  # miliseconds
-    # same as wait_time = between(0.100, 5)
\ No newline at end of file
+@events.quitting.add_listener
+def report_booking_outcomes(environment, **kwargs):
+    # with workers, the master holds the aggregated statistics
+    if isinstance(environment.runner, WorkerRunner):
+        return
+    entries = [entry for (_, method), entry in environment.stats.entries.items() if method == "BOOKING"]
+    total = sum(entry.num_requests for entry in entries)
+    if not total:
+        return
+    print(f"\n{'booking outcome':<22}{'count':>8}{'share':>8}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}")
+    for entry in sorted(entries, key=lambda entry: -entry.num_requests):
+        print(
+            f"{entry.name:<22}{entry.num_requests:>8}{entry.num_requests / total:>8.1%}"
+            f"{entry.get_response_time_percentile(0.5):>8.0f}{entry.get_response_time_percentile(0.95):>8.0f}"
+            f"{entry.get_response_time_percentile(0.99):>8.0f}"
+        )
+    rejected = total - sum(entry.num_requests for entry in entries if entry.name == "ok")
+    print(f"{'rejected':<22}{rejected:>8}{rejected / total:>8.1%}")
@@ -0,0 +1,204 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g
+from flask import request
+
+from admission import booking_refused
+from booking import booking_done
+from booking import lock_waited
+from booking import reconciled
+from datastore import data_loaded
+
+
+# seconds, from a cached fragment hit to a request stuck behind a compaction
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def label_value(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Counter:
+    def __init__(self, name, documentation, label):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value):
+        with self._lock:
+            self.values[value] = self.values.get(value, 0) + 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self.values.items())
+        for value, count in values:
+            lines.append(f'{self.name}{{{self.label}="{label_value(value)}"}} {count}')
+        return lines
+
+
+class Histogram:
+    """
+    Observations counted in fixed buckets per label value, rendered as cumulative Prometheus buckets
+    """
+
+    def __init__(self, name, documentation, label=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = buckets
+        self.counts = {}
+        self.sums = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            counts = self.counts.get(value)
+            if counts is None:
+                counts = self.counts[value] = [0] * (len(self.buckets) + 1)
+                self.sums[value] = 0.0
+            counts[index] += 1
+            self.sums[value] += seconds
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((value, list(counts), self.sums[value]) for value, counts in self.counts.items())
+        for value, counts, total in series:
+            labels = f'{self.label}="{label_value(value)}",' if self.label else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            labels = f'{{{labels[:-1]}}}' if labels else ''
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """
+    Flask extension timing requests and counting booking outcomes, exported at /metrics for Prometheus.
+
+    Request latency is the time to build the response, a streamed body being
+    sent afterwards. Metrics are kept per process: with several workers, each
+    one is a separate Prometheus target.
+    """
+
+    def __init__(self, app=None):
+        self.request_seconds = Histogram(
+            'gudlft_request_duration_seconds', 'Time to build the response of a request.', 'route'
+        )
+        self.phase_seconds = {
+            'lookup': Histogram(
+                'gudlft_lookup_duration_seconds', 'Time spent finding the clubs and competitions of a request.', 'route'
+            ),
+            'render': Histogram(
+                'gudlft_render_duration_seconds', 'Time spent rendering a page, streamed pages excluded.', 'template'
+            ),
+        }
+        self.lock_wait_seconds = Histogram(
+            'gudlft_booking_lock_wait_seconds', 'Time a booking waited for the locks of its club and competition.'
+        )
+        self.bookings = Counter('gudlft_bookings_total', 'Bookings attempted, by outcome.', 'outcome')
+        self.refused = Counter(
+            'gudlft_bookings_refused_total', 'Booking requests refused before being handled, by reason.', 'reason'
+        )
+        # found by the last reconciliation, none run yet while None
+        self.ledger_mismatches = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        self.page_cache = app.extensions.get('page_cache')
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        store = app.extensions['gudlft']
+        if store.loaded:
+            self._observe_bookings(store)
+        else:
+            data_loaded.connect(self._observe_bookings, store)
+        admission = app.extensions.get('admission')
+        if admission is not None:
+            booking_refused.connect(self._count_refusal, admission)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    @contextmanager
+    def timed(self, phase, label=None):
+        """
+        Times the block into the histogram of a phase of the request, labelled with its route by default
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[phase].observe(label or request.endpoint, time.perf_counter() - start)
+
+    def export(self):
+        lines = []
+        metrics = (
+            self.request_seconds, *self.phase_seconds.values(), self.lock_wait_seconds, self.bookings, self.refused
+        )
+        for metric in metrics:
+            lines.extend(metric.render())
+        if self.page_cache is not None:
+            lines.extend(self._page_cache_lines())
+        if self.ledger_mismatches is not None:
+            lines.extend([
+                '# HELP gudlft_ledger_mismatches Counters and places held found disagreeing with the ledger.',
+                '# TYPE gudlft_ledger_mismatches gauge',
+                f'gudlft_ledger_mismatches {self.ledger_mismatches}',
+            ])
+        lines.append('')
+        return '\n'.join(lines), 200, {'Content-Type': CONTENT_TYPE}
+
+    def _page_cache_lines(self):
+        cache = self.page_cache
+        return [
+            '# HELP gudlft_page_cache_requests_total Pages looked up in the rendered page cache, by result.',
+            '# TYPE gudlft_page_cache_requests_total counter',
+            f'gudlft_page_cache_requests_total{{result="hit"}} {cache.hits}',
+            f'gudlft_page_cache_requests_total{{result="miss"}} {cache.misses}',
+            '# HELP gudlft_page_cache_evictions_total Pages evicted from the page cache to stay under its size.',
+            '# TYPE gudlft_page_cache_evictions_total counter',
+            f'gudlft_page_cache_evictions_total {cache.evictions}',
+            '# HELP gudlft_page_cache_bytes Memory held by the cached pages.',
+            '# TYPE gudlft_page_cache_bytes gauge',
+            f'gudlft_page_cache_bytes {cache.size}',
+        ]
+
+    def _start_request(self):
+        g.request_start = time.perf_counter()
+
+    def _finish_request(self, response):
+        start = g.get('request_start')
+        if start is not None:
+            self.request_seconds.observe(request.endpoint or 'unmatched', time.perf_counter() - start)
+        return response
+
+    def _observe_bookings(self, store):
+        # only the bookings of this application, other ones may live in the same process
+        lock_waited.connect(self._observe_lock_wait, store.booking)
+        booking_done.connect(self._count_booking, store.booking)
+        reconciled.connect(self._count_mismatches, store.booking)
+
+    def _observe_lock_wait(self, service, seconds):
+        self.lock_wait_seconds.observe(None, seconds)
+
+    def _count_booking(self, service, status):
+        self.bookings.inc(status)
+
+    def _count_refusal(self, admission, reason):
+        self.refused.inc(reason)
+
+    def _count_mismatches(self, service, mismatches):
+        self.ledger_mismatches = len(mismatches)
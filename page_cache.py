@@ -0,0 +1,56 @@
+import collections
+import sys
+import threading
+
+
+class PageCache:
+    """
+    Rendered pages, the least recently used ones evicted once their total size goes over max_bytes.
+
+    A key holds the version of everything its page shows, so an entry never
+    goes stale: a booking changes the key of the pages showing its club or
+    competition, and the pages they had are no longer looked up, left to age
+    out. Pages showing neither are still served from the cache.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pages = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, page):
+        size = sys.getsizeof(page) + sys.getsizeof(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._pages.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._pages[key] = page, size
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._pages.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._pages)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.size = 0
@@ -0,0 +1,134 @@
+import bisect
+import itertools
+import threading
+
+from schedule import CompetitionSchedule
+
+
+class Registry:
+    """
+    In-memory store of clubs and competitions indexed by their lookup keys.
+
+    The lists keep the original file order for rendering, the dicts point to the
+    very same entities so that a booking mutating an entity is seen by both.
+
+    Every entity has a version, changed each time the entity is updated, which
+    lets caches of anything derived from an entity know when it went stale. The
+    data version changes whenever any entity does.
+    """
+
+    _generations = itertools.count(1)
+
+    def __init__(self, clubs=None, competitions=None):
+        self._updates_lock = threading.Lock()
+        self.load(clubs or [], competitions or [])
+
+    def load(self, clubs, competitions):
+        self.clubs = clubs
+        self.competitions = competitions
+        self.clubs_by_email = {club.email: club for club in clubs}
+        self.clubs_by_name = {club.name: club for club in clubs}
+        self.competitions_by_name = {competition.name: competition for competition in competitions}
+        self.generation = next(self._generations)
+        self.updates = 0
+        self.club_versions = {}
+        self.competition_versions = {}
+        self._sorted_club_names = None
+        self._sorted_competition_names = None
+        self._schedule = None
+
+    @property
+    def schedule(self):
+        if self._schedule is None:
+            self._schedule = CompetitionSchedule(self.competitions_by_name.values())
+        return self._schedule
+
+    def competitions_by_date(self):
+        return self.schedule.competitions
+
+    def upcoming_competitions(self, moment):
+        return self.schedule.upcoming(moment)
+
+    def last_started(self, moment):
+        return self.schedule.last_started(moment)
+
+    @property
+    def data_version(self):
+        return self.generation, self.updates
+
+    def bump_data_version(self):
+        with self._updates_lock:
+            self.updates += 1
+
+    def club_version(self, club):
+        return self.generation, self.club_versions.get(id(club), 0)
+
+    def competition_version(self, competition):
+        return self.generation, self.competition_versions.get(id(competition), 0)
+
+    def bump_club_version(self, club):
+        self.club_versions[id(club)] = self.club_versions.get(id(club), 0) + 1
+
+    def bump_competition_version(self, competition):
+        self.competition_versions[id(competition)] = self.competition_versions.get(id(competition), 0) + 1
+
+    def find_club_by_email(self, email):
+        return self.clubs_by_email.get(email)
+
+    def find_club_by_name(self, name):
+        return self.clubs_by_name.get(name)
+
+    def find_competition(self, name):
+        return self.competitions_by_name.get(name)
+
+    def clubs_with_prefix(self, prefix):
+        """
+        Clubs whose name starts with prefix, in name order, found by bisection over the sorted names
+        """
+        if self._sorted_club_names is None:
+            self._sorted_club_names = sorted(self.clubs_by_name)
+        for name in names_with_prefix(self._sorted_club_names, prefix):
+            yield self.find_club_by_name(name)
+
+    def competitions_with_prefix(self, prefix):
+        if self._sorted_competition_names is None:
+            self._sorted_competition_names = sorted(self.competitions_by_name)
+        for name in names_with_prefix(self._sorted_competition_names, prefix):
+            yield self.find_competition(name)
+
+    def update_club(self, club, **fields):
+        """
+        Updates a club in place, re-indexing it if one of its keys changes
+        """
+        if 'email' in fields and fields['email'] != club.email:
+            del self.clubs_by_email[club.email]
+            self.clubs_by_email[fields['email']] = club
+        if 'name' in fields and fields['name'] != club.name:
+            del self.clubs_by_name[club.name]
+            self.clubs_by_name[fields['name']] = club
+            self._sorted_club_names = None
+        club.update(**fields)
+        self.bump_club_version(club)
+        self.bump_data_version()
+
+    def update_competition(self, competition, **fields):
+        """
+        Updates a competition in place, re-indexing it if its name changes
+        """
+        if 'name' in fields and fields['name'] != competition.name:
+            del self.competitions_by_name[competition.name]
+            self.competitions_by_name[fields['name']] = competition
+            self._sorted_competition_names = None
+        if 'date' in fields:
+            self._schedule = None
+        competition.update(**fields)
+        self.bump_competition_version(competition)
+        self.bump_data_version()
+
+
+def names_with_prefix(sorted_names, prefix):
+    start = bisect.bisect_left(sorted_names, prefix)
+    for name in itertools.islice(sorted_names, start, None):
+        if not name.startswith(prefix):
+            return
+        yield name
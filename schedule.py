@@ -0,0 +1,60 @@
+import bisect
+import datetime
+import zoneinfo
+
+
+def now(timezone=None):
+    """
+    Current wall-clock time in the timezone competition dates are written in, as a naive datetime
+    """
+    if timezone is None:
+        return datetime.datetime.now()
+    return datetime.datetime.now(zoneinfo.ZoneInfo(timezone)).replace(tzinfo=None)
+
+
+def timestamp(moment, timezone=None):
+    """
+    POSIX timestamp of a naive datetime written in the given timezone, the server local time when unset
+    """
+    if timezone is not None:
+        moment = moment.replace(tzinfo=zoneinfo.ZoneInfo(timezone))
+    return moment.timestamp()
+
+
+def parse_date(value):
+    # fromisoformat is an order of magnitude faster than strptime on "%Y-%m-%d %H:%M:%S"
+    return datetime.datetime.fromisoformat(value)
+
+
+class CompetitionSchedule:
+    """
+    Competitions sorted by date, split into past and upcoming with a single bisection.
+
+    Nothing about the current time is stored: whether a competition is past is
+    decided when the schedule is read, so that a long-running server sees
+    competitions move to the past as time goes by.
+    """
+
+    def __init__(self, competitions):
+        self.competitions = sorted(competitions, key=lambda competition: competition.date)
+        self.dates = [competition.date for competition in self.competitions]
+
+    def boundary(self, moment):
+        """
+        Index of the first competition not yet started at the given moment
+        """
+        return bisect.bisect_left(self.dates, moment)
+
+    def last_started(self, moment):
+        """
+        Date of the latest competition started at the given moment, None when none has
+        """
+        boundary = self.boundary(moment)
+        return self.dates[boundary - 1] if boundary else None
+
+    def past(self, moment):
+        return self.competitions[:self.boundary(moment)]
+
+    def upcoming(self, moment):
+        competitions = self.competitions
+        return (competitions[index] for index in range(self.boundary(moment), len(competitions)))
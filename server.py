@@ -1,93 +1,515 @@
 import datetime
-import json
+import functools
+import hashlib
+import os
+from contextlib import nullcontext
+
+import click
+from flask import Blueprint
+from flask import current_app
 from flask import flash
+from flask import g
 from flask import Flask
+from flask import get_flashed_messages
 from flask import redirect
 from flask import render_template
 from flask import request
+from flask import Response
+from flask import session
+from flask import stream_with_context
 from flask import url_for
+from werkzeug.http import is_resource_modified
+
+from admission import AdmissionControl
+from api import api
+from booking import BookingError
+from booking import PLACES_MAX_LIMIT
+from compression import Compression
+from compression import precompressed
+from datastore import DataStore
+from datastore import load_clubs
+from datastore import load_competitions
+from fragments import FragmentCache
+from listing import filter_competitions
+from listing import Page
+from listing import page_arguments
+from metrics import Metrics
+from page_cache import PageCache
+from profiler import Profiler
+from schedule import now
+from schedule import timestamp
+from sessions import CookieSessionInterface
+from sqlite_store import SqliteRegistry
+
+
+# pages with more rows than this are streamed, keeping time-to-first-byte flat
+STREAM_THRESHOLD = 200
+
+pages = Blueprint('pages', __name__, cli_group=None)
+
+
+def create_app(config=None):
+    """
+    Builds an application, its data being loaded on first use unless GUDLFT_PRELOAD is set
+    """
+    app = Flask(__name__)
+    app.secret_key = 'something_special'
+    # the session holds the name of the logged in club
+    app.session_interface = CookieSessionInterface()
+    app.config.from_mapping(
+        # timezone the competition dates are written in, the server local time when unset
+        GUDLFT_TIMEZONE=os.environ.get('GUDLFT_TIMEZONE'),
+        GUDLFT_CLUBS=os.environ.get('GUDLFT_CLUBS', 'clubs.json'),
+        GUDLFT_COMPETITIONS=os.environ.get('GUDLFT_COMPETITIONS', 'competitions.json'),
+        # msgpack copy of the JSON files, rebuilt whenever they change, empty to always read the JSON files
+        GUDLFT_SNAPSHOT_CACHE=os.environ.get('GUDLFT_SNAPSHOT_CACHE', '.gudlft_cache.msgpack') or None,
+        GUDLFT_DATABASE=os.environ.get('GUDLFT_DATABASE'),
+        GUDLFT_SHARED=bool(os.environ.get('GUDLFT_SHARED')),
+        GUDLFT_WAL_DIR=os.environ.get('GUDLFT_WAL_DIR'),
+        GUDLFT_PRELOAD=bool(os.environ.get('GUDLFT_PRELOAD')),
+        # seconds between two checks of the JSON files for changes, unset to never reload them
+        GUDLFT_WATCH_INTERVAL=float(os.environ.get('GUDLFT_WATCH_INTERVAL') or 0) or None,
+        # places a club may hold on a competition, over all its bookings
+        GUDLFT_PLACES_MAX_LIMIT=int(os.environ.get('GUDLFT_PLACES_MAX_LIMIT', PLACES_MAX_LIMIT)),
+        # seconds between two reconciliations of the counters with the ledger, unset to never reconcile
+        GUDLFT_RECONCILE_INTERVAL=float(os.environ.get('GUDLFT_RECONCILE_INTERVAL') or 0) or None,
+        # memory the rendered pages are cached in, 0 to render every page
+        GUDLFT_PAGE_CACHE_BYTES=int(os.environ.get('GUDLFT_PAGE_CACHE_BYTES', 32 * 1024 * 1024)),
+        # threads serving the reads under ASGI, see asgi.py
+        GUDLFT_ASGI_THREADS=int(os.environ.get('GUDLFT_ASGI_THREADS', 32)),
+        # bookings waiting for the booking thread under ASGI before the next ones wait for room
+        GUDLFT_BOOKING_QUEUE=int(os.environ.get('GUDLFT_BOOKING_QUEUE', 1024)),
+        # bookings per second and per club, and their burst, unset to not limit the clubs
+        GUDLFT_CLUB_RATE=float(os.environ.get('GUDLFT_CLUB_RATE') or 0) or None,
+        GUDLFT_CLUB_BURST=int(os.environ.get('GUDLFT_CLUB_BURST', 10)),
+        # bookings per second and per client address, and their burst, unset to not limit the addresses
+        GUDLFT_IP_RATE=float(os.environ.get('GUDLFT_IP_RATE') or 0) or None,
+        GUDLFT_IP_BURST=int(os.environ.get('GUDLFT_IP_BURST', 20)),
+        # bookings waiting to be handled beyond which the next ones are refused, unset to admit them all
+        GUDLFT_ADMISSION_QUEUE=(
+            int(os.environ['GUDLFT_ADMISSION_QUEUE']) if os.environ.get('GUDLFT_ADMISSION_QUEUE') else None
+        ),
+        # bookings handled at once by a process under admission control, and seconds the next ones wait
+        GUDLFT_BOOKINGS_ADMITTED=int(os.environ.get('GUDLFT_BOOKINGS_ADMITTED', 4)),
+        GUDLFT_ADMISSION_TIMEOUT=float(os.environ.get('GUDLFT_ADMISSION_TIMEOUT', 2)),
+        # text responses compressed with brotli or gzip as the client accepts, on unless set to 0
+        GUDLFT_COMPRESSION=os.environ.get('GUDLFT_COMPRESSION', '1') not in ('', '0'),
+        # responses smaller than this many bytes are sent uncompressed
+        GUDLFT_COMPRESSION_MIN_SIZE=int(os.environ.get('GUDLFT_COMPRESSION_MIN_SIZE', 1024)),
+        GUDLFT_GZIP_LEVEL=int(os.environ.get('GUDLFT_GZIP_LEVEL', 6)),
+        GUDLFT_BROTLI_QUALITY=int(os.environ.get('GUDLFT_BROTLI_QUALITY', 4)),
+        # request timings and booking outcomes at /metrics, on unless set to 0
+        GUDLFT_METRICS=os.environ.get('GUDLFT_METRICS', '1') not in ('', '0'),
+        # directory of the sampled stacks, unset to never profile
+        GUDLFT_PROFILE_DIR=os.environ.get('GUDLFT_PROFILE_DIR'),
+        # fraction of the requests profiled, on top of the ones sending the X-Gudlft-Profile header
+        GUDLFT_PROFILE_RATE=float(os.environ.get('GUDLFT_PROFILE_RATE') or 0),
+        # value the X-Gudlft-Profile header must have, any value when unset
+        GUDLFT_PROFILE_TOKEN=os.environ.get('GUDLFT_PROFILE_TOKEN'),
+    )
+    app.config.update(config or {})
+
+    store = DataStore(app)
+    AdmissionControl(app)
+    if app.config['GUDLFT_PAGE_CACHE_BYTES']:
+        app.extensions['page_cache'] = PageCache(app.config['GUDLFT_PAGE_CACHE_BYTES'])
+    if app.config['GUDLFT_METRICS']:
+        Metrics(app)
+    if app.config['GUDLFT_COMPRESSION']:
+        Compression(app)
+    if app.config['GUDLFT_PROFILE_DIR']:
+        Profiler(app)
+    app.extensions['fragments'] = {
+        'competition': FragmentCache(app.jinja_env, '_competition.html'),
+        'club': FragmentCache(app.jinja_env, '_club.html'),
+    }
+    app.register_blueprint(pages)
+    app.register_blueprint(api)
+
+    # shared counters must exist before the workers are forked
+    if app.config['GUDLFT_PRELOAD'] or app.config['GUDLFT_SHARED']:
+        store.preload()
+    return app
+
+
+def data():
+    return current_app.extensions['gudlft']
+
+
+def timed(phase, label=None):
+    """
+    Times the block into the /metrics histogram of a request phase, when metrics are enabled
+    """
+    metrics = current_app.extensions.get('metrics')
+    return metrics.timed(phase, label) if metrics else nullcontext()
+
+
+def page_cache():
+    return current_app.extensions.get('page_cache')
+
+
+def render(template_name, versions=None, **context):
+    """
+    Renders a template, or takes the page from the page cache when given the versions of all it shows
+    """
+    cache = page_cache()
+    with timed('render', template_name):
+        # flashed messages are shown once, pages showing them are not cached
+        if versions is None or cache is None or '_flashes' in session:
+            return render_template(template_name, **context)
+        key = hashlib.blake2b(repr((request.path, request.query_string, versions)).encode(), digest_size=16).digest()
+        page = cache.get(key)
+        if page is None:
+            page = render_template(template_name, **context)
+            cache.put(key, page)
+        return page
 
 
-def load_clubs():
-    with open('clubs.json') as c:
-        list_of_clubs = json.load(c)['clubs']
-        return list_of_clubs
+def request_time():
+    """
+    Current time, read once per request so that a page is consistent about which competitions are past
+    """
+    if 'now' not in g:
+        g.now = now(current_app.config['GUDLFT_TIMEZONE'])
+    return g.now
 
 
-def load_competitions():
-    with open('competitions.json') as comps:
-        list_of_competitions = json.load(comps)['competitions']
-        date_format = "%Y-%m-%d %H:%M:%S"
-        for competition in list_of_competitions:
-            competition['date'] = datetime.datetime.strptime(competition["date"], date_format)
-            if competition['date'] < datetime.datetime.now():
-                competition['is_past'] = True
+@pages.app_template_global()
+def is_past(competition):
+    return competition.date < request_time()
+
+
+def competition_versions(competitions):
+    """
+    Versions of what a page shows of competitions
+    """
+    registry, moment = data().registry, request_time()
+    return tuple(
+        (competition.name, registry.competition_version(competition), competition.date < moment)
+        for competition in competitions
+    )
+
+
+def club_versions(clubs):
+    registry = data().registry
+    return tuple((club.name, registry.club_version(club)) for club in clubs)
+
+
+@pages.app_template_global()
+def competition_fragment(competition):
+    fragments = current_app.extensions['fragments']['competition']
+    version = data().registry.competition_version(competition), is_past(competition)
+    return fragments.render(competition.name, version, comp=competition)
+
+
+@pages.app_template_global()
+def club_fragment(club):
+    fragments = current_app.extensions['fragments']['club']
+    return fragments.render(club.name, data().registry.club_version(club), club=club)
+
+
+@pages.cli.command('import-json')
+@click.argument('database')
+def import_json(database):
+    """
+    Imports the clubs and competitions JSON files into an SQLite DATABASE
+    """
+    clubs_path, competitions_path = current_app.config['GUDLFT_CLUBS'], current_app.config['GUDLFT_COMPETITIONS']
+    SqliteRegistry(database).import_json(load_clubs(clubs_path), load_competitions(competitions_path))
+    click.echo(f"Imported {clubs_path} and {competitions_path} into {database}.")
+
+
+def render_listing(template_name, name, page, versions_of, versions, **context):
+    """
+    Renders a template listing the items of a page under the given name, streamed when the page is large.
+
+    Pages not streamed are cached by the versions given, those of the items
+    listed and the position of the page.
+    """
+    if page.size <= STREAM_THRESHOLD:
+        items = context[name] = list(page)
+        if page_cache() is not None:
+            versions = versions, page.number, page.size, page.has_next, versions_of(items)
+        return render(template_name, versions, page=page, **context)
+    # flashed messages are popped from the session now, the session being saved before the body is sent
+    get_flashed_messages()
+    context.update({name: page, 'page': page})
+    current_app.update_template_context(context)
+    template = current_app.jinja_env.get_template(template_name)
+    return Response(stream_with_context(template.generate(context)))
+
+
+def render_welcome(club):
+    registry = data().registry
+    values = request.values
+    upcoming = bool(values.get('upcoming'))
+    if values.get('prefix'):
+        competitions = registry.competitions_with_prefix(values['prefix'])
+    elif upcoming:
+        competitions = registry.upcoming_competitions(request_time())
+        upcoming = False
+    else:
+        competitions = registry.competitions_by_date()
+    competitions = filter_competitions(
+        competitions,
+        request_time(),
+        upcoming=upcoming,
+        available=bool(values.get('available'))
+    )
+    page = Page(competitions, *page_arguments(values))
+    return render_listing('welcome.html', 'competitions', page, competition_versions, club_versions([club]), club=club)
+
+
+def page_validators(on_data, on_schedule, on_waitlist=False):
+    """
+    ETag and Last-Modified of the page requested, from what it depends on besides the URL
+    """
+    store = data()
+    parts = [store.data_tag if on_data else store.boot, session.get('club', '')]
+    if on_waitlist:
+        # kept by each process, joining and leaving do not change the data version
+        entries = store.booking.waitlist.entries(session.get('club', ''))
+        parts.extend(f'{name}:{entry.places}' for name, entry in sorted(entries.items()))
+    modified = store.last_modified() if on_data else store.started
+    if on_schedule:
+        started = store.registry.last_started(request_time())
+        if started is not None:
+            parts.append(started.isoformat())
+            modified = max(modified, timestamp(started, current_app.config['GUDLFT_TIMEZONE']))
+    tag = hashlib.blake2b('\0'.join(parts).encode(), digest_size=12).hexdigest()
+    return tag, datetime.datetime.fromtimestamp(modified, datetime.timezone.utc)
+
+
+def conditional(on_data=True, on_schedule=False, on_waitlist=False, cache_control='private, no-cache'):
+    """
+    Answers a conditional GET of a page with 304, without calling the view, when the copy of the client is current.
+
+    A page depends on the logged in club and, unless on_data is false, on
+    the data version, which every booking and reload changes. With
+    on_schedule, it also depends on which competitions are past, and with
+    on_waitlist on the places the club waits for. Pages showing flashed
+    messages are never validated, the messages are shown once.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def conditional_view(*args, **kwargs):
+            if '_flashes' in session:
+                response = current_app.make_response(view(*args, **kwargs))
+                response.headers['Cache-Control'] = cache_control
+                return response
+            tag, modified = page_validators(on_data, on_schedule, on_waitlist)
+            if is_resource_modified(request.environ, etag=tag, last_modified=modified):
+                response = current_app.make_response(view(*args, **kwargs))
+                # redirects and errors are not cached
+                if response.status_code != 200:
+                    return response
             else:
-                competition['is_past'] = False
-        return list_of_competitions
+                response = current_app.response_class(status=304)
+            response.set_etag(tag)
+            response.last_modified = modified
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return conditional_view
+    return decorator
+
+
+def logged_in_club():
+    """
+    Club the session was logged in with, found by name, the key it is registered under
+    """
+    name = session.get('club')
+    return None if name is None else data().registry.find_club_by_name(name)
+
 
+def to_login():
+    # also for a club removed since it logged in
+    session.pop('club', None)
+    flash("Please log in with your secretary email.")
+    return redirect(url_for('pages.index'))
 
-app = Flask(__name__)
-app.secret_key = 'something_special'
 
-competitions = load_competitions()
-clubs = load_clubs()
+def places_requested():
+    """
+    Number of places posted, or None once the user was told it is not one
+    """
+    try:
+        return int(request.form['places'])
+    except ValueError:
+        flash("Please enter a number of places.")
+        return None
 
 
-@app.route('/')
+@pages.route('/')
+# the same page for everyone, shared caches may keep it too
+@conditional(on_data=False, cache_control='no-cache')
+@precompressed
 def index():
-    return render_template('index.html')
+    return render('index.html', versions=())
 
 
-@app.route('/showSummary', methods=['POST'])
-def show_summary():
-    try:
-        found_club = [c for c in clubs if c['email'] == request.form['email']][0]
-    except IndexError:
+@pages.route('/showSummary', methods=['POST'])
+def login():
+    with timed('lookup'):
+        found_club = data().registry.find_club_by_email(request.form['email'])
+    if found_club is None:
         flash("Sorry, that email wasn't found.")
-        return render_template('index.html')
-    return render_template('welcome.html', club=found_club, competitions=competitions)
+        return render('index.html')
+    session['club'] = found_club.name
+    return redirect(url_for('pages.show_summary'))
+
+
+@pages.route('/showSummary')
+@conditional(on_schedule=True)
+def show_summary():
+    with timed('lookup'):
+        club = logged_in_club()
+    if club is None:
+        return to_login()
+    return render_welcome(club)
 
 
-@app.route('/book/<competition>/<club>')
+@pages.route('/book/<competition>/<club>')
+@conditional()
 def book(competition, club):
-    try:
-        found_club = [c for c in clubs if c['name'] == club][0]
-        found_competition = [c for c in competitions if c['name'] == competition][0]
-    except IndexError:
+    with timed('lookup'):
+        found_club = logged_in_club()
+        found_competition = data().registry.find_competition(competition)
+    if found_club is None:
+        return to_login()
+    if found_club.name != club or found_competition is None:
         flash("Something went wrong-please try again")
-        return render_template('welcome.html', club=club, competitions=competitions)
-    return render_template('booking.html', club=found_club, competition=found_competition)
+        return redirect(url_for('pages.show_summary'))
+    return render(
+        'booking.html',
+        (club_versions([found_club]), competition_versions([found_competition])),
+        club=found_club,
+        competition=found_competition
+    )
 
 
-@app.route('/purchasePlaces', methods=['POST'])
+@pages.route('/purchasePlaces', methods=['POST'])
 def purchase_places():
-    competition = [c for c in competitions if c['name'] == request.form['competition']][0]
-    club = [c for c in clubs if c['name'] == request.form['club']][0]
-    places_max_limit = 12
-    places_required = int(request.form['places'])
-    places_remaining = int(competition['numberOfPlaces'])
-    if places_required > places_remaining:
-        flash(f"Cannot book more places than remaining ({places_remaining}).")
-        return render_template('booking.html', club=club, competition=competition)
-    elif places_required > int(club['points']):
-        flash(f"Cannot book more places than points you have ({club['points']}).")
-        return render_template('booking.html', club=club, competition=competition)
-    elif places_required > places_max_limit:
-        flash(f"Cannot book more than max limit ({places_max_limit}).")
-        return render_template('booking.html', club=club, competition=competition)
+    with timed('lookup'):
+        club = logged_in_club()
+        competition = data().registry.find_competition(request.form['competition'])
+    if club is None:
+        return to_login()
+    if competition is None:
+        flash("Something went wrong-please try again")
+        return redirect(url_for('pages.show_summary'))
+    places_required = places_requested()
+    if places_required is None:
+        return redirect(url_for('pages.book', competition=competition.name, club=club.name))
+    try:
+        data().booking.purchase(club, competition, places_required)
+    except BookingError as error:
+        flash(str(error))
+        return redirect(url_for('pages.book', competition=competition.name, club=club.name))
+    flash('Great-booking complete!')
+    return redirect(url_for('pages.show_summary'))
+
+
+@pages.route('/bookings')
+@conditional(on_schedule=True, on_waitlist=True)
+def show_bookings():
+    """
+    Places the logged in club holds, per competition
+    """
+    with timed('lookup'):
+        club = logged_in_club()
+    if club is None:
+        return to_login()
+    holdings = sorted(data().booking.holdings(club).items())
+    waiting = sorted((name, entry.places) for name, entry in data().booking.waitlist.entries(club.name).items())
+    registry = data().registry
+    bookings = [(name, registry.find_competition(name), places) for name, places in holdings]
+    # the cancel forms are only shown until the competitions start
+    shown = competition_versions([competition for _, competition, _ in bookings if competition is not None])
+    return render(
+        'bookings.html',
+        (club_versions([club]), tuple(holdings), tuple(waiting), shown),
+        club=club,
+        bookings=bookings,
+        waiting=waiting
+    )
+
+
+@pages.route('/cancelPlaces', methods=['POST'])
+def cancel_places():
+    with timed('lookup'):
+        club = logged_in_club()
+        competition = data().registry.find_competition(request.form['competition'])
+    if club is None:
+        return to_login()
+    if competition is None:
+        flash("Something went wrong-please try again")
+        return redirect(url_for('pages.show_bookings'))
+    places = places_requested()
+    if places is None:
+        return redirect(url_for('pages.show_bookings'))
+    try:
+        data().booking.cancel(club, competition, places, request_time())
+    except BookingError as error:
+        flash(str(error))
     else:
-        flash('Great-booking complete!')
-        club['points'] = str(int(club['points']) - places_required)
-        competition['numberOfPlaces'] = str(int(competition['numberOfPlaces']) - places_required)
-        return render_template('welcome.html', club=club, competitions=competitions)
+        flash(f"Cancelled {places} places on {competition.name}.")
+    return redirect(url_for('pages.show_bookings'))
+
 
+@pages.route('/joinWaitlist', methods=['POST'])
+def join_waitlist():
+    with timed('lookup'):
+        club = logged_in_club()
+        competition = data().registry.find_competition(request.form['competition'])
+    if club is None:
+        return to_login()
+    if competition is None:
+        flash("Something went wrong-please try again")
+        return redirect(url_for('pages.show_summary'))
+    places = places_requested()
+    if places is None:
+        return redirect(url_for('pages.book', competition=competition.name, club=club.name))
+    try:
+        data().booking.join_waitlist(club, competition, places)
+    except BookingError as error:
+        flash(str(error))
+        return redirect(url_for('pages.book', competition=competition.name, club=club.name))
+    # the places left are booked in the background, maybe already
+    flash(f"You are on the waitlist of {competition.name} for {places} places.")
+    return redirect(url_for('pages.show_bookings'))
+
+
+@pages.route('/leaveWaitlist', methods=['POST'])
+def leave_waitlist():
+    with timed('lookup'):
+        club = logged_in_club()
+        competition = data().registry.find_competition(request.form['competition'])
+    if club is None:
+        return to_login()
+    if competition is not None and data().booking.leave_waitlist(club, competition) is not None:
+        flash(f"You left the waitlist of {competition.name}.")
+    return redirect(url_for('pages.show_bookings'))
 
-@app.route('/clubs', methods=['POST'])
+
+@pages.route('/clubs')
+@conditional()
 def display_clubs():
-    return render_template('clubs.html', clubs=clubs, email=request.form['email'])
+    registry = data().registry
+    values = request.values
+    if values.get('prefix'):
+        clubs = registry.clubs_with_prefix(values['prefix'])
+    else:
+        clubs = registry.clubs
+    page = Page(clubs, *page_arguments(values))
+    club = logged_in_club()
+    # the same page for every club logged in
+    return render_listing('clubs.html', 'clubs', page, club_versions, club is not None, club=club)
 
 
-@app.route('/logout')
+@pages.route('/logout')
 def logout():
-    return redirect(url_for('index'))
+    session.clear()
+    return redirect(url_for('pages.index'))
+
+
+app = create_app()
@@ -0,0 +1,29 @@
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import URLSafeTimedSerializer
+from itsdangerous.encoding import base64_encode
+from itsdangerous.url_safe import URLSafeSerializerMixin
+
+
+class UncompressedSerializer(URLSafeTimedSerializer):
+    """
+    Signed cookie serializer that never zlib compresses the payload.
+
+    A session only holds a club name and the flashed messages: compressing
+    them saves a few bytes at the price of a 256KiB compressor state per
+    cookie written. Compressed cookies are still read.
+    """
+
+    def dump_payload(self, obj):
+        return base64_encode(super(URLSafeSerializerMixin, self).dump_payload(obj))
+
+
+class CookieSessionInterface(SecureCookieSessionInterface):
+    def get_signing_serializer(self, app):
+        if not app.secret_key:
+            return None
+        return UncompressedSerializer(
+            app.secret_key,
+            salt=self.salt,
+            serializer=self.serializer,
+            signer_kwargs={'key_derivation': self.key_derivation, 'digest_method': self.digest_method},
+        )
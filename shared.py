@@ -0,0 +1,282 @@
+import collections.abc
+import multiprocessing
+import time
+
+from booking import LOCK_ORDER
+from booking import PLACES_MAX_LIMIT
+from booking import BookingError
+from booking import BookingService
+from ledger import Ledger
+from ledger import LedgerEntry
+from registry import Registry
+
+
+LOCK_STRIPES = 64
+
+# (club, competition) pairs whose places held fit in shared memory, 16 bytes each at half load
+HELD_PAIRS = 1 << 19
+
+
+class HeldTableFull(BookingError):
+    status = 'overloaded'
+
+    def __init__(self):
+        super().__init__("Too many clubs hold places, please retry later.")
+
+
+class Refreshed(collections.abc.Sequence):
+    """
+    Entities of a list from start on, each refreshed from the shared counters only when it is read
+    """
+
+    def __init__(self, entities, refresh, start=0):
+        self.entities = entities
+        self.refresh = refresh
+        self.start = start
+
+    def __len__(self):
+        return len(self.entities) - self.start
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.refresh(self.entities[self.start + index])
+
+    def __iter__(self):
+        for index in range(self.start, len(self.entities)):
+            yield self.refresh(self.entities[index])
+
+
+class SharedRegistry(Registry):
+    """
+    Registry whose club points and competition places live in shared memory.
+
+    The counters are array-backed, one slot per entity in file order, and are
+    allocated when the registry is built. Worker processes forked afterwards
+    (gunicorn --preload, multiprocessing) all read and write the same counters,
+    the entities of each process being refreshed from them on lookup. Listings
+    refresh an entity when it is read, so a page only refreshes what it shows.
+    """
+
+    def __init__(self, clubs=None, competitions=None, context=None):
+        self.context = context or multiprocessing.get_context('fork')
+        super().__init__(clubs, competitions)
+
+    def load(self, clubs, competitions):
+        super().load(clubs, competitions)
+        self.club_slots = {club.name: slot for slot, club in enumerate(clubs)}
+        self.competition_slots = {competition.name: slot for slot, competition in enumerate(competitions)}
+        self.points = self.context.RawArray('q', [club.points for club in clubs])
+        self.places = self.context.RawArray('q', [competition.number_of_places for competition in competitions])
+        self.updates_counter = self.context.Value('q', 0)
+        self.club_versions = self.context.RawArray('q', len(clubs))
+        self.competition_versions = self.context.RawArray('q', len(competitions))
+        self.club_locks = [self.context.Lock() for _ in range(LOCK_STRIPES)]
+        self.competition_locks = [self.context.Lock() for _ in range(LOCK_STRIPES)]
+        # places held per (club, competition), hashed with linear probing, a key of 0 marking a free slot
+        self.held_slots = 2 * max(1, min(len(clubs) * len(competitions), HELD_PAIRS))
+        self.held_keys = self.context.RawArray('q', self.held_slots)
+        self.held_places = self.context.RawArray('q', self.held_slots)
+        self.held_lock = self.context.Lock()
+
+    @property
+    def clubs(self):
+        return Refreshed(self._clubs, self.refresh_club)
+
+    @clubs.setter
+    def clubs(self, clubs):
+        self._clubs = clubs
+
+    @property
+    def competitions(self):
+        return Refreshed(self._competitions, self.refresh_competition)
+
+    @competitions.setter
+    def competitions(self, competitions):
+        self._competitions = competitions
+
+    @property
+    def data_version(self):
+        return self.generation, self.updates_counter.value
+
+    def bump_data_version(self):
+        with self.updates_counter.get_lock():
+            self.updates_counter.value += 1
+
+    def competitions_by_date(self):
+        return Refreshed(super().competitions_by_date(), self.refresh_competition)
+
+    def upcoming_competitions(self, moment):
+        return Refreshed(self.schedule.competitions, self.refresh_competition, self.schedule.boundary(moment))
+
+    def club_version(self, club):
+        return self.generation, self.club_versions[self.club_slots[club.name]]
+
+    def competition_version(self, competition):
+        return self.generation, self.competition_versions[self.competition_slots[competition.name]]
+
+    def bump_club_version(self, club):
+        self.club_versions[self.club_slots[club.name]] += 1
+
+    def bump_competition_version(self, competition):
+        self.competition_versions[self.competition_slots[competition.name]] += 1
+
+    def refresh_club(self, club):
+        if club is not None:
+            club.points = self.points[self.club_slots[club.name]]
+        return club
+
+    def refresh_competition(self, competition):
+        if competition is not None:
+            competition.number_of_places = self.places[self.competition_slots[competition.name]]
+        return competition
+
+    def _held_key(self, club_name, competition_name):
+        return self.club_slots[club_name] * len(self.competition_slots) + self.competition_slots[competition_name] + 1
+
+    def _held_slot(self, key):
+        """
+        Slot of the key, or the free slot it would take, None when the table is full
+        """
+        slot = key * 0x9E3779B1 % self.held_slots
+        for _ in range(self.held_slots):
+            if self.held_keys[slot] in (key, 0):
+                return slot
+            slot = (slot + 1) % self.held_slots
+        return None
+
+    def held(self, club_name, competition_name):
+        """
+        Places the club holds on the competition, whichever process booked them
+        """
+        slot = self._held_slot(self._held_key(club_name, competition_name))
+        return 0 if slot is None else self.held_places[slot]
+
+    def add_held(self, club_name, competition_name, places):
+        """
+        Adds to the places the club holds on the competition, the locks of both being held
+        """
+        key = self._held_key(club_name, competition_name)
+        slot = self._held_slot(key)
+        if slot is None or self.held_keys[slot] != key:
+            # free slots are claimed under a lock, two pairs may probe the same one
+            with self.held_lock:
+                slot = self._held_slot(key)
+                if slot is None:
+                    raise HeldTableFull()
+                self.held_keys[slot] = key
+        self.held_places[slot] += places
+
+    def find_club_by_email(self, email):
+        return self.refresh_club(super().find_club_by_email(email))
+
+    def find_club_by_name(self, name):
+        return self.refresh_club(super().find_club_by_name(name))
+
+    def find_competition(self, name):
+        return self.refresh_competition(super().find_competition(name))
+
+    def update_club(self, club, **fields):
+        if 'name' in fields:
+            self.club_slots[fields['name']] = self.club_slots[club.name]
+        slot = self.club_slots[club.name]
+        super().update_club(club, **fields)
+        if 'points' in fields:
+            self.points[slot] = fields['points']
+
+    def update_competition(self, competition, **fields):
+        if 'name' in fields:
+            self.competition_slots[fields['name']] = self.competition_slots[competition.name]
+        slot = self.competition_slots[competition.name]
+        super().update_competition(competition, **fields)
+        if 'number_of_places' in fields:
+            self.places[slot] = fields['number_of_places']
+
+
+class SharedLedger(Ledger):
+    """
+    Ledger whose places held live in the shared memory of a SharedRegistry, the entries in the process making them.
+
+    The max limit thus applies to the places a club holds whichever process
+    booked them. The totals cannot be checked against the entries of a
+    single process, so reconcile() finds no mismatch.
+    """
+
+    def __init__(self, registry):
+        super().__init__()
+        self.registry = registry
+
+    def carry(self, club_name, competition_name, places):
+        self.registry.add_held(club_name, competition_name, places)
+
+    def record(self, club_name, competition_name, places):
+        self.registry.add_held(club_name, competition_name, places)
+        self._entries.setdefault(club_name, []).append(
+            LedgerEntry(club_name, competition_name, places, time.time())
+        )
+
+    def held(self, club_name, competition_name):
+        return self.registry.held(club_name, competition_name)
+
+    def holdings(self, club_name):
+        held = {name: self.held(club_name, name) for name in list(self.registry.competition_slots)}
+        return {competition: places for competition, places in held.items() if places}
+
+    def totals(self):
+        return [
+            (club, competition, places)
+            for club in list(self.registry.club_slots)
+            for competition, places in self.holdings(club).items()
+        ]
+
+    def reconcile(self, registry, counters=True):
+        return []
+
+
+class SharedBookingService(BookingService):
+    """
+    Books places on a SharedRegistry, with process-shared locks.
+
+    Entities are mapped onto a fixed number of lock stripes, so two
+    competitions may share a lock but a competition never has two.
+
+    The places a club holds are kept in shared memory next to the counters,
+    so the max limit applies across processes. The ledger entries and the
+    waitlist are kept by each process for the bookings it made: the counters,
+    which every process changes, are not reconciled, and places released by a
+    process go to its own waitlist.
+    """
+
+    reconcile_counters = False
+
+    def __init__(self, registry, storage=None, places_max_limit=PLACES_MAX_LIMIT, ledger=None):
+        super().__init__(registry, storage, places_max_limit, SharedLedger(registry) if ledger is None else ledger)
+
+    def lock_key(self, kind, name):
+        if kind == 'competition':
+            stripe = self.registry.competition_slots[name] % LOCK_STRIPES
+        else:
+            stripe = self.registry.club_slots[name] % LOCK_STRIPES
+        return super().lock_key(kind, stripe)
+
+    def _lock(self, key):
+        rank, stripe = key
+        if rank == LOCK_ORDER['competition']:
+            return self.registry.competition_locks[stripe]
+        return self.registry.club_locks[stripe]
+
+    def check(self, club, competition, places, waitlisted=False):
+        # another process may have booked since the lookup
+        self.registry.refresh_club(club)
+        self.registry.refresh_competition(competition)
+        super().check(club, competition, places, waitlisted)
+
+    def places_left(self, competition):
+        return self.registry.refresh_competition(competition).number_of_places
+
+    def _apply(self, club, competition, places):
+        self.registry.refresh_club(club)
+        self.registry.refresh_competition(competition)
+        super()._apply(club, competition, places)
@@ -0,0 +1,360 @@
+import sqlite3
+import threading
+import time
+
+from booking import BookingError
+from booking import BookingService
+from booking import InvalidPlaces
+from booking import lock_waited
+from booking import NotBooked
+from booking import NotEnoughPlaces
+from booking import NotEnoughPoints
+from booking import OverMaxLimit
+from booking import PLACES_MAX_LIMIT
+from booking import reconciled
+from booking import Reservation
+from entities import Club
+from entities import Competition
+from ledger import LedgerEntry
+from ledger import Mismatch
+from schedule import parse_date
+
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clubs (
+    name TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    points INTEGER NOT NULL CHECK (points >= 0)
+);
+CREATE TABLE IF NOT EXISTS competitions (
+    name TEXT PRIMARY KEY,
+    date TEXT NOT NULL,
+    number_of_places INTEGER NOT NULL CHECK (number_of_places >= 0)
+);
+CREATE INDEX IF NOT EXISTS competitions_date ON competitions (date);
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0);
+CREATE TABLE IF NOT EXISTS ledger (
+    id INTEGER PRIMARY KEY,
+    club TEXT NOT NULL,
+    competition TEXT NOT NULL,
+    places INTEGER NOT NULL,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ledger_club ON ledger (club, competition);
+CREATE TABLE IF NOT EXISTS holdings (
+    club TEXT NOT NULL,
+    competition TEXT NOT NULL,
+    places INTEGER NOT NULL CHECK (places >= 0),
+    PRIMARY KEY (club, competition)
+) WITHOUT ROWID;
+"""
+
+SELECT_CLUBS = "SELECT name, email, points FROM clubs ORDER BY rowid"
+SELECT_CLUB_BY_EMAIL = "SELECT name, email, points FROM clubs WHERE email = ?"
+SELECT_CLUB_BY_NAME = "SELECT name, email, points FROM clubs WHERE name = ?"
+SELECT_CLUBS_FROM_NAME = "SELECT name, email, points FROM clubs WHERE name >= ? ORDER BY name"
+SELECT_COMPETITIONS = "SELECT name, date, number_of_places FROM competitions ORDER BY rowid"
+SELECT_COMPETITIONS_FROM_NAME = (
+    "SELECT name, date, number_of_places FROM competitions WHERE name >= ? ORDER BY name"
+)
+SELECT_COMPETITIONS_BY_DATE = "SELECT name, date, number_of_places FROM competitions ORDER BY date"
+SELECT_COMPETITIONS_FROM_DATE = (
+    "SELECT name, date, number_of_places FROM competitions WHERE date >= ? ORDER BY date"
+)
+SELECT_LAST_STARTED = "SELECT MAX(date) FROM competitions WHERE date < ?"
+SELECT_COMPETITION = "SELECT name, date, number_of_places FROM competitions WHERE name = ?"
+TAKE_PLACES = """
+UPDATE competitions SET number_of_places = number_of_places - :places
+WHERE name = :competition AND number_of_places >= :places
+"""
+TAKE_POINTS = "UPDATE clubs SET points = points - :places WHERE name = :club AND points >= :places"
+RELEASE_PLACES = "UPDATE competitions SET number_of_places = number_of_places + :places WHERE name = :competition"
+RELEASE_POINTS = "UPDATE clubs SET points = points + :places WHERE name = :club"
+SELECT_DATA_VERSION = "SELECT version FROM data_version"
+RECORD_ENTRY = "INSERT INTO ledger (club, competition, places, time) VALUES (:club, :competition, :places, :time)"
+HOLD_PLACES = """
+INSERT INTO holdings (club, competition, places) VALUES (:club, :competition, :places)
+ON CONFLICT (club, competition) DO UPDATE SET places = places + excluded.places
+"""
+# places given back are held already, there is no row to insert
+RELEASE_HELD = "UPDATE holdings SET places = places + :places WHERE club = :club AND competition = :competition"
+SELECT_HELD = "SELECT places FROM holdings WHERE club = ? AND competition = ?"
+SELECT_HOLDINGS = "SELECT competition, places FROM holdings WHERE club = ? AND places > 0"
+SELECT_HISTORY = "SELECT club, competition, places, time FROM ledger WHERE club = ? ORDER BY id"
+SELECT_HOLDINGS_MISMATCHES = """
+SELECT entries.club, entries.competition, entries.places, COALESCE(holdings.places, 0)
+FROM (SELECT club, competition, SUM(places) AS places FROM ledger GROUP BY club, competition) AS entries
+LEFT JOIN holdings USING (club, competition)
+WHERE entries.places != COALESCE(holdings.places, 0)
+UNION ALL
+SELECT club, competition, 0, places FROM holdings
+WHERE places != 0
+AND NOT EXISTS (SELECT 1 FROM ledger WHERE ledger.club = holdings.club AND ledger.competition = holdings.competition)
+"""
+BUMP_DATA_VERSION = "UPDATE data_version SET version = version + 1"
+
+
+def club_from_row(row):
+    return Club(*row)
+
+
+def competition_from_row(row):
+    name, date, number_of_places = row
+    return Competition(name, parse_date(date), number_of_places)
+
+
+class SqliteRegistry:
+    """
+    Registry reading clubs and competitions from an SQLite database.
+
+    Each thread gets its own connection, whose statement cache keeps the
+    queries below prepared. The database runs in WAL mode so that readers in
+    other processes are not blocked by a booking being written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.connection.executescript(SCHEMA)
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    @property
+    def clubs(self):
+        return [club_from_row(row) for row in self.connection.execute(SELECT_CLUBS)]
+
+    @property
+    def competitions(self):
+        return [competition_from_row(row) for row in self.connection.execute(SELECT_COMPETITIONS)]
+
+    @property
+    def data_version(self):
+        # no reload generation here, the database is the only source
+        return 0, self.connection.execute(SELECT_DATA_VERSION).fetchone()[0]
+
+    def club_version(self, club):
+        # rows are read fresh on every lookup, their mutable counter is their version
+        return club.points
+
+    def competition_version(self, competition):
+        return competition.number_of_places
+
+    def find_club_by_email(self, email):
+        row = self.connection.execute(SELECT_CLUB_BY_EMAIL, (email,)).fetchone()
+        return club_from_row(row) if row else None
+
+    def find_club_by_name(self, name):
+        row = self.connection.execute(SELECT_CLUB_BY_NAME, (name,)).fetchone()
+        return club_from_row(row) if row else None
+
+    def find_competition(self, name):
+        row = self.connection.execute(SELECT_COMPETITION, (name,)).fetchone()
+        return competition_from_row(row) if row else None
+
+    def competitions_by_date(self):
+        return [competition_from_row(row) for row in self.connection.execute(SELECT_COMPETITIONS_BY_DATE)]
+
+    def upcoming_competitions(self, moment):
+        rows = self.connection.execute(SELECT_COMPETITIONS_FROM_DATE, (moment.strftime(DATE_FORMAT),))
+        return (competition_from_row(row) for row in rows)
+
+    def last_started(self, moment):
+        date = self.connection.execute(SELECT_LAST_STARTED, (moment.strftime(DATE_FORMAT),)).fetchone()[0]
+        return parse_date(date) if date else None
+
+    def clubs_with_prefix(self, prefix):
+        for row in self.connection.execute(SELECT_CLUBS_FROM_NAME, (prefix,)):
+            if not row[0].startswith(prefix):
+                return
+            yield club_from_row(row)
+
+    def competitions_with_prefix(self, prefix):
+        for row in self.connection.execute(SELECT_COMPETITIONS_FROM_NAME, (prefix,)):
+            if not row[0].startswith(prefix):
+                return
+            yield competition_from_row(row)
+
+    def import_json(self, clubs, competitions):
+        """
+        Replaces the database content with the clubs and competitions loaded from the JSON files
+        """
+        connection = self.connection
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM clubs")
+            connection.execute("DELETE FROM competitions")
+            connection.execute("DELETE FROM ledger")
+            connection.execute("DELETE FROM holdings")
+            connection.executemany(
+                "INSERT INTO clubs (name, email, points) VALUES (?, ?, ?)",
+                [(club.name, club.email, club.points) for club in clubs]
+            )
+            connection.executemany(
+                "INSERT INTO competitions (name, date, number_of_places) VALUES (?, ?, ?)",
+                [
+                    (competition.name, competition.date.strftime(DATE_FORMAT), competition.number_of_places)
+                    for competition in competitions
+                ]
+            )
+            connection.execute(BUMP_DATA_VERSION)
+
+
+class SqliteLedger:
+    """
+    Ledger kept in the database, each entry and the total it changes written in the transaction of its booking.
+
+    The counters are not reconciled, the database holding no opening balances:
+    they are changed in the same transactions as the entries.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+
+    def open(self, registry):
+        pass
+
+    def record(self, club_name, competition_name, places):
+        parameters = {'club': club_name, 'competition': competition_name, 'places': places, 'time': time.time()}
+        connection = self.registry.connection
+        connection.execute(RECORD_ENTRY, parameters)
+        connection.execute(HOLD_PLACES if places > 0 else RELEASE_HELD, parameters)
+
+    def held(self, club_name, competition_name):
+        row = self.registry.connection.execute(SELECT_HELD, (club_name, competition_name)).fetchone()
+        return row[0] if row else 0
+
+    def holdings(self, club_name):
+        return dict(self.registry.connection.execute(SELECT_HOLDINGS, (club_name,)))
+
+    def history(self, club_name):
+        return [LedgerEntry(*row) for row in self.registry.connection.execute(SELECT_HISTORY, (club_name,))]
+
+    def reconcile(self, registry, counters=True):
+        return [
+            Mismatch('booking', f'{club}/{competition}', expected, actual)
+            for club, competition, expected, actual in registry.connection.execute(SELECT_HOLDINGS_MISMATCHES)
+        ]
+
+
+class SqliteBookingService(BookingService):
+    """
+    Books places with a single transaction of conditional UPDATEs, consistent across processes
+    """
+
+    def __init__(self, registry, places_max_limit=PLACES_MAX_LIMIT):
+        super().__init__(registry, places_max_limit=places_max_limit, ledger=SqliteLedger(registry))
+
+    def reserve(self, club, competition, places):
+        connection = self.registry.connection
+        with connection:
+            self._begin(connection)
+            self._take(connection, club, competition, places)
+            connection.execute(BUMP_DATA_VERSION)
+        self._refresh(club, competition)
+        return Reservation(self, club, competition, places)
+
+    def _purchase_many(self, bookings):
+        results = []
+        connection = self.registry.connection
+        with connection:
+            self._begin(connection)
+            for club, competition, places in bookings:
+                try:
+                    self._take(connection, club, competition, places)
+                except BookingError as error:
+                    results.append(error)
+                    continue
+                results.append(Reservation(self, club, competition, places).commit())
+            connection.execute(BUMP_DATA_VERSION)
+        for club, competition, _ in bookings:
+            self._refresh(club, competition)
+        return results
+
+    def _begin(self, connection):
+        """
+        Starts a write transaction, the database lock being the booking lock here
+        """
+        start = time.perf_counter() if lock_waited.receivers else None
+        connection.execute("BEGIN IMMEDIATE")
+        if start is not None:
+            lock_waited.send(self, seconds=time.perf_counter() - start)
+
+    def _take(self, connection, club, competition, places, waitlisted=False):
+        """
+        Takes the places and points of one booking within the current transaction, or raises leaving it unchanged
+        """
+        parameters = {'club': club.name, 'competition': competition.name, 'places': places}
+        connection.execute("SAVEPOINT booking")
+        try:
+            if places < 1:
+                raise InvalidPlaces()
+            # the waitlist is kept by the process, the competitions it waits on are only closed to this process
+            if not waitlisted and self.waitlist.waiting(competition.name):
+                raise NotEnoughPlaces(0)
+            if connection.execute(TAKE_PLACES, parameters).rowcount == 0:
+                competition.update(**self.registry.find_competition(competition.name).fields())
+                raise NotEnoughPlaces(competition.number_of_places)
+            if connection.execute(TAKE_POINTS, parameters).rowcount == 0:
+                club.update(**self.registry.find_club_by_name(club.name).fields())
+                raise NotEnoughPoints(club.points)
+            held = self.ledger.held(club.name, competition.name)
+            if held + places > self.places_max_limit:
+                raise OverMaxLimit(self.places_max_limit, held)
+            self.ledger.record(club.name, competition.name, places)
+        except BookingError:
+            connection.execute("ROLLBACK TO booking")
+            raise
+        finally:
+            connection.execute("RELEASE booking")
+
+    def compact(self):
+        pass
+
+    def reconcile(self):
+        # a single query, reading a consistent snapshot of the database while bookings go on
+        mismatches = self.ledger.reconcile(self.registry)
+        reconciled.send(self, mismatches=mismatches)
+        return mismatches
+
+    def _book(self, club, competition, places):
+        connection = self.registry.connection
+        with connection:
+            self._begin(connection)
+            self._take(connection, club, competition, places, waitlisted=True)
+            connection.execute(BUMP_DATA_VERSION)
+        self._refresh(club, competition)
+
+    def _release(self, club, competition, places):
+        self._give_back(club, competition, places)
+
+    def _give_back(self, club, competition, places):
+        parameters = {'club': club.name, 'competition': competition.name, 'places': places}
+        connection = self.registry.connection
+        with connection:
+            self._begin(connection)
+            held = self.ledger.held(club.name, competition.name)
+            if places > held:
+                raise NotBooked(held)
+            connection.execute(RELEASE_PLACES, parameters)
+            connection.execute(RELEASE_POINTS, parameters)
+            self.ledger.record(club.name, competition.name, -places)
+            connection.execute(BUMP_DATA_VERSION)
+        self._refresh(club, competition)
+
+    def _refresh(self, club, competition):
+        club.update(**self.registry.find_club_by_name(club.name).fields())
+        competition.update(**self.registry.find_competition(competition.name).fields())
@@ -0,0 +1,239 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StorageError(Exception):
+    pass
+
+
+class Storage:
+    """
+    Default storage: the JSON files are a read-only source, bookings live in memory only
+    """
+
+    def __init__(self, clubs_path='clubs.json', competitions_path='competitions.json'):
+        self.clubs_path = clubs_path
+        self.competitions_path = competitions_path
+
+    def snapshot_paths(self):
+        return self.clubs_path, self.competitions_path
+
+    def replay(self, registry, ledger):
+        pass
+
+    def record_booking(self, club_name, competition_name, places):
+        pass
+
+    def should_compact(self):
+        return False
+
+    def compact(self, registry, ledger):
+        pass
+
+    def close(self):
+        pass
+
+
+class WriteAheadLog:
+    """
+    Append-only log of JSON lines, made durable with group commit.
+
+    The first writer finding no flush in progress becomes the leader: it writes
+    every pending record and fsyncs once for the whole batch, while the other
+    writers wait for it. With group_commit disabled, each record gets its own fsync.
+    """
+
+    def __init__(self, path, group_commit=True, commit_delay=0.0):
+        self.path = path
+        self.group_commit = group_commit
+        self.commit_delay = commit_delay
+        self.records = 0
+        self._file = open(path, 'ab')
+        self._condition = threading.Condition()
+        self._pending = []
+        self._appended = 0
+        self._durable = 0
+        self._failed = 0
+        self._flushing = False
+
+    def append(self, record):
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        if not self.group_commit:
+            with self._condition:
+                self._write([line])
+                self.records += 1
+            return
+        with self._condition:
+            self._pending.append(line)
+            self._appended += 1
+            self.records += 1
+            sequence = self._appended
+            while self._durable < sequence:
+                if self._failed >= sequence:
+                    raise StorageError(f"Could not write booking to {self.path}.")
+                if self._flushing:
+                    self._condition.wait()
+                    continue
+                self._flush_as_leader()
+
+    def _flush_as_leader(self):
+        self._flushing = True
+        self._condition.release()
+        try:
+            if self.commit_delay:
+                # give concurrent writers a chance to join the batch
+                time.sleep(self.commit_delay)
+        finally:
+            self._condition.acquire()
+        batch, self._pending = self._pending, []
+        target = self._appended
+        self._condition.release()
+        try:
+            self._write(batch)
+        except OSError:
+            self._condition.acquire()
+            self._failed = target
+            self._flushing = False
+            self._condition.notify_all()
+            raise
+        self._condition.acquire()
+        self._durable = target
+        self._flushing = False
+        self._condition.notify_all()
+
+    def _write(self, lines):
+        self._file.write(b''.join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def read(path):
+        with open(path, 'rb') as log:
+            for line in log:
+                if not line.endswith(b'\n'):
+                    # torn write from a crash, the booking was never acknowledged
+                    break
+                yield json.loads(line)
+
+
+class WalStorage(Storage):
+    """
+    Durable storage: a JSON snapshot plus a write-ahead log of the bookings made since.
+
+    The log is split into numbered segments. Compaction starts a new segment,
+    writes the live state to a new snapshot recording that segment number, then
+    deletes the older segments, so a crash at any point replays each booking once.
+    Once a snapshot is written, it is loaded instead of the JSON files, whose
+    later edits are ignored.
+    """
+
+    def __init__(self, directory, group_commit=True, commit_delay=0.0, compact_every=10000,
+                 clubs_path='clubs.json', competitions_path='competitions.json'):
+        super().__init__(clubs_path, competitions_path)
+        self.directory = directory
+        self.group_commit = group_commit
+        self.commit_delay = commit_delay
+        self.compact_every = compact_every
+        self.snapshot_path = os.path.join(directory, 'snapshot.json')
+        self._compacting = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.segment = max(self._segments(), default=self._snapshot_segment())
+        self.log = self._open_log(self.segment)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f'bookings.{segment:08d}.wal')
+
+    def _segments(self):
+        paths = glob.glob(os.path.join(self.directory, 'bookings.*.wal'))
+        return sorted(int(os.path.basename(path).split('.')[1]) for path in paths)
+
+    def _snapshot_segment(self):
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path) as snapshot:
+            return json.load(snapshot)['segment']
+
+    def _open_log(self, segment):
+        return WriteAheadLog(self._segment_path(segment), self.group_commit, self.commit_delay)
+
+    def snapshot_paths(self):
+        if os.path.exists(self.snapshot_path):
+            return self.snapshot_path, self.snapshot_path
+        return super().snapshot_paths()
+
+    def _snapshot_holdings(self):
+        if not os.path.exists(self.snapshot_path):
+            return []
+        with open(self.snapshot_path) as snapshot:
+            return json.load(snapshot).get('holdings', [])
+
+    def replay(self, registry, ledger):
+        """
+        Applies the bookings logged since the snapshot, recording them in the ledger after the places held before.
+
+        Bookings of a club or competition no longer loaded are skipped and logged.
+        """
+        for club_name, competition_name, places in self._snapshot_holdings():
+            ledger.carry(club_name, competition_name, places)
+        first_segment = self._snapshot_segment()
+        for segment in self._segments():
+            if segment < first_segment:
+                continue
+            for record in WriteAheadLog.read(self._segment_path(segment)):
+                club = registry.find_club_by_name(record['club'])
+                competition = registry.find_competition(record['competition'])
+                if club is None or competition is None:
+                    # removed from the JSON files since it was logged
+                    logger.warning(
+                        "Skipped booking of %s places by %s on %s, no longer loaded",
+                        record['places'], record['club'], record['competition']
+                    )
+                    continue
+                ledger.record(record['club'], record['competition'], record['places'])
+                registry.update_club(club, points=club.points - record['places'])
+                registry.update_competition(
+                    competition, number_of_places=competition.number_of_places - record['places']
+                )
+
+    def record_booking(self, club_name, competition_name, places):
+        self.log.append({'club': club_name, 'competition': competition_name, 'places': places})
+
+    def should_compact(self):
+        return self.log.records >= self.compact_every and not self._compacting.locked()
+
+    def compact(self, registry, ledger):
+        """
+        Writes the registry state and the places held as the new snapshot, bookings must be paused meanwhile
+        """
+        with self._compacting:
+            old_log = self.log
+            self.segment += 1
+            self.log = self._open_log(self.segment)
+            old_log.close()
+            snapshot = {
+                'segment': self.segment,
+                'clubs': [club.to_json() for club in registry.clubs],
+                'competitions': [competition.to_json() for competition in registry.competitions],
+                'holdings': [list(total) for total in ledger.totals()],
+            }
+            temporary_path = self.snapshot_path + '.tmp'
+            with open(temporary_path, 'w') as snapshot_file:
+                json.dump(snapshot, snapshot_file)
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            os.replace(temporary_path, self.snapshot_path)
+            for segment in self._segments():
+                if segment < self.segment:
+                    os.remove(self._segment_path(segment))
+
+    def close(self):
+        self.log.close()
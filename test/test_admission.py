@@ -0,0 +1,164 @@
+import multiprocessing
+import threading
+import unittest
+
+import server
+from admission import Admission
+from admission import SharedTokenBuckets
+from admission import TokenBuckets
+
+
+def take_in_worker(buckets, key, count, results):
+    results.put(sum(1 for _ in range(count) if not buckets.take(key, now=100.0)))
+
+
+class TokenBucketsTester(unittest.TestCase):
+    def test__take__burst_then_refilled_at_rate(self):
+        buckets = TokenBuckets(rate=2, burst=3)
+        self.assertEqual([0, 0, 0], [buckets.take("club1", now=10.0) for _ in range(3)])
+        self.assertEqual(0.5, buckets.take("club1", now=10.0))
+        # other keys have their own bucket
+        self.assertEqual(0, buckets.take("club2", now=10.0))
+        self.assertEqual(0, buckets.take("club1", now=10.5))
+        self.assertEqual(0.5, buckets.take("club1", now=10.5))
+
+    def test__purge__full_buckets_dropped(self):
+        buckets = TokenBuckets(rate=1, burst=2, max_keys=3)
+        buckets.take("club0", now=0.0)
+        buckets.take("club1", now=1.0)
+        buckets.take("club2", now=1.0)
+        self.assertEqual(3, len(buckets))
+        # a fourth bucket drops club0, full again, club1 and club2 not yet
+        buckets.take("club3", now=1.5)
+        self.assertEqual(3, len(buckets))
+        self.assertEqual(0, buckets.take("club1", now=1.5))
+        self.assertEqual(0.5, buckets.take("club1", now=1.5))
+
+
+class SharedTokenBucketsTester(unittest.TestCase):
+    def test__workers__share_the_buckets(self):
+        """
+        Plot:
+            Four forked workers take 10 tokens each from the same key, its bucket holding 12
+        Result:
+            12 are taken in all
+        """
+        buckets = SharedTokenBuckets(rate=1, burst=12, slots=16)
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [context.Process(target=take_in_worker, args=(buckets, "club1", 10, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        taken = sum(results.get(timeout=10) for _ in workers)
+        for worker in workers:
+            worker.join()
+        self.assertEqual(12, taken)
+        self.assertEqual(1.0, buckets.take("club1", now=100.0))
+
+
+class AdmissionTester(unittest.TestCase):
+    def test__enter__queued_then_shed(self):
+        """
+        Plot:
+            One booking runs at a time, one may wait: a second booking waits while a third comes
+        Result:
+            The third is shed at once, the second runs once the first leaves
+        """
+        admission = Admission(concurrency=1, queue_size=1, timeout=5)
+        self.assertTrue(admission.enter())
+        admitted = []
+        waiting = threading.Thread(target=lambda: admitted.append(admission.enter()))
+        waiting.start()
+        while not admission.waiting:
+            pass
+        self.assertFalse(admission.enter())
+        admission.leave()
+        waiting.join()
+        self.assertEqual([True], admitted)
+        self.assertEqual(1, admission.running)
+
+    def test__enter__shed_after_timeout(self):
+        admission = Admission(concurrency=1, queue_size=4, timeout=0.01)
+        self.assertTrue(admission.enter())
+        self.assertFalse(admission.enter())
+        self.assertEqual(0, admission.waiting)
+
+
+class AdmissionControlTester(unittest.TestCase):
+    def test__club_rate__page_refused_with_retry_after(self):
+        """
+        Plot:
+            With a burst of 2 bookings per club, Simply Lift books 3 times in a row, then She Lifts once
+        Result:
+            The third booking of Simply Lift is refused with 429 and a Retry-After, without booking,
+            She Lifts books
+        """
+        app = server.create_app({'GUDLFT_CLUB_RATE': 0.1, 'GUDLFT_CLUB_BURST': 2})
+        registry = app.extensions['gudlft'].registry
+        with app.test_client() as simply_lift, app.test_client() as she_lifts:
+            simply_lift.post("/showSummary", data={"email": "john@simplylift.co"})
+            statuses = [
+                simply_lift.post("/purchasePlaces", data={"competition": "Spring Festival", "places": "1"}).status_code
+                for _ in range(3)
+            ]
+            response = simply_lift.post("/purchasePlaces", data={"competition": "Spring Festival", "places": "1"})
+            she_lifts.post("/showSummary", data={"email": "kate@shelifts.co.uk"})
+            other = she_lifts.post("/purchasePlaces", data={"competition": "Spring Festival", "places": "1"})
+            metrics = simply_lift.get("/metrics").data.decode("utf-8").splitlines()
+        self.assertEqual([302, 302, 429], statuses)
+        self.assertEqual(429, response.status_code)
+        self.assertEqual("10", response.headers["Retry-After"])
+        self.assertIn("Too many bookings for this club", response.data.decode("utf-8"))
+        self.assertEqual(302, other.status_code)
+        self.assertEqual(12, registry.find_club_by_name("Simply Lift").points)
+        self.assertIn('gudlft_bookings_refused_total{reason="club"} 2', metrics)
+
+    def test__ip_rate__api_refused_as_json(self):
+        app = server.create_app({'GUDLFT_IP_RATE': 1, 'GUDLFT_IP_BURST': 1})
+        booking = {"club": "She Lifts", "competition": "Spring Festival", "places": 1}
+        with app.test_client() as client:
+            client.post("/showSummary", data={"email": "kate@shelifts.co.uk"})
+            self.assertEqual(200, client.post("/api/bookings", json=booking).status_code)
+            response = client.post("/api/bookings", json=booking)
+            # reads are never limited
+            self.assertEqual(200, client.get("/api/clubs").status_code)
+        self.assertEqual(429, response.status_code)
+        self.assertEqual("1", response.headers["Retry-After"])
+        self.assertEqual("rate_limited", response.get_json()["status"])
+
+    def test__admission__booking_shed_while_others_run(self):
+        """
+        Plot:
+            One booking is admitted at a time, none may wait, and a booking is held in the booking service
+        Result:
+            A booking sent meanwhile is refused with 503, the next one once the first is done goes through
+        """
+        app = server.create_app({'GUDLFT_ADMISSION_QUEUE': 0, 'GUDLFT_BOOKINGS_ADMITTED': 1})
+        service = app.extensions['gudlft'].booking
+        booking = {"club": "She Lifts", "competition": "Spring Festival", "places": 1}
+        entered, release = threading.Event(), threading.Event()
+        purchase = service.purchase
+
+        def held_purchase(*args):
+            entered.set()
+            release.wait(5)
+            return purchase(*args)
+        service.purchase = held_purchase
+        clients = [app.test_client() for _ in range(3)]
+        for client in clients:
+            client.post("/showSummary", data={"email": "kate@shelifts.co.uk"})
+        held = threading.Thread(target=lambda: clients[0].post("/api/bookings", json=booking))
+        held.start()
+        entered.wait(5)
+        response = clients[1].post("/api/bookings", json=booking)
+        release.set()
+        held.join()
+        self.assertEqual(503, response.status_code)
+        self.assertEqual("2", response.headers["Retry-After"])
+        self.assertEqual("overloaded", response.get_json()["status"])
+        self.assertEqual(200, clients[2].post("/api/bookings", json=booking).status_code)
+        self.assertEqual(10, app.extensions['gudlft'].registry.find_club_by_name("She Lifts").points)
+
+
+if __name__ == "__main__":
+    unittest.main()
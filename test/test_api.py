@@ -0,0 +1,222 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+import server
+
+
+EMAILS = {
+    "Simply Lift": "john@simplylift.co",
+    "Iron Temple": "admin@irontemple.com",
+    "She Lifts": "kate@shelifts.co.uk",
+}
+
+
+def log_in(client, club):
+    client.post("/showSummary", data={"email": EMAILS[club]})
+
+
+class ApiTester(unittest.TestCase):
+    def setUp(self):
+        self.app = server.create_app()
+        self.registry = self.app.extensions['gudlft'].registry
+
+    def test__competitions__listed(self):
+        with self.app.test_client() as client:
+            response = client.get("/api/competitions")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            {"name": "Fall Classic", "date": "2020-10-22 13:30:00", "numberOfPlaces": 13, "isPast": True},
+            response.get_json()["competitions"][1]
+        )
+
+    def test__clubs__not_modified_until_booking(self):
+        """
+        Plot:
+            A client polls the clubs with the ETag of its previous response
+        Result:
+            It gets a 304 until a booking changes the data
+        """
+        with self.app.test_client() as client:
+            response = client.get("/api/clubs")
+            self.assertEqual({"name": "Iron Temple", "points": 4}, response.get_json()["clubs"][1])
+            etag = response.headers["ETag"]
+
+            response = client.get("/api/clubs", headers={"If-None-Match": etag})
+            self.assertEqual(304, response.status_code)
+
+            log_in(client, "Iron Temple")
+            client.post("/api/bookings", json={"club": "Iron Temple", "competition": "Fall Classic", "places": 1})
+            response = client.get("/api/clubs", headers={"If-None-Match": etag})
+            self.assertEqual(200, response.status_code)
+            self.assertEqual({"name": "Iron Temple", "points": 3}, response.get_json()["clubs"][1])
+
+    @patch("api.now", return_value=datetime.datetime(2020, 6, 1))
+    def test__competitions__modified_when_one_starts(self, now):
+        """
+        Plot:
+            A client polls the competitions with its ETag, before and after Fall Classic starts
+        Result:
+            It gets a 304 until then, then Fall Classic past
+        """
+        with self.app.test_client() as client:
+            response = client.get("/api/competitions")
+            self.assertFalse(response.get_json()["competitions"][1]["isPast"])
+            etag = response.headers["ETag"]
+            self.assertEqual(304, client.get("/api/competitions", headers={"If-None-Match": etag}).status_code)
+
+            now.return_value = datetime.datetime(2020, 10, 23)
+            response = client.get("/api/competitions", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.get_json()["competitions"][1]["isPast"])
+
+    def test__booking__ok(self):
+        with self.app.test_client() as client:
+            log_in(client, "Simply Lift")
+            response = client.post(
+                "/api/bookings",
+                json={"club": "Simply Lift", "competition": "Spring Festival", "places": 2}
+            )
+        self.assertEqual(200, response.status_code)
+        result = response.get_json()
+        self.assertEqual("ok", result["status"])
+        self.assertEqual(12, result["club"]["points"])
+        self.assertEqual(23, result["competition"]["numberOfPlaces"])
+
+    def test__club_bookings__places_held(self):
+        with self.app.test_client() as client:
+            log_in(client, "Simply Lift")
+            client.post("/api/bookings", json={"club": "Simply Lift", "competition": "Spring Festival", "places": 2})
+            client.post("/api/bookings", json={"club": "Simply Lift", "competition": "Spring Festival", "places": 3})
+            response = client.get("/api/clubs/Simply Lift/bookings")
+            self.assertEqual(404, client.get("/api/clubs/stuff/bookings").status_code)
+        self.assertEqual({"name": "Simply Lift", "points": 9}, response.get_json()["club"])
+        self.assertEqual([{"competition": "Spring Festival", "places": 5}], response.get_json()["bookings"])
+
+    @patch("api.now", return_value=datetime.datetime(2020, 1, 1))
+    def test__cancellation_and_waitlist(self, _):
+        with self.app.test_client() as simply_lift, self.app.test_client() as she_lifts:
+            simply_lift.post("/showSummary", data={"email": "john@simplylift.co"})
+            she_lifts.post("/showSummary", data={"email": "kate@shelifts.co.uk"})
+            simply_lift.post("/api/bookings", json={"club": "Simply Lift", "competition": "Fall Classic", "places": 12})
+            response = she_lifts.post(
+                "/api/waitlist", json={"club": "She Lifts", "competition": "Fall Classic", "places": 2}
+            )
+            self.assertEqual(202, response.status_code)
+            self.assertEqual({"status": "waiting", "places": 2}, response.get_json())
+            self.app.extensions['gudlft'].booking.allocator.join()
+            # the place left is booked at once
+            response = she_lifts.get("/api/clubs/She Lifts/bookings")
+            self.assertEqual([{"competition": "Fall Classic", "places": 1}], response.get_json()["waiting"])
+            response = she_lifts.post(
+                "/api/cancellations", json={"club": "She Lifts", "competition": "Fall Classic", "places": 2}
+            )
+            self.assertEqual(409, response.status_code)
+            self.assertEqual("not_booked", response.get_json()["status"])
+            response = simply_lift.post(
+                "/api/cancellations", json={"club": "Simply Lift", "competition": "Fall Classic", "places": 2}
+            )
+            self.assertEqual(200, response.status_code)
+            self.assertEqual({"name": "Simply Lift", "points": 4}, response.get_json()["club"])
+            self.app.extensions['gudlft'].booking.allocator.join()
+            response = she_lifts.get("/api/clubs/She Lifts/bookings")
+        self.assertEqual([{"competition": "Fall Classic", "places": 2}], response.get_json()["bookings"])
+        self.assertEqual([], response.get_json()["waiting"])
+
+    @patch("api.now", return_value=datetime.datetime(2020, 1, 1))
+    def test__cancellation__refused(self, now):
+        """
+        Plot:
+            Simply Lift books 2 places on Fall Classic, then cancellations are sent without logging in,
+            logged in as another club, for a negative number of places and once the competition started
+        Result:
+            All of them are refused, the places staying booked
+        """
+        cancellation = {"club": "Simply Lift", "competition": "Fall Classic", "places": 2}
+        with self.app.test_client() as simply_lift, self.app.test_client() as client:
+            log_in(simply_lift, "Simply Lift")
+            simply_lift.post("/api/bookings", json=cancellation)
+            self.assertEqual(403, client.post("/api/cancellations", json=cancellation).status_code)
+            client.post("/showSummary", data={"email": "kate@shelifts.co.uk"})
+            self.assertEqual(403, client.post("/api/cancellations", json=cancellation).status_code)
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            response = client.post("/api/cancellations", json=dict(cancellation, places=-20))
+            self.assertEqual(400, response.status_code)
+            now.return_value = datetime.datetime(2020, 10, 23)
+            response = client.post("/api/cancellations", json=cancellation)
+        self.assertEqual(409, response.status_code)
+        self.assertEqual("started", response.get_json()["status"])
+        self.assertEqual(12, self.registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(11, self.registry.find_competition("Fall Classic").number_of_places)
+
+    def test__booking__rejected(self):
+        cases = [
+            ({"club": "Iron Temple", "competition": "Spring Festival", "places": 5}, 409, "insufficient_points"),
+            ({"club": "Simply Lift", "competition": "Fall Classic", "places": 14}, 409, "sold_out"),
+            ({"club": "Simply Lift", "competition": "Spring Festival", "places": 13}, 409, "over_limit"),
+            ({"club": "stuff", "competition": "Spring Festival", "places": 1}, 404, "not_found"),
+            ({"club": "Simply Lift", "competition": "Spring Festival", "places": "1"}, 400, "invalid"),
+            ({"club": ["Simply Lift"], "competition": "Fall Classic", "places": 1}, 400, "invalid"),
+            ({"club": "Simply Lift", "competition": {"name": "Fall Classic"}, "places": 1}, 400, "invalid"),
+        ]
+        for booking, status_code, status in cases:
+            with self.app.test_client() as client:
+                log_in(client, "Iron Temple" if booking["club"] == "Iron Temple" else "Simply Lift")
+                response = client.post("/api/bookings", json=booking)
+            self.assertEqual(status_code, response.status_code)
+            self.assertEqual(status, response.get_json()["status"])
+        self.assertEqual(14, self.registry.find_club_by_name("Simply Lift").points)
+
+    def test__booking__refused_without_logging_in(self):
+        """
+        Plot:
+            Simply Lift is booked for without logging in, then logged in as She Lifts, one booking and a batch each
+        Result:
+            All of them are refused as forbidden, its points are left alone
+        """
+        booking = {"club": "Simply Lift", "competition": "Spring Festival", "places": 2}
+        with self.app.test_client() as client:
+            for _ in range(2):
+                response = client.post("/api/bookings", json=booking)
+                self.assertEqual(403, response.status_code)
+                self.assertEqual("forbidden", response.get_json()["status"])
+                response = client.post("/api/bookings/batch", json={"bookings": [booking]})
+                self.assertEqual([{"status": "forbidden", "message": "Log in as Simply Lift to change its places."}],
+                                 response.get_json()["results"])
+                log_in(client, "She Lifts")
+        self.assertEqual(14, self.registry.find_club_by_name("Simply Lift").points)
+
+    def test__batch__result_per_booking(self):
+        """
+        Plot:
+            A batch books several times for the same club, more than its points allow
+        Result:
+            Bookings are applied in order and each gets its own result
+        """
+        bookings = [
+            {"club": "Simply Lift", "competition": "Spring Festival", "places": 10},
+            {"club": "Simply Lift", "competition": "Fall Classic", "places": 5},
+            {"club": "Simply Lift", "competition": "Fall Classic", "places": 0},
+            {"club": "Simply Lift", "competition": "Spring Festival", "places": 3},
+            {"club": "She Lifts", "competition": "Fall Classic", "places": 1},
+            {"club": "Simply Lift", "competition": "Fall Classic", "places": 4},
+            {"club": "Simply Lift", "competition": "Fall Classic", "places": 1},
+        ]
+        with self.app.test_client() as client:
+            log_in(client, "Simply Lift")
+            response = client.post("/api/bookings/batch", json={"bookings": bookings})
+        statuses = [result["status"] for result in response.get_json()["results"]]
+        self.assertEqual(
+            ["ok", "insufficient_points", "invalid", "over_limit", "forbidden", "ok", "insufficient_points"], statuses
+        )
+        self.assertEqual(0, self.registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(9, self.registry.find_competition("Fall Classic").number_of_places)
+
+    def test__batch__invalid(self):
+        with self.app.test_client() as client:
+            response = client.post("/api/bookings/batch", json={"bookings": "stuff"})
+        self.assertEqual(400, response.status_code)
+
+
+if __name__ == "__main__":
+    unittest.main()
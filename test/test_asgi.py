@@ -0,0 +1,217 @@
+import asyncio
+import json
+import threading
+import unittest
+
+import server
+from asgi import AsgiApp
+from asgi import wsgi_environ
+
+
+def http_scope(method, path, headers=(), query_string=b''):
+    return {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'query_string': query_string,
+        'root_path': '',
+        'headers': [(name.encode(), value.encode()) for name, value in headers],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+
+
+async def call(app, method, path, body=b'', headers=()):
+    """
+    Sends a request to the ASGI application, returning its status, headers and body
+    """
+    received = iter([{'type': 'http.request', 'body': body, 'more_body': False}])
+    sent = []
+
+    async def receive():
+        return next(received)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(http_scope(method, path, headers), receive, send)
+    headers = {name.decode(): value.decode() for name, value in sent[0]['headers']}
+    return sent[0]['status'], headers, b''.join(message['body'] for message in sent[1:])
+
+
+def session_cookie(flask_app, email):
+    """
+    Cookie of the session of a club logged in, for the bookings to be sent as that club
+    """
+    response = flask_app.test_client().post('/showSummary', data={'email': email})
+    return 'Cookie', response.headers['Set-Cookie'].split(';', 1)[0]
+
+
+class AsgiTester(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = server.create_app()
+        self.registry = self.flask_app.extensions['gudlft'].registry
+        self.app = AsgiApp(self.flask_app, threads=4)
+        self.cookies = {
+            email: session_cookie(self.flask_app, email) for email in ('john@simplylift.co', 'kate@shelifts.co.uk')
+        }
+        # thread each request is handled in
+        self.threads = []
+        wsgi_app = self.flask_app.wsgi_app
+
+        def recording(environ, start_response):
+            self.threads.append((environ['PATH_INFO'], threading.current_thread().name))
+            return wsgi_app(environ, start_response)
+        self.flask_app.wsgi_app = recording
+
+    def test__index__same_page_as_wsgi(self):
+        status, _, body = asyncio.run(call(self.app, 'GET', '/'))
+        self.assertEqual(200, status)
+        self.assertEqual(self.flask_app.test_client().get('/').data, body)
+
+    def test__show_summary__logged_in_with_session_cookie(self):
+        async def scenario():
+            form = [('Content-Type', 'application/x-www-form-urlencoded')]
+            status, headers, _ = await call(self.app, 'POST', '/showSummary', b'email=john%40simplylift.co', form)
+            cookie = headers['set-cookie'].split(';', 1)[0]
+            return status, await call(self.app, 'GET', '/showSummary', headers=[('Cookie', cookie)])
+
+        login_status, (status, _, body) = asyncio.run(scenario())
+        self.assertEqual(302, login_status)
+        self.assertEqual(200, status)
+        self.assertIn("Welcome, john@simplylift.co", body.decode('utf-8'))
+
+    def test__bookings__handled_one_at_a_time_by_booking_thread(self):
+        """
+        Plot:
+            Ten bookings of one place by Simply Lift are sent at once, along with reads
+        Result:
+            All of them are applied, by the booking thread, while the reads are served by the read threads
+        """
+        booking = json.dumps({"club": "Simply Lift", "competition": "Spring Festival", "places": 1}).encode()
+        headers = [('Content-Type', 'application/json'), self.cookies['john@simplylift.co']]
+
+        async def scenario():
+            requests = [call(self.app, 'POST', '/api/bookings', booking, headers) for _ in range(10)]
+            requests += [call(self.app, 'GET', '/api/clubs') for _ in range(10)]
+            return await asyncio.gather(*requests)
+
+        responses = asyncio.run(scenario())
+        self.assertEqual([200] * 20, [status for status, _, _ in responses])
+        self.assertEqual(4, self.registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(15, self.registry.find_competition("Spring Festival").number_of_places)
+        self.assertEqual({'gudlft-booking_0'}, {name for path, name in self.threads if path == '/api/bookings'})
+        self.assertTrue(all(name.startswith('gudlft-read') for path, name in self.threads if path == '/api/clubs'))
+
+    def test__lifespan__pending_bookings_applied_before_shutdown(self):
+        booking = json.dumps({"club": "She Lifts", "competition": "Spring Festival", "places": 2}).encode()
+
+        async def scenario():
+            events = asyncio.Queue()
+            sent = []
+
+            async def send(message):
+                sent.append(message['type'])
+
+            lifespan = asyncio.create_task(self.app({'type': 'lifespan'}, events.get, send))
+            await events.put({'type': 'lifespan.startup'})
+            request = asyncio.create_task(
+                call(
+                    self.app, 'POST', '/api/bookings', booking,
+                    [('Content-Type', 'application/json'), self.cookies['kate@shelifts.co.uk']]
+                )
+            )
+            await asyncio.sleep(0)
+            await events.put({'type': 'lifespan.shutdown'})
+            await lifespan
+            await request
+            return sent
+
+        sent = asyncio.run(scenario())
+        self.assertEqual(['lifespan.startup.complete', 'lifespan.shutdown.complete'], sent)
+        self.assertEqual(10, self.registry.find_club_by_name("She Lifts").points)
+
+    def test__bookings__refused_from_event_loop(self):
+        """
+        Plot:
+            With a burst of 2 bookings per address, 3 bookings are sent in a row
+        Result:
+            The third is refused with 429 without reaching the booking thread
+        """
+        flask_app = server.create_app({'GUDLFT_IP_RATE': 0.5, 'GUDLFT_IP_BURST': 2})
+        app = AsgiApp(flask_app, threads=4)
+        booking = json.dumps({"club": "She Lifts", "competition": "Spring Festival", "places": 1}).encode()
+        cookie = session_cookie(flask_app, 'kate@shelifts.co.uk')
+        handled = []
+        wsgi_app = flask_app.wsgi_app
+
+        def recording(environ, start_response):
+            handled.append(environ['PATH_INFO'])
+            return wsgi_app(environ, start_response)
+        flask_app.wsgi_app = recording
+
+        async def scenario():
+            headers = [('Content-Type', 'application/json'), cookie]
+            return [await call(app, 'POST', '/api/bookings', booking, headers) for _ in range(3)]
+
+        responses = asyncio.run(scenario())
+        self.assertEqual([200, 200, 429], [status for status, _, _ in responses])
+        self.assertEqual("2", responses[2][1]['retry-after'])
+        self.assertEqual("rate_limited", json.loads(responses[2][2])["status"])
+        self.assertEqual(['/api/bookings'] * 2, handled)
+        self.assertEqual(10, flask_app.extensions['gudlft'].registry.find_club_by_name("She Lifts").points)
+
+    def test__bookings__shed_when_queue_full(self):
+        """
+        Plot:
+            With admission control and room for one booking in the queue, 6 bookings are sent at once
+            while the booking thread is held
+        Result:
+            The ones not finding room are refused with 503, the others are applied
+        """
+        flask_app = server.create_app({'GUDLFT_ADMISSION_QUEUE': 0})
+        app = AsgiApp(flask_app, threads=4, booking_queue_size=1)
+        service = flask_app.extensions['gudlft'].booking
+        booking = json.dumps({"club": "Simply Lift", "competition": "Spring Festival", "places": 1}).encode()
+        cookie = session_cookie(flask_app, 'john@simplylift.co')
+        release = threading.Event()
+        purchase = service.purchase
+
+        def held_purchase(*args):
+            release.wait(5)
+            return purchase(*args)
+        service.purchase = held_purchase
+
+        async def scenario():
+            headers = [('Content-Type', 'application/json'), cookie]
+            asyncio.get_running_loop().call_later(0.2, release.set)
+            return await asyncio.gather(*[call(app, 'POST', '/api/bookings', booking, headers) for _ in range(6)])
+
+        statuses = [status for status, _, _ in asyncio.run(scenario())]
+        self.assertLessEqual(4, statuses.count(503))
+        self.assertEqual(6, statuses.count(503) + statuses.count(200))
+        club = flask_app.extensions['gudlft'].registry.find_club_by_name("Simply Lift")
+        self.assertEqual(14 - statuses.count(200), club.points)
+
+
+class WsgiEnvironTester(unittest.TestCase):
+    def test__headers(self):
+        scope = http_scope(
+            'POST', '/book/Fall Classic/Simply Lift',
+            [('Content-Type', 'text/plain'), ('Cookie', 'a=1'), ('Cookie', 'b=2'), ('Accept', 'text/html')],
+        )
+        environ = wsgi_environ(scope, b'body')
+        self.assertEqual('text/plain', environ['CONTENT_TYPE'])
+        self.assertEqual('a=1; b=2', environ['HTTP_COOKIE'])
+        self.assertEqual('text/html', environ['HTTP_ACCEPT'])
+        self.assertEqual(b'body', environ['wsgi.input'].read())
+
+    def test__path__utf8_bytes_as_latin1(self):
+        environ = wsgi_environ(http_scope('GET', '/book/Fête/Simply Lift'), b'')
+        self.assertEqual('/book/Fête/Simply Lift', environ['PATH_INFO'].encode('latin1').decode('utf-8'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,271 @@
+import datetime
+import random
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import booking
+from entities import Club
+from entities import Competition
+from registry import Registry
+
+
+DATE = datetime.datetime(2100, 1, 1)
+
+
+class BookingServiceTester(unittest.TestCase):
+    def setUp(self):
+        self.clubs = [Club("club1", "club1@mail.com", 13), Club("club2", "club2@mail.com", 4)]
+        self.competitions = [Competition("competition1", DATE, 25), Competition("competition2", DATE, 2)]
+        self.registry = Registry(self.clubs, self.competitions)
+        self.service = booking.BookingService(self.registry)
+
+    def test__purchase__counters_updated(self):
+        self.service.purchase(self.clubs[0], self.competitions[0], 3)
+        self.assertEqual(10, self.clubs[0].points)
+        self.assertEqual(22, self.competitions[0].number_of_places)
+
+    def test__purchase__rejected(self):
+        with self.assertRaises(booking.NotEnoughPlaces):
+            self.service.purchase(self.clubs[0], self.competitions[1], 3)
+        with self.assertRaises(booking.NotEnoughPoints):
+            self.service.purchase(self.clubs[1], self.competitions[0], 5)
+        with self.assertRaises(booking.OverMaxLimit):
+            self.service.purchase(self.clubs[0], self.competitions[0], 13)
+        self.assertEqual(13, self.clubs[0].points)
+        self.assertEqual(4, self.clubs[1].points)
+        self.assertEqual(25, self.competitions[0].number_of_places)
+        self.assertEqual(2, self.competitions[1].number_of_places)
+
+    def test__purchase__max_limit_across_bookings(self):
+        self.service.purchase(self.clubs[0], self.competitions[0], 5)
+        self.service.purchase(self.clubs[0], self.competitions[0], 5)
+        with self.assertRaises(booking.OverMaxLimit) as context:
+            self.service.purchase(self.clubs[0], self.competitions[0], 3)
+        self.assertEqual(10, context.exception.held)
+        self.service.purchase(self.clubs[0], self.competitions[0], 2)
+        self.assertEqual({"competition1": 12}, self.service.holdings(self.clubs[0]))
+        self.assertEqual({}, self.service.holdings(self.clubs[1]))
+
+    def test__reservation__cancelled(self):
+        reservation = self.service.reserve(self.clubs[0], self.competitions[0], 3)
+        self.assertEqual(10, self.clubs[0].points)
+        reservation.cancel()
+        self.assertEqual(13, self.clubs[0].points)
+        self.assertEqual(25, self.competitions[0].number_of_places)
+        with self.assertRaises(booking.BookingError):
+            reservation.commit()
+        self.assertEqual({}, self.service.holdings(self.clubs[0]))
+        self.assertEqual([], self.service.reconcile())
+
+
+class WaitlistTester(unittest.TestCase):
+    def setUp(self):
+        self.clubs = [Club(f"club{i}", f"club{i}@mail.com", 20) for i in range(4)]
+        self.competition = Competition("competition1", DATE, 5)
+        self.registry = Registry(self.clubs, [self.competition])
+        self.service = booking.BookingService(self.registry)
+
+    def allocated(self):
+        self.service.allocator.join()
+
+    def test__cancel__points_and_places_returned(self):
+        self.service.purchase(self.clubs[0], self.competition, 4)
+        with self.assertRaises(booking.NotBooked):
+            self.service.cancel(self.clubs[0], self.competition, 5)
+        self.assertEqual("cancelled", self.service.cancel(self.clubs[0], self.competition, 3).state)
+        self.assertEqual(19, self.clubs[0].points)
+        self.assertEqual(4, self.competition.number_of_places)
+        self.assertEqual({"competition1": 1}, self.service.holdings(self.clubs[0]))
+
+    def test__cancel__positive_places_before_the_start(self):
+        self.service.purchase(self.clubs[0], self.competition, 4)
+        for places in (0, -20):
+            with self.assertRaises(booking.InvalidPlaces):
+                self.service.cancel(self.clubs[0], self.competition, places)
+        with self.assertRaises(booking.CompetitionStarted):
+            self.service.cancel(self.clubs[0], self.competition, 1, moment=DATE)
+        with self.assertRaises(booking.InvalidPlaces):
+            self.service.purchase(self.clubs[0], self.competition, -1)
+        self.assertEqual(16, self.clubs[0].points)
+        self.assertEqual(1, self.competition.number_of_places)
+
+    def test__join__only_without_enough_places(self):
+        with self.assertRaises(booking.PlacesAvailable):
+            self.service.join_waitlist(self.clubs[0], self.competition, 5)
+        self.service.join_waitlist(self.clubs[0], self.competition, 6)
+        with self.assertRaises(booking.OverMaxLimit):
+            self.service.join_waitlist(self.clubs[0], self.competition, 7)
+        self.allocated()
+        # the 5 places free are booked at once, the club waiting for the last one
+        self.assertEqual({"competition1": 5}, self.service.holdings(self.clubs[0]))
+        self.assertEqual(1, self.service.waitlist.waiting_for("club0", "competition1"))
+
+    def test__released_places__allocated_first_come_first_served(self):
+        """
+        Plot:
+            club0 books every place, club1 then club2 join the waitlist for 2 places each,
+            club3 tries to book a cancelled place, then club0 cancels 3 places
+        Result:
+            club1 gets 2 places, club2 1 and waits for the other, club3 gets none
+        """
+        self.service.purchase(self.clubs[0], self.competition, 5)
+        self.service.join_waitlist(self.clubs[1], self.competition, 2)
+        self.service.join_waitlist(self.clubs[2], self.competition, 2)
+        self.service.cancel(self.clubs[0], self.competition, 1)
+        with self.assertRaises(booking.NotEnoughPlaces):
+            # the place released is kept for the waitlist
+            self.service.purchase(self.clubs[3], self.competition, 1)
+        self.service.cancel(self.clubs[0], self.competition, 2)
+        self.allocated()
+        self.assertEqual({"competition1": 2}, self.service.holdings(self.clubs[1]))
+        self.assertEqual({"competition1": 1}, self.service.holdings(self.clubs[2]))
+        self.assertEqual({}, self.service.holdings(self.clubs[3]))
+        self.assertEqual(0, self.competition.number_of_places)
+        self.assertEqual(18, self.clubs[1].points)
+        self.assertEqual(1, self.service.waitlist.waiting("competition1"))
+        self.assertEqual([], self.service.reconcile())
+
+    def test__allocation__club_without_points_dropped(self):
+        self.service.purchase(self.clubs[0], self.competition, 5)
+        self.service.join_waitlist(self.clubs[1], self.competition, 3)
+        self.service.join_waitlist(self.clubs[2], self.competition, 1)
+        self.clubs[1].points = 1
+        self.service.cancel(self.clubs[0], self.competition, 3)
+        self.allocated()
+        self.assertEqual({}, self.service.holdings(self.clubs[1]))
+        self.assertEqual({"competition1": 1}, self.service.holdings(self.clubs[2]))
+        self.assertEqual(2, self.competition.number_of_places)
+        # nobody waits anymore, the places are open to bookings again
+        self.service.purchase(self.clubs[3], self.competition, 2)
+
+    def test__join__positive_places(self):
+        self.service.purchase(self.clubs[0], self.competition, 5)
+        self.service.join_waitlist(self.clubs[1], self.competition, 1)
+        for places in (0, -3):
+            with self.assertRaises(booking.InvalidPlaces):
+                self.service.join_waitlist(self.clubs[2], self.competition, places)
+        self.assertEqual(1, self.service.waitlist.waiting("competition1"))
+
+    def test__allocation__entry_without_places_dropped(self):
+        """
+        Plot:
+            An entry for no place gets at the head of the waitlist, club2 waiting behind it, then a place is released
+        Result:
+            The entry is dropped instead of holding the queue, club2 gets the place
+        """
+        self.service.purchase(self.clubs[0], self.competition, 5)
+        self.service.waitlist.join("club1", "competition1", 0)
+        self.service.join_waitlist(self.clubs[2], self.competition, 1)
+        self.service.cancel(self.clubs[0], self.competition, 1)
+        self.allocated()
+        self.assertEqual({"competition1": 1}, self.service.holdings(self.clubs[2]))
+        self.assertEqual(0, self.service.waitlist.waiting("competition1"))
+
+    def test__leave__next_club_served(self):
+        self.service.purchase(self.clubs[0], self.competition, 4)
+        self.service.join_waitlist(self.clubs[1], self.competition, 3)
+        self.service.join_waitlist(self.clubs[2], self.competition, 1)
+        self.allocated()
+        self.assertEqual({"competition1": 1}, self.service.holdings(self.clubs[1]))
+        self.service.leave_waitlist(self.clubs[1], self.competition)
+        self.service.cancel(self.clubs[0], self.competition, 1)
+        self.allocated()
+        self.assertEqual({"competition1": 1}, self.service.holdings(self.clubs[2]))
+        self.assertEqual(0, self.service.waitlist.waiting("competition1"))
+
+
+class BookingStressTester(unittest.TestCase):
+    BOOKINGS = 5000
+
+    def setUp(self):
+        self.switch_interval = sys.getswitchinterval()
+        # switch threads as often as possible to expose races between check and update
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    def test__concurrent_purchases__invariants(self):
+        """
+        Plot:
+            Thousands of bookings race on a few competitions from a few dozen clubs
+        Result:
+            No competition is oversold, no club spends more than its points or
+            holds more than 12 places on a competition, and every point spent
+            matches a place taken and a ledger entry
+        """
+        clubs = [Club(f"club{i}", f"club{i}@mail.com", 300) for i in range(32)]
+        competitions = [Competition(f"competition{i}", DATE, 200) for i in range(4)]
+        service = booking.BookingService(Registry(clubs, competitions))
+        randomizer = random.Random(11)
+        requests = [
+            (randomizer.choice(clubs), randomizer.choice(competitions), randomizer.randint(1, 3))
+            for _ in range(self.BOOKINGS)
+        ]
+
+        def book(request):
+            try:
+                service.purchase(*request)
+            except booking.BookingError:
+                return 0
+            return request[2]
+
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            booked = sum(executor.map(book, requests))
+
+        points_spent = sum(300 - club.points for club in clubs)
+        places_taken = sum(200 - competition.number_of_places for competition in competitions)
+        self.assertTrue(all(club.points >= 0 for club in clubs))
+        self.assertTrue(all(competition.number_of_places >= 0 for competition in competitions))
+        self.assertEqual(booked, points_spent)
+        self.assertEqual(booked, places_taken)
+        # demand largely exceeds supply, every competition must end up sold out
+        self.assertEqual(800, places_taken)
+        holdings = [service.holdings(club) for club in clubs]
+        self.assertEqual(800, sum(sum(held.values()) for held in holdings))
+        self.assertTrue(all(places <= booking.PLACES_MAX_LIMIT for held in holdings for places in held.values()))
+        self.assertEqual([], service.reconcile())
+
+    def test__concurrent_waitlist__invariants(self):
+        """
+        Plot:
+            Threads book, cancel and join the waitlist of a few small competitions at random
+        Result:
+            Once the waitlists are served, no competition is oversold, the ledger agrees with the
+            counters, and a club still waiting means its competition has no place free
+        """
+        clubs = [Club(f"club{i}", f"club{i}@mail.com", 1000) for i in range(16)]
+        competitions = [Competition(f"competition{i}", DATE, 20) for i in range(3)]
+        service = booking.BookingService(Registry(clubs, competitions))
+        randomizer = random.Random(13)
+        requests = [
+            (randomizer.choice(['purchase', 'cancel', 'join_waitlist']), randomizer.choice(clubs),
+             randomizer.choice(competitions), randomizer.randint(1, 3))
+            for _ in range(self.BOOKINGS)
+        ]
+
+        def run(request):
+            action, club, competition, places = request
+            try:
+                getattr(service, action)(club, competition, places)
+            except booking.BookingError:
+                pass
+
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            list(executor.map(run, requests))
+        service.allocator.join()
+
+        self.assertEqual([], service.reconcile())
+        for competition in competitions:
+            self.assertTrue(0 <= competition.number_of_places <= 20)
+            held = sum(service.holdings(club).get(competition.name, 0) for club in clubs)
+            self.assertEqual(20 - competition.number_of_places, held)
+            if service.waitlist.waiting(competition.name):
+                self.assertEqual(0, competition.number_of_places)
+        booked = 60 - sum(competition.number_of_places for competition in competitions)
+        self.assertEqual(16 * 1000 - sum(club.points for club in clubs), booked)
+
+
+if __name__ == "__main__":
+    unittest.main()
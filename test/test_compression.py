@@ -0,0 +1,95 @@
+import datetime
+import gzip
+import unittest
+from unittest.mock import patch
+
+import compression
+import server
+from entities import Club
+from entities import Competition
+
+
+class CompressionTester(unittest.TestCase):
+    def setUp(self):
+        clubs = [Club(f"club{i:04}", f"club{i}@mail.com", 10) for i in range(1000)]
+        competitions = [Competition(f"competition{i:04}", datetime.datetime(2100, 1, 1), 5) for i in range(10)]
+        self.app = server.create_app()
+        self.app.extensions['gudlft'].registry.load(clubs, competitions)
+
+    def test__page__gzip_negotiated(self):
+        """
+        Plot:
+            A page of 50 clubs is asked for with and without gzip accepted, then revalidated with the ETag
+            of the compressed copy
+        Result:
+            The compressed page is the same page once decompressed, under a weak ETag which still gets a 304
+        """
+        with self.app.test_client() as client:
+            plain = client.get("/clubs")
+            response = client.get("/clubs", headers={"Accept-Encoding": "gzip, deflate"})
+            revalidated = client.get(
+                "/clubs", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]}
+            )
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertEqual("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(plain.data, gzip.decompress(response.data))
+        self.assertLess(response.content_length, plain.content_length / 3)
+        self.assertEqual(f'W/{plain.headers["ETag"]}', response.headers["ETag"])
+        self.assertEqual(304, revalidated.status_code)
+        self.assertEqual(response.headers["ETag"], revalidated.headers["ETag"])
+        self.assertEqual("Accept-Encoding", revalidated.headers["Vary"])
+
+    def test__small_response__not_compressed(self):
+        with self.app.test_client() as client:
+            response = client.get("/api/competitions", headers={"Accept-Encoding": "gzip"})
+            refused = client.get("/clubs", headers={"Accept-Encoding": "gzip;q=0"})
+        self.assertLess(response.content_length, 1024)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertNotIn("Content-Encoding", refused.headers)
+
+    def test__streamed_page__compressed_as_generated(self):
+        with self.app.test_client() as client:
+            # streamed bodies are read before the next request
+            plain = client.get("/clubs", query_string={"per_page": "1000"}).data
+            response = client.get("/clubs", query_string={"per_page": "1000"}, headers={"Accept-Encoding": "gzip"})
+            self.assertIsNone(response.content_length)
+            self.assertEqual("gzip", response.headers["Content-Encoding"])
+            self.assertEqual(plain, gzip.decompress(response.data))
+
+    def test__api__not_modified_with_compressed_etag(self):
+        with self.app.test_client() as client:
+            response = client.get("/api/clubs", headers={"Accept-Encoding": "gzip"})
+            self.assertEqual("gzip", response.headers["Content-Encoding"])
+            response = client.get(
+                "/api/clubs", headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]}
+            )
+        self.assertEqual(304, response.status_code)
+        self.assertTrue(response.headers["ETag"].startswith("W/"))
+
+    def test__index__precompressed_once(self):
+        """
+        Plot:
+            The index is asked for three times accepting gzip, and once not accepting it
+        Result:
+            It is rendered once per encoding, the compressed bytes being the same every time
+        """
+        render = server.render
+        with patch("server.render", side_effect=render) as rendered, self.app.test_client() as client:
+            bodies = [client.get("/", headers={"Accept-Encoding": "gzip"}).data for _ in range(3)]
+            plain = client.get("/")
+        self.assertEqual(2, rendered.call_count)
+        self.assertEqual(1, len(set(bodies)))
+        self.assertEqual(plain.data, gzip.decompress(bodies[0]))
+
+    @unittest.skipIf(compression.brotli is None, "brotli is not installed")
+    def test__brotli__preferred(self):
+        with self.app.test_client() as client:
+            plain = client.get("/clubs")
+            response = client.get("/clubs", headers={"Accept-Encoding": "gzip, br"})
+        self.assertEqual("br", response.headers["Content-Encoding"])
+        self.assertEqual(plain.data, compression.brotli.decompress(response.data))
+
+
+if __name__ == "__main__":
+    unittest.main()
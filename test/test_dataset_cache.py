@@ -0,0 +1,43 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import dataset_cache
+from dataset_cache import load_json_documents
+
+
+@unittest.skipIf(dataset_cache.msgpack is None, "msgpack with its C extension is not installed")
+class DatasetCacheTester(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'clubs.json')
+        self.cache_path = os.path.join(self.directory, 'cache.msgpack')
+        self.write({'clubs': [{'name': 'Club', 'email': 'club@mail.com', 'points': '13'}]})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, document):
+        with open(self.path, 'w') as source:
+            json.dump(document, source)
+
+    def test__load__reuses_snapshot(self):
+        first = load_json_documents([self.path], self.cache_path)
+        with patch('dataset_cache.read_json') as read_json:
+            second = load_json_documents([self.path], self.cache_path)
+        read_json.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test__load__rebuilds_snapshot_when_source_changes(self):
+        load_json_documents([self.path], self.cache_path)
+        self.write({'clubs': []})
+        os.utime(self.path, ns=(0, 0))
+        self.assertEqual([{'clubs': []}], load_json_documents([self.path], self.cache_path))
+
+    def test__load__ignores_corrupt_snapshot(self):
+        with open(self.cache_path, 'wb') as cache:
+            cache.write(b'\xc1garbage')
+        self.assertEqual('13', load_json_documents([self.path], self.cache_path)[0]['clubs'][0]['points'])
@@ -0,0 +1,127 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import server
+
+
+class DataStoreTester(unittest.TestCase):
+    def test__create_app__loads_on_first_request(self):
+        app = server.create_app()
+        store = app.extensions['gudlft']
+        self.assertFalse(store.loaded)
+        with app.test_client() as client:
+            client.get("/clubs")
+        self.assertTrue(store.loaded)
+
+    def test__create_app__isolated(self):
+        """
+        Plot:
+            A club books places in one application
+        Result:
+            Another application built from the same files still has the places
+        """
+        first, second = server.create_app(), server.create_app()
+        with first.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            client.post(
+                "/purchasePlaces",
+                data={"competition": "Spring Festival", "places": "2"}
+            )
+        self.assertEqual(12, first.extensions['gudlft'].registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(14, second.extensions['gudlft'].registry.find_club_by_name("Simply Lift").points)
+
+    @patch("datastore.gc")
+    def test__create_app__preloaded(self, gc):
+        app = server.create_app({'GUDLFT_PRELOAD': True})
+        self.assertTrue(app.extensions['gudlft'].loaded)
+        gc.freeze.assert_called_once_with()
+
+
+class ReloadTester(unittest.TestCase):
+    CLUBS = [
+        {"name": "club1", "email": "club1@mail.com", "points": "10"},
+        {"name": "club2", "email": "club2@mail.com", "points": "10"}
+    ]
+    COMPETITIONS = [
+        {"name": "competition1", "date": "2100-01-01 10:00:00", "numberOfPlaces": "20"},
+        {"name": "competition2", "date": "2100-02-01 10:00:00", "numberOfPlaces": "20"}
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.clubs_path = os.path.join(self.directory, 'clubs.json')
+        self.competitions_path = os.path.join(self.directory, 'competitions.json')
+        self.write(self.CLUBS, self.COMPETITIONS)
+        self.app = server.create_app({
+            'GUDLFT_CLUBS': self.clubs_path,
+            'GUDLFT_COMPETITIONS': self.competitions_path,
+            'GUDLFT_SNAPSHOT_CACHE': None
+        })
+        self.store = self.app.extensions['gudlft']
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, clubs, competitions):
+        with open(self.clubs_path, 'w') as clubs_file:
+            json.dump({'clubs': clubs}, clubs_file)
+        with open(self.competitions_path, 'w') as competitions_file:
+            json.dump({'competitions': competitions}, competitions_file)
+
+    def test__reload__keeps_bookings(self):
+        """
+        Plot:
+            club1 books 3 places on competition1, then competitions.json gets 5 more places for it,
+            a new competition and loses competition2
+        Result:
+            The new counters include the booking, only the entities changed in the file are touched
+        """
+        registry = self.store.registry
+        club = registry.find_club_by_name("club1")
+        competition = registry.find_competition("competition1")
+        self.store.booking.purchase(club, competition, 3)
+
+        competitions = [
+            {"name": "competition1", "date": "2100-01-01 10:00:00", "numberOfPlaces": "25"},
+            {"name": "competition3", "date": "2100-03-01 10:00:00", "numberOfPlaces": "8"}
+        ]
+        self.write(self.CLUBS, competitions)
+        self.store.reload()
+
+        reloaded = self.store.registry
+        self.assertIsNot(registry, reloaded)
+        self.assertIs(competition, reloaded.find_competition("competition1"))
+        self.assertEqual(22, competition.number_of_places)
+        self.assertEqual(7, reloaded.find_club_by_name("club1").points)
+        self.assertIsNone(reloaded.find_competition("competition2"))
+        self.assertEqual(datetime.datetime(2100, 3, 1, 10), reloaded.find_competition("competition3").date)
+        self.assertEqual(
+            ["competition1", "competition3"],
+            [competition.name for competition in reloaded.competitions_by_date()]
+        )
+        self.assertEqual({"competition1": 3}, self.store.booking.holdings(club))
+        self.assertEqual([], self.store.booking.reconcile())
+
+    def test__reload__booking_after_reload(self):
+        self.store.registry
+        self.write([{"name": "club1", "email": "new@mail.com", "points": "12"}], self.COMPETITIONS)
+        self.store.reload()
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "new@mail.com"})
+            client.post(
+                "/purchasePlaces",
+                data={"competition": "competition2", "places": "2"}
+            )
+        registry = self.store.registry
+        self.assertEqual(10, registry.find_club_by_email("new@mail.com").points)
+        self.assertEqual(18, registry.find_competition("competition2").number_of_places)
+        self.assertIs(registry, self.store.booking.registry)
+
+
+if __name__ == "__main__":
+    unittest.main()
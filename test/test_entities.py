@@ -0,0 +1,42 @@
+import datetime
+import unittest
+
+from entities import Club
+from entities import Competition
+
+
+class EntitiesTester(unittest.TestCase):
+    def test__from_json__counters_and_date_parsed(self):
+        club = Club.from_json({"name": "club1", "email": "club1@mail.com", "points": "13"})
+        competition = Competition.from_json(
+            {"name": "competition1", "date": "2020-03-27 10:00:00", "numberOfPlaces": "25"}
+        )
+        self.assertEqual(Club("club1", "club1@mail.com", 13), club)
+        self.assertEqual(Competition("competition1", datetime.datetime(2020, 3, 27, 10), 25), competition)
+
+    def test__to_json__file_format(self):
+        document = {"name": "competition1", "date": "2020-03-27 10:00:00", "numberOfPlaces": "25"}
+        self.assertEqual(document, Competition.from_json(document).to_json())
+        document = {"name": "club1", "email": "club1@mail.com", "points": "13"}
+        self.assertEqual(document, Club.from_json(document).to_json())
+
+    def test__slots__no_instance_dict(self):
+        club = Club("club1", "club1@mail.com", 13)
+        self.assertFalse(hasattr(club, '__dict__'))
+        with self.assertRaises(AttributeError):
+            club.numberOfPlaces = 3
+
+    def test__update(self):
+        club = Club("club1", "club1@mail.com", 13)
+        club.update(points=10, email="new@mail.com")
+        self.assertEqual(Club("club1", "new@mail.com", 10), club)
+        self.assertEqual({"name": "club1", "email": "new@mail.com", "points": 10}, club.fields())
+
+    def test__compared_by_value__unhashable(self):
+        self.assertNotEqual(Club("club1", "club1@mail.com", 13), Club("club1", "club1@mail.com", 12))
+        with self.assertRaises(TypeError):
+            hash(Club("club1", "club1@mail.com", 13))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+import server
+
+
+class FragmentCacheTester(unittest.TestCase):
+    def setUp(self):
+        self.app = server.create_app()
+
+    def test__clubs__rendered_once(self):
+        with self.app.test_client() as client:
+            client.get("/clubs")
+            misses = self.app.extensions['fragments']['club'].misses
+            response = client.get("/clubs")
+        self.assertEqual(misses, self.app.extensions['fragments']['club'].misses)
+        self.assertIn("Iron Temple - 4 points", response.data.decode("utf-8"))
+
+    def test__purchase_places__changed_rows_rendered(self):
+        """
+        Plot:
+            A club books places after the summary page was displayed once
+        Result:
+            Only the competition and the club involved are rendered again, with their new counters
+        """
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"}, follow_redirects=True)
+            client.get("/clubs")
+            competition_misses = self.app.extensions['fragments']['competition'].misses
+            club_misses = self.app.extensions['fragments']['club'].misses
+
+            client.post(
+                "/purchasePlaces",
+                data={"competition": "Spring Festival", "places": "2"},
+                follow_redirects=True
+            )
+            response = client.get("/clubs")
+
+        self.assertEqual(competition_misses + 1, self.app.extensions['fragments']['competition'].misses)
+        self.assertEqual(club_misses + 1, self.app.extensions['fragments']['club'].misses)
+        self.assertIn("Simply Lift - 12 points", response.data.decode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
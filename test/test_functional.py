@@ -1,16 +1,23 @@
+import datetime
 import unittest
+from unittest.mock import patch
 
 import server
 
 
+# the fixtures were written with "New Competition" still to come
+NOW = datetime.datetime(2022, 5, 16)
+
+
 class ServerTester(unittest.TestCase):
-    def setup(self):
-        server.app = Flask(__name__)
-        server.app.secret_key = 'something_special'
+    def setUp(self):
+        self.app = server.create_app()
+        self.registry = self.app.extensions['gudlft'].registry
+        self.now = patch("server.now", return_value=NOW)
+        self.now.start()
 
     def tearDown(self):
-        server.competitions = server.load_competitions()
-        server.clubs = server.load_clubs()
+        self.now.stop()
 
     def test__happy__login(self):
         """
@@ -19,22 +26,22 @@ class ServerTester(unittest.TestCase):
         Result:
             The welcome template is displayed with status 200
         """
-        with server.app.test_client() as client:
-            response = client.post("/showSummary", data={"email": "admin@irontemple.com"})
+        with self.app.test_client() as client:
+            response = client.post("/showSummary", data={"email": "admin@irontemple.com"}, follow_redirects=True)
             self.assertEqual("200 OK", response.status)
 
-            user = next((club for club in server.clubs if club["name"] == "Iron Temple"), None)
+            user = next((club for club in self.registry.clubs if club.name == "Iron Temple"), None)
             self.assertTrue(user)
 
             response_str = response.data.decode("utf-8")
-            self.assertIn(f"""Welcome, {user["email"]}""", response_str)
-            self.assertIn(f"""Points available: {user["points"]}""", response_str)
+            self.assertIn(f"""Welcome, {user.email}""", response_str)
+            self.assertIn(f"""Points available: {user.points}""", response_str)
 
-            for expected_competition in server.competitions:
-                self.assertIn(expected_competition["name"], response_str)
-                self.assertIn(f"""Date: {expected_competition["date"]}""", response_str)
-                if not expected_competition["is_past"]:
-                    self.assertIn(f"""Number of Places: {expected_competition["numberOfPlaces"]}""", response_str)
+            for expected_competition in self.registry.competitions:
+                self.assertIn(expected_competition.name, response_str)
+                self.assertIn(f"""Date: {expected_competition.date}""", response_str)
+                if expected_competition.date >= NOW:
+                    self.assertIn(f"""Number of Places: {expected_competition.number_of_places}""", response_str)
 
     def test__sad__login(self):
         """
@@ -43,7 +50,7 @@ class ServerTester(unittest.TestCase):
         Result:
             An error message is displayed on the index template
         """
-        with server.app.test_client() as client:
+        with self.app.test_client() as client:
             response = client.post("/showSummary", data={"email": "stuff@mail.com"})
             self.assertEqual("200 OK", response.status)
 
@@ -59,56 +66,57 @@ class ServerTester(unittest.TestCase):
         Result:
             Summary page is displayed showing "Great-booking complete!" and updated number of points/competition list
         """
-        with server.app.test_client() as client:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
             response = client.get("/book/New%20Competition/Simply%20Lift")
             self.assertEqual("200 OK", response.status)
 
-            user = next((club for club in server.clubs if club['name'] == "Simply Lift"), None)
+            user = next((club for club in self.registry.clubs if club.name == "Simply Lift"), None)
             self.assertTrue(user)
 
             competition = next(
-                (competition for competition in server.competitions if competition["name"] == "New Competition"),
+                (competition for competition in self.registry.competitions if competition.name == "New Competition"),
                 None
             )
             self.assertTrue(competition)
 
             response_str = response.data.decode("utf-8")
-            self.assertIn(competition["name"], response_str)
-            self.assertIn(f"""Places available: {competition["numberOfPlaces"]}""", response_str)
+            self.assertIn(competition.name, response_str)
+            self.assertIn(f"""Places available: {competition.number_of_places}""", response_str)
 
-            expected_user_points = str(int(user["points"]) - 1)
-            expected_competition_number_of_places = str(int(competition["numberOfPlaces"]) - 1)
+            expected_user_points = user.points - 1
+            expected_competition_number_of_places = competition.number_of_places - 1
 
             response = client.post(
                 "/purchasePlaces",
                 data=
                 {
                     "competition": "New Competition",
-                    "club": "Simply Lift",
                     "places": "1"
-                }
+                },
+                follow_redirects=True
             )
 
-            user = next((club for club in server.clubs if club['name'] == "Simply Lift"), None)
+            user = next((club for club in self.registry.clubs if club.name == "Simply Lift"), None)
             self.assertTrue(user)
 
             competition = next(
-                (competition for competition in server.competitions if competition["name"] == "New Competition"),
+                (competition for competition in self.registry.competitions if competition.name == "New Competition"),
                 None
             )
             self.assertTrue(competition)
 
             response_str = response.data.decode("utf-8")
-            self.assertIn(f"""Welcome, {user["email"]}""", response_str)
+            self.assertIn(f"""Welcome, {user.email}""", response_str)
             self.assertIn("Great-booking complete!", response_str)
-            self.assertEqual(expected_user_points, user["points"])
-            self.assertIn(f"""Points available: {user["points"]}""", response_str)
-
-            for expected_competition in server.competitions:
-                self.assertIn(expected_competition["name"], response_str)
-                self.assertIn(f"""Date: {expected_competition["date"]}""", response_str)
-                if expected_competition["name"] == "Simply Lift":
-                    self.assertEqual(expected_competition_number_of_places, expected_competition["numberOfPlaces"])
+            self.assertEqual(expected_user_points, user.points)
+            self.assertIn(f"""Points available: {user.points}""", response_str)
+
+            for expected_competition in self.registry.competitions:
+                self.assertIn(expected_competition.name, response_str)
+                self.assertIn(f"""Date: {expected_competition.date}""", response_str)
+                if expected_competition.name == "Simply Lift":
+                    self.assertEqual(expected_competition_number_of_places, expected_competition.number_of_places)
                 self.assertIn(f"""Number of Places: {expected_competition_number_of_places}""", response_str)
 
     def test__sad__booking__1(self):
@@ -123,34 +131,35 @@ class ServerTester(unittest.TestCase):
         Result:
             Summary page is displayed showing "Great-booking complete!" and updated number of points/competition list
         """
-        with server.app.test_client() as client:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
             response = client.get("/book/Spring%20Festival/Simply%20Lift")
             self.assertEqual("200 OK", response.status)
 
             competition = next(
-                (competition for competition in server.competitions if competition["name"] == "Spring Festival"),
+                (competition for competition in self.registry.competitions if competition.name == "Spring Festival"),
                 None
             )
             self.assertTrue(competition)
 
             response_str = response.data.decode("utf-8")
-            self.assertIn(competition["name"], response_str)
-            self.assertIn(f"""Places available: {competition["numberOfPlaces"]}""", response_str)
+            self.assertIn(competition.name, response_str)
+            self.assertIn(f"""Places available: {competition.number_of_places}""", response_str)
 
-            user = next((club for club in server.clubs if club['name'] == "Simply Lift"), None)
+            user = next((club for club in self.registry.clubs if club.name == "Simply Lift"), None)
             self.assertTrue(user)
 
-            expected_competition_number_of_places = competition["numberOfPlaces"]
-            expected_user_points = user["points"]
+            expected_competition_number_of_places = competition.number_of_places
+            expected_user_points = user.points
 
             response = client.post(
                 "/purchasePlaces",
                 data=
                 {
                     "competition": "Spring Festival",
-                    "club": "Simply Lift",
                     "places": "26"
-                }
+                },
+                follow_redirects=True
             )
 
             response_str = response.data.decode("utf-8")
@@ -170,21 +179,22 @@ class ServerTester(unittest.TestCase):
         Result:
             Summary page is displayed showing "Great-booking complete!" and updated number of points/competition list
         """
-        with server.app.test_client() as client:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
             response = client.get("/book/New%20Competition/Simply%20Lift")
             self.assertEqual("200 OK", response.status)
 
             competition = next(
-                (competition for competition in server.competitions if competition["name"] == "New Competition"),
+                (competition for competition in self.registry.competitions if competition.name == "New Competition"),
                 None
             )
             self.assertTrue(competition)
 
             response_str = response.data.decode("utf-8")
-            self.assertIn(competition["name"], response_str)
-            self.assertIn(f"""Places available: {competition["numberOfPlaces"]}""", response_str)
+            self.assertIn(competition.name, response_str)
+            self.assertIn(f"""Places available: {competition.number_of_places}""", response_str)
 
-            user = next((club for club in server.clubs if club['name'] == "Simply Lift"), None)
+            user = next((club for club in self.registry.clubs if club.name == "Simply Lift"), None)
             self.assertTrue(user)
 
             # buy 4 places to lower point count
@@ -193,13 +203,12 @@ class ServerTester(unittest.TestCase):
                 data=
                 {
                     "competition": "New Competition",
-                    "club": "Simply Lift",
                     "places": "4"
                 }
             )
 
-            expected_competition_number_of_places = competition["numberOfPlaces"]
-            expected_user_points = user["points"]
+            expected_competition_number_of_places = competition.number_of_places
+            expected_user_points = user.points
 
             client.get("/book/New%20Competition/Simply%20Lift")
 
@@ -208,9 +217,9 @@ class ServerTester(unittest.TestCase):
                 data=
                 {
                     "competition": "New Competition",
-                    "club": "Simply Lift",
                     "places": "11"
-                }
+                },
+                follow_redirects=True
             )
 
             response_str = response.data.decode("utf-8")
@@ -230,35 +239,36 @@ class ServerTester(unittest.TestCase):
         Result:
             Summary page is displayed showing "Great-booking complete!" and updated number of points/competition list
         """
-        with server.app.test_client() as client:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
             response = client.get("/book/New%20Competition/Simply%20Lift")
             self.assertEqual("200 OK", response.status)
 
             competition = next(
-                (competition for competition in server.competitions if competition["name"] == "New Competition"),
+                (competition for competition in self.registry.competitions if competition.name == "New Competition"),
                 None
             )
             self.assertTrue(competition)
 
             response_str = response.data.decode("utf-8")
-            self.assertIn(competition["name"], response_str)
-            self.assertIn(f"""Places available: {competition["numberOfPlaces"]}""", response_str)
+            self.assertIn(competition.name, response_str)
+            self.assertIn(f"""Places available: {competition.number_of_places}""", response_str)
 
-            user = next((club for club in server.clubs if club['name'] == "Simply Lift"), None)
+            user = next((club for club in self.registry.clubs if club.name == "Simply Lift"), None)
             self.assertTrue(user)
 
             expected_max_booking_limit = 12
-            expected_competition_number_of_places = competition["numberOfPlaces"]
-            expected_user_points = user["points"]
+            expected_competition_number_of_places = competition.number_of_places
+            expected_user_points = user.points
 
             response = client.post(
                 "/purchasePlaces",
                 data=
                 {
                     "competition": "New Competition",
-                    "club": "Simply Lift",
                     "places": "13"
-                }
+                },
+                follow_redirects=True
             )
 
             response_str = response.data.decode("utf-8")
@@ -266,6 +276,151 @@ class ServerTester(unittest.TestCase):
             self.assertIn(f"Places available: {expected_competition_number_of_places}", response_str)
             self.assertIn(f"Club points: {expected_user_points}", response_str)
 
+    def test__happy__booking__session_club(self):
+        """
+        Plot:
+            A logged in user sends a booking naming another club
+        Result:
+            The places are booked for the club the user logged in with
+        """
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            client.post(
+                "/purchasePlaces",
+                data={"competition": "New Competition", "club": "Iron Temple", "places": "1"}
+            )
+        self.assertEqual(13, self.registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(4, self.registry.find_club_by_name("Iron Temple").points)
+
+    def test__happy__bookings(self):
+        """
+        Plot:
+            A logged in user books places on a competition twice, then opens the bookings page
+        Result:
+            The page shows the places booked in total, and the max limit counts both bookings
+        """
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            self.assertIn("No places booked yet.", client.get("/bookings").data.decode("utf-8"))
+            client.post("/purchasePlaces", data={"competition": "New Competition", "places": "3"})
+            client.post("/purchasePlaces", data={"competition": "New Competition", "places": "4"})
+            response_str = client.get("/bookings").data.decode("utf-8")
+            self.assertIn("New Competition", response_str)
+            self.assertIn("Places booked: 7", response_str)
+            response = client.post(
+                "/purchasePlaces", data={"competition": "New Competition", "places": "6"}, follow_redirects=True
+            )
+        self.assertIn("Cannot book more than max limit (12), 7 places already booked.", response.data.decode("utf-8"))
+        self.assertEqual(7, self.registry.find_club_by_name("Simply Lift").points)
+
+    def test__sad__cancel(self):
+        """
+        Plot:
+            Simply Lift books 2 places on New Competition, tries to cancel -20 places, then "two" places,
+            and opens its bookings once the competition started
+        Result:
+            Both cancellations are refused with a message, and the cancel form is no longer shown
+        """
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            client.post("/purchasePlaces", data={"competition": "New Competition", "places": "2"})
+            response = client.post(
+                "/cancelPlaces", data={"competition": "New Competition", "places": "-20"}, follow_redirects=True
+            )
+            self.assertIn("Places must be a positive number.", response.data.decode("utf-8"))
+            response = client.post(
+                "/cancelPlaces", data={"competition": "New Competition", "places": "two"}, follow_redirects=True
+            )
+            self.assertEqual(200, response.status_code)
+            self.assertIn("Please enter a number of places.", response.data.decode("utf-8"))
+            self.assertIn("Cancel</button>", client.get("/bookings").data.decode("utf-8"))
+            self.now.stop()
+            self.now = patch("server.now", return_value=datetime.datetime(2022, 12, 13))
+            self.now.start()
+            response_str = client.get("/bookings").data.decode("utf-8")
+        self.assertIn("Places booked: 2", response_str)
+        self.assertNotIn("Cancel</button>", response_str)
+        self.assertEqual(12, self.registry.find_club_by_name("Simply Lift").points)
+
+    def test__happy__cancel_and_waitlist(self):
+        """
+        Plot:
+            Simply Lift books 12 of the 13 places of Fall Classic, Iron Temple joins its waitlist
+            for 3 places, then Simply Lift cancels 4 places
+        Result:
+            Iron Temple gets the place left at once and waits for 2, which it gets with the cancellation,
+            the 2 other places cancelled being free again
+        """
+        self.now.stop()
+        self.now = patch("server.now", return_value=datetime.datetime(2020, 1, 1))
+        self.now.start()
+        with self.app.test_client() as simply_lift, self.app.test_client() as iron_temple:
+            simply_lift.post("/showSummary", data={"email": "john@simplylift.co"})
+            simply_lift.post("/purchasePlaces", data={"competition": "Fall Classic", "places": "12"})
+            iron_temple.post("/showSummary", data={"email": "admin@irontemple.com"})
+            response = iron_temple.post(
+                "/joinWaitlist", data={"competition": "Fall Classic", "places": "3"}, follow_redirects=True
+            )
+            self.assertIn("You are on the waitlist of Fall Classic for 3 places.", response.data.decode("utf-8"))
+            self.app.extensions['gudlft'].booking.allocator.join()
+            self.assertIn("Waiting for 2 places", iron_temple.get("/bookings").data.decode("utf-8"))
+
+            response = simply_lift.post(
+                "/cancelPlaces", data={"competition": "Fall Classic", "places": "4"}, follow_redirects=True
+            )
+            self.assertIn("Cancelled 4 places on Fall Classic.", response.data.decode("utf-8"))
+            self.app.extensions['gudlft'].booking.allocator.join()
+            response_str = iron_temple.get("/bookings").data.decode("utf-8")
+        self.assertIn("Places booked: 3", response_str)
+        self.assertNotIn("Waiting for", response_str)
+        self.assertEqual(6, self.registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(1, self.registry.find_club_by_name("Iron Temple").points)
+        self.assertEqual(2, self.registry.find_competition("Fall Classic").number_of_places)
+
+    def test__bookings__revalidated_after_leaving_waitlist(self):
+        """
+        Plot:
+            Iron Temple waits for 2 places on Fall Classic, gets its bookings page, leaves the waitlist,
+            then revalidates the page with its ETag
+        Result:
+            The page is sent again, without the places waited for
+        """
+        self.now.stop()
+        self.now = patch("server.now", return_value=datetime.datetime(2020, 1, 1))
+        self.now.start()
+        with self.app.test_client() as simply_lift, self.app.test_client() as iron_temple:
+            simply_lift.post("/showSummary", data={"email": "john@simplylift.co"})
+            simply_lift.post("/purchasePlaces", data={"competition": "Fall Classic", "places": "12"})
+            iron_temple.post("/showSummary", data={"email": "admin@irontemple.com"})
+            iron_temple.post(
+                "/joinWaitlist", data={"competition": "Fall Classic", "places": "3"}, follow_redirects=True
+            )
+            self.app.extensions['gudlft'].booking.allocator.join()
+            response = iron_temple.get("/bookings")
+            self.assertIn("Waiting for 2 places", response.data.decode("utf-8"))
+            etag = response.headers["ETag"]
+            iron_temple.post("/leaveWaitlist", data={"competition": "Fall Classic"}, follow_redirects=True)
+            response = iron_temple.get("/bookings", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers["ETag"])
+        self.assertNotIn("Waiting for", response.data.decode("utf-8"))
+
+    def test__sad__logged_out(self):
+        """
+        Plot:
+            A user opens the summary page without logging in, then after logging out
+        Result:
+            The user is sent back to the index template both times
+        """
+        with self.app.test_client() as client:
+            self.assertEqual("/", client.get("/showSummary").location)
+
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            self.assertEqual("200 OK", client.get("/showSummary").status)
+            client.get("/logout")
+            response = client.get("/showSummary", follow_redirects=True)
+        self.assertIn("Please log in with your secretary email.", response.data.decode("utf-8"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,9 +1,12 @@
 import datetime
 import unittest
 from contextlib import contextmanager
+from unittest.mock import patch
 from flask import template_rendered
 
 import server
+from entities import Club
+from entities import Competition
 
 
 unittest.TestLoader.sortTestMethodsUsing = None
@@ -23,35 +26,31 @@ def captured_templates(app):
 
 
 class ServerTester(unittest.TestCase):
-    def setup(self):
-        server.app = Flask(__name__)
-        server.app.secret_key = 'something_special'
-
-    def tearDown(self):
-        server.competitions = server.load_competitions()
-        server.clubs = server.load_clubs()
+    def setUp(self):
+        self.app = server.create_app()
+        self.registry = self.app.extensions['gudlft'].registry
 
     # ROUTES ------------------------------------------------------------------------
     def test__index_rendered(self):
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
+        with self.app.test_client() as client:
+            with captured_templates(self.app) as templates:
                 client.get("/")
                 template, _ = templates[0]
                 expected_name = template.name
                 self.assertEqual(expected_name, "index.html")
 
     def test__clubs_rendered(self):
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
-                client.post("/clubs", data={"email": "admin@irontemple.com"})
+        with self.app.test_client() as client:
+            with captured_templates(self.app) as templates:
+                client.get("/clubs")
                 template, _ = templates[0]
                 expected_name = template.name
                 self.assertEqual(expected_name, "clubs.html")
 
     def test__show_summary__welcome_rendered(self):
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
-                client.post("/showSummary", data={"email": "admin@irontemple.com"})
+        with self.app.test_client() as client:
+            with captured_templates(self.app) as templates:
+                client.post("/showSummary", data={"email": "admin@irontemple.com"}, follow_redirects=True)
                 template, _ = templates[0]
                 expected_name = template.name
                 self.assertEqual(expected_name, "welcome.html")
@@ -60,8 +59,9 @@ class ServerTester(unittest.TestCase):
         """
         booking.html is rendered if club name and competition name are found
         """
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            with captured_templates(self.app) as templates:
                 client.get("/book/Spring%20Festival/Simply%20Lift")
                 template, _ = templates[0]
                 expected_name = template.name
@@ -72,9 +72,10 @@ class ServerTester(unittest.TestCase):
         """
         welcome.html is rendered if either club name or competition name is not found
         """
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
-                client.get("/book/competition_name/club_name")
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            with captured_templates(self.app) as templates:
+                client.get("/book/competition_name/Simply%20Lift", follow_redirects=True)
                 template, _ = templates[0]
                 expected_name = template.name
                 self.assertEqual(expected_name, "welcome.html")
@@ -83,69 +84,69 @@ class ServerTester(unittest.TestCase):
         """
         welcome.html is rendered upon purchasePlaces form sending
         """
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            with captured_templates(self.app) as templates:
                 client.post(
                     "/purchasePlaces",
                     data=
                     {
                         "competition": "Spring Festival",
-                        "club": "Simply Lift",
                         "places": "1"
-                    }
+                    },
+                    follow_redirects=True
                 )
                 template, _ = templates[0]
                 expected_name = template.name
                 self.assertEqual(expected_name, "welcome.html")
 
     def test__logout__index_redirected(self):
-        with server.app.test_client() as client:
+        with self.app.test_client() as client:
             response = client.get("/logout")
             self.assertEqual("/", response.location)
 
+    def test__logout__session_cleared(self):
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "admin@irontemple.com"})
+            with client.session_transaction() as session:
+                self.assertEqual("Iron Temple", session["club"])
+            client.get("/logout")
+            with client.session_transaction() as session:
+                self.assertNotIn("club", session)
+
+    def test__book__other_club_redirected(self):
+        """
+        A logged in club cannot open the booking page of another club
+        """
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "admin@irontemple.com"})
+            response = client.get("/book/Spring%20Festival/Simply%20Lift")
+            self.assertEqual("/showSummary", response.location)
+
     # CONTEXTS ----------------------------------------------------------------------
     def test__show_summary__club(self):
         """
         This test checks that render_template method is called within show_summary function with the right club
         """
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
-                client.post("/showSummary", data={"email": "admin@irontemple.com"})
+        with self.app.test_client() as client:
+            with captured_templates(self.app) as templates:
+                client.post("/showSummary", data={"email": "admin@irontemple.com"}, follow_redirects=True)
                 _, context = templates[0]
-                expected_club = {
-                    "name": "Iron Temple",
-                    "email": "admin@irontemple.com",
-                    "points": "4"
-                }
+                expected_club = Club("Iron Temple", "admin@irontemple.com", 4)
                 self.assertEqual(expected_club, context["club"])
 
     def test__show_summary__competitions(self):
         """
         This test checks that render_template method is called within show_summary function with the right competitions
         """
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
-                client.post("/showSummary", data={"email": "admin@irontemple.com"})
+        with self.app.test_client() as client:
+            with captured_templates(self.app) as templates:
+                client.post("/showSummary", data={"email": "admin@irontemple.com"}, follow_redirects=True)
                 _, context = templates[0]
                 expected_competitions = [
-                    {
-                        "name": "Spring Festival",
-                        "date": datetime.datetime(2020, 3, 27, 10, 0),
-                        "numberOfPlaces": "25",
-                        "is_past": True
-                    },
-                    {
-                        "name": "Fall Classic",
-                        "date": datetime.datetime(2020, 10, 22, 13, 30),
-                        "numberOfPlaces": "13",
-                        "is_past": True
-                    },
-                    {
-                        "name": "New Competition",
-                        "date": datetime.datetime(2022, 12, 12, 14, 0),
-                        "numberOfPlaces": "25",
-                        "is_past": False
-                    }
+                    Competition("Spring Festival", datetime.datetime(2020, 3, 27, 10, 0), 25),
+                    Competition("Fall Classic", datetime.datetime(2020, 10, 22, 13, 30), 13),
+                    Competition("New Competition", datetime.datetime(2022, 12, 12, 14, 0), 25)
                 ]
                 self.assertEqual(expected_competitions, context["competitions"])
 
@@ -153,97 +154,145 @@ class ServerTester(unittest.TestCase):
         """
         This test checks that render_template method is called within book function with the right club
         """
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            with captured_templates(self.app) as templates:
                 client.get("/book/Spring%20Festival/Simply%20Lift")
                 _, context = templates[0]
-                expected_club = {
-                    "name": "Simply Lift",
-                    "email": "john@simplylift.co",
-                    "points": "14"
-                }
+                expected_club = Club("Simply Lift", "john@simplylift.co", 14)
                 self.assertEqual(expected_club, context["club"])
 
     def test__book__competitions(self):
         """
         This test checks that render_template method is called within book function with the right competition
         """
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            with captured_templates(self.app) as templates:
                 client.get("/book/Spring%20Festival/Simply%20Lift")
                 _, context = templates[0]
-                expected_competition = {
-                    "name": "Spring Festival",
-                    "date": datetime.datetime(2020, 3, 27, 10, 0),
-                    "numberOfPlaces": "25",
-                    "is_past": True
-                }
+                expected_competition = Competition("Spring Festival", datetime.datetime(2020, 3, 27, 10, 0), 25)
                 self.assertEqual(expected_competition, context["competition"])
 
     def test__purchase_places__club(self):
         """
         This test checks that render_template method is called within purchase_places function with the right club
         """
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            with captured_templates(self.app) as templates:
                 client.post(
                     "/purchasePlaces",
                     data=
                     {
                         "competition": "Spring Festival",
-                        "club": "Simply Lift",
                         "places": "1"
-                    }
+                    },
+                    follow_redirects=True
                 )
                 _, context = templates[0]
-                expected_club = {
-                    "name": "Simply Lift",
-                    "email": "john@simplylift.co",
-                    "points": "13"
-                }
+                expected_club = Club("Simply Lift", "john@simplylift.co", 13)
                 self.assertEqual(expected_club, context["club"])
 
-    # this fails because of inconsistency in numberOfPlaces type (int/str)
     def test__purchase_places__competitions(self):
         """
         This test checks that render_template method is called within purchase_places function with the right competitions
         it also checks if numberOfPlaces is updated after purchase
         """
-        with server.app.test_client() as client:
-            with captured_templates(server.app) as templates:
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            with captured_templates(self.app) as templates:
                 client.post(
                     "/purchasePlaces",
                     data=
                     {
                         "competition": "Spring Festival",
-                        "club": "Simply Lift",
                         "places": "1"
-                    }
+                    },
+                    follow_redirects=True
                 )
                 _, context = templates[0]
                 expected_competitions = [
-                    {
-                        "name": "Spring Festival",
-                        "date": datetime.datetime(2020, 3, 27, 10, 0),
-                        # one place booked in this test
-                        "numberOfPlaces": "24",
-                        "is_past": True
-                    },
-                    {
-                        "name": "Fall Classic",
-                        "date": datetime.datetime(2020, 10, 22, 13, 30),
-                        "numberOfPlaces": "13",
-                        "is_past": True
-                    },
-                    {
-                        "name": "New Competition",
-                        "date": datetime.datetime(2022, 12, 12, 14, 0),
-                        "numberOfPlaces": "25",
-                        "is_past": False
-                    }
+                    # one place booked in this test
+                    Competition("Spring Festival", datetime.datetime(2020, 3, 27, 10, 0), 24),
+                    Competition("Fall Classic", datetime.datetime(2020, 10, 22, 13, 30), 13),
+                    Competition("New Competition", datetime.datetime(2022, 12, 12, 14, 0), 25)
                 ]
                 self.assertEqual(expected_competitions, context["competitions"])
 
 
+class ConditionalRequestTester(unittest.TestCase):
+    def setUp(self):
+        self.app = server.create_app()
+
+    def test__index__not_modified(self):
+        with self.app.test_client() as client:
+            response = client.get("/")
+            self.assertEqual("no-cache", response.headers["Cache-Control"])
+            with captured_templates(self.app) as templates:
+                response = client.get("/", headers={"If-None-Match": response.headers["ETag"]})
+            self.assertEqual(304, response.status_code)
+            self.assertEqual([], templates)
+
+    def test__show_summary__modified_by_booking(self):
+        """
+        Plot:
+            A club revalidates its summary before and after another club books places
+        Result:
+            304 first, then the page rendered again under a new ETag
+        """
+        with self.app.test_client() as client, self.app.test_client() as other:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            response = client.get("/showSummary")
+            etag = response.headers["ETag"]
+            self.assertEqual("private, no-cache", response.headers["Cache-Control"])
+            self.assertEqual(304, client.get("/showSummary", headers={"If-None-Match": etag}).status_code)
+
+            other.post("/showSummary", data={"email": "admin@irontemple.com"})
+            other.post("/purchasePlaces", data={"competition": "Fall Classic", "places": "1"})
+            response = client.get("/showSummary", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers["ETag"])
+
+    def test__show_summary__per_club(self):
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            etag = client.get("/clubs").headers["ETag"]
+            client.post("/showSummary", data={"email": "admin@irontemple.com"})
+            self.assertEqual(200, client.get("/clubs", headers={"If-None-Match": etag}).status_code)
+
+    def test__show_summary__modified_by_time(self):
+        """
+        Plot:
+            A club revalidates its summary before and after "New Competition" takes place
+        Result:
+            The page is rendered again, its booking link gone
+        """
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            with patch("server.now", return_value=datetime.datetime(2022, 12, 12, 13, 0)):
+                etag = client.get("/showSummary").headers["ETag"]
+                self.assertEqual(304, client.get("/showSummary", headers={"If-None-Match": etag}).status_code)
+            with patch("server.now", return_value=datetime.datetime(2022, 12, 12, 15, 0)):
+                response = client.get("/showSummary", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn(b"/book/New%20Competition/Simply%20Lift", response.data)
+
+    def test__show_summary__flashed_messages_rendered(self):
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            etag = client.get("/showSummary").headers["ETag"]
+            client.post("/purchasePlaces", data={"competition": "Fall Classic", "places": "20"})
+            response = client.get("/showSummary", headers={"If-None-Match": etag})
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn("ETag", response.headers)
+
+    def test__clubs__not_modified_since(self):
+        with self.app.test_client() as client:
+            last_modified = client.get("/clubs").headers["Last-Modified"]
+            response = client.get("/clubs", headers={"If-Modified-Since": last_modified})
+        self.assertEqual(304, response.status_code)
+
+
 if __name__ == "__main__":
     unittest.main()
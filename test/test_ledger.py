@@ -0,0 +1,86 @@
+import datetime
+import threading
+import unittest
+
+from entities import Club
+from entities import Competition
+from ledger import Ledger
+from ledger import Mismatch
+from ledger import Reconciler
+from registry import Registry
+
+
+DATE = datetime.datetime(2100, 1, 1)
+
+
+class LedgerTester(unittest.TestCase):
+    def setUp(self):
+        self.club = Club("club1", "club1@mail.com", 13)
+        self.competition = Competition("competition1", DATE, 25)
+        self.registry = Registry([self.club], [self.competition])
+        self.ledger = Ledger()
+        self.ledger.open(self.registry)
+
+    def book(self, places):
+        self.ledger.record("club1", "competition1", places)
+        self.club.points -= places
+        self.competition.number_of_places -= places
+
+    def test__record__running_totals(self):
+        self.book(3)
+        self.book(4)
+        self.book(-3)
+        self.assertEqual(4, self.ledger.held("club1", "competition1"))
+        self.assertEqual(0, self.ledger.held("club1", "competition2"))
+        self.assertEqual({"competition1": 4}, self.ledger.holdings("club1"))
+        self.assertEqual([3, 4, -3], [entry.places for entry in self.ledger.history("club1")])
+        self.assertEqual(3, len(self.ledger))
+        self.assertEqual([], self.ledger.reconcile(self.registry))
+
+    def test__reconcile__counter_changed_outside_bookings(self):
+        self.book(3)
+        self.club.points = 5
+        self.assertEqual([Mismatch('club', "club1", 10, 5)], self.ledger.reconcile(self.registry))
+        self.assertEqual([], self.ledger.reconcile(self.registry, counters=False))
+
+    def test__open__counters_reloaded(self):
+        """
+        Plot:
+            club1 books 3 places, then its points are raised to 20 by a reload and the ledger reopened
+        Result:
+            The counters agree with the ledger, the places held are unchanged
+        """
+        self.book(3)
+        self.club.points = 20
+        self.ledger.open(self.registry)
+        self.assertEqual([], self.ledger.reconcile(self.registry))
+        self.assertEqual(3, self.ledger.held("club1", "competition1"))
+
+    def test__carry__held_without_entries(self):
+        self.ledger.carry("club1", "competition1", 5)
+        self.book(2)
+        self.assertEqual(7, self.ledger.held("club1", "competition1"))
+        self.assertEqual([("club1", "competition1", 7)], self.ledger.totals())
+        self.assertEqual([], self.ledger.reconcile(self.registry))
+
+
+class ReconcilerTester(unittest.TestCase):
+    def test__mismatches_logged(self):
+        called = threading.Event()
+
+        def reconcile():
+            called.set()
+            return [Mismatch('club', "club1", 10, 5)] * 12
+
+        reconciler = Reconciler(reconcile, 0.01)
+        with self.assertLogs('ledger', 'WARNING') as logs:
+            reconciler.start()
+            called.wait(5)
+            reconciler.stop()
+            reconciler.join()
+        self.assertIn("club club1 is 5, 10 by the ledger", logs.output[0])
+        self.assertIn("2 more mismatches with the ledger", logs.output[10])
+
+
+if __name__ == "__main__":
+    unittest.main()
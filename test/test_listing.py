@@ -0,0 +1,92 @@
+import datetime
+import unittest
+
+import server
+from entities import Club
+from entities import Competition
+from listing import filter_competitions
+from listing import Page
+from listing import page_arguments
+
+
+class ListingTester(unittest.TestCase):
+    def test__page__slice_and_has_next(self):
+        page = Page(iter(range(10)), number=2, size=4)
+        self.assertEqual([4, 5, 6, 7], list(page))
+        self.assertTrue(page.has_next)
+        self.assertTrue(page.has_previous)
+
+        page = Page(iter(range(10)), number=3, size=4)
+        self.assertEqual([8, 9], list(page))
+        self.assertFalse(page.has_next)
+
+    def test__page__sequence_indexed(self):
+        page = Page(range(10), number=2, size=4)
+        self.assertEqual([4, 5, 6, 7], list(page))
+        self.assertTrue(page.has_next)
+
+        page = Page(range(10), number=3, size=4)
+        self.assertEqual([8, 9], list(page))
+        self.assertFalse(page.has_next)
+
+    def test__page_arguments__clamped(self):
+        self.assertEqual((1, 50), page_arguments({}))
+        self.assertEqual((1, 5000), page_arguments({"page": "-3", "per_page": "100000"}))
+        self.assertEqual((1, 50), page_arguments({"page": "stuff"}))
+
+    def test__filter_competitions(self):
+        moment = datetime.datetime(2022, 1, 1)
+        competitions = [
+            Competition("past", datetime.datetime(2021, 1, 1), 3),
+            Competition("sold out", datetime.datetime(2023, 1, 1), 0),
+            Competition("open", datetime.datetime(2023, 1, 1), 3)
+        ]
+        self.assertEqual(competitions[1:], list(filter_competitions(competitions, moment, upcoming=True)))
+        self.assertEqual(competitions[::2], list(filter_competitions(competitions, moment, available=True)))
+        self.assertEqual(
+            competitions[2:],
+            list(filter_competitions(competitions, moment, upcoming=True, available=True))
+        )
+
+
+class ListingRoutesTester(unittest.TestCase):
+    def setUp(self):
+        clubs = [Club(f"club{i:04}", f"club{i}@mail.com", 10) for i in range(1000)]
+        competitions = [
+            Competition(f"competition{i:04}", datetime.datetime(2000 if i % 3 == 0 else 2100, 1, 1), i % 2)
+            for i in range(1000)
+        ]
+        self.app = server.create_app()
+        self.app.extensions['gudlft'].registry.load(clubs, competitions)
+
+    def test__show_summary__filtered_page(self):
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "club1@mail.com"})
+            response = client.get(
+                "/showSummary",
+                query_string={"upcoming": "1", "available": "1", "prefix": "competition00", "per_page": "3", "page": "2"}
+            )
+        response_str = response.data.decode("utf-8")
+        # upcoming with places left: odd numbers not multiple of 3
+        for name in ["competition0011", "competition0013", "competition0017"]:
+            self.assertIn(name, response_str)
+        self.assertNotIn("competition0007", response_str)
+        self.assertNotIn("competition0019", response_str)
+        self.assertIn("Next page", response_str)
+        self.assertIn("Previous page", response_str)
+
+    def test__clubs__streamed_when_large(self):
+        with self.app.test_client() as client:
+            response = client.get("/clubs")
+            self.assertIsNotNone(response.content_length)
+            self.assertEqual(50, response.data.count(b"<li>"))
+
+            response = client.get("/clubs", query_string={"per_page": "1000"})
+            # streamed bodies have no length known upfront
+            self.assertIsNone(response.content_length)
+            self.assertEqual(1000, response.data.count(b"<li>"))
+            self.assertNotIn(b"Next page", response.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import server
+from metrics import Histogram
+
+
+class HistogramTester(unittest.TestCase):
+    def test__render__cumulative_buckets(self):
+        histogram = Histogram('latency_seconds', 'Latency.', 'route', buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.1, 0.5, 3):
+            histogram.observe('index', seconds)
+        self.assertEqual(
+            [
+                '# HELP latency_seconds Latency.',
+                '# TYPE latency_seconds histogram',
+                'latency_seconds_bucket{route="index",le="0.1"} 2',
+                'latency_seconds_bucket{route="index",le="1.0"} 3',
+                'latency_seconds_bucket{route="index",le="+Inf"} 4',
+                'latency_seconds_sum{route="index"} 3.65',
+                'latency_seconds_count{route="index"} 4',
+            ],
+            histogram.render()
+        )
+
+
+class MetricsTester(unittest.TestCase):
+    def setUp(self):
+        self.app = server.create_app()
+
+    def test__metrics__requests_and_bookings(self):
+        """
+        Plot:
+            A club logs in, books places once successfully and once over the 12 places limit
+        Result:
+            /metrics reports the requests per route, the template rendered, the lock waits and both outcomes
+        """
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"}, follow_redirects=True)
+            for places in ("1", "13"):
+                client.post(
+                    "/purchasePlaces",
+                    data={"competition": "Spring Festival", "places": places},
+                    follow_redirects=True
+                )
+            response = client.get("/metrics")
+
+        self.assertEqual("text/plain; version=0.0.4; charset=utf-8", response.headers["Content-Type"])
+        lines = response.data.decode("utf-8").splitlines()
+        self.assertIn('gudlft_request_duration_seconds_count{route="pages.login"} 1', lines)
+        # once after logging in, once after the booking, the rejected booking showing the booking page again
+        self.assertIn('gudlft_request_duration_seconds_count{route="pages.show_summary"} 2', lines)
+        self.assertIn('gudlft_request_duration_seconds_count{route="pages.purchase_places"} 2', lines)
+        self.assertIn('gudlft_lookup_duration_seconds_count{route="pages.purchase_places"} 2', lines)
+        self.assertIn('gudlft_render_duration_seconds_count{template="welcome.html"} 2', lines)
+        self.assertIn('gudlft_render_duration_seconds_count{template="booking.html"} 1', lines)
+        self.assertIn('gudlft_booking_lock_wait_seconds_count 2', lines)
+        self.assertIn('gudlft_bookings_total{outcome="ok"} 1', lines)
+        self.assertIn('gudlft_bookings_total{outcome="over_limit"} 1', lines)
+        # the other pages showed a flashed message, which are never cached
+        self.assertIn('gudlft_page_cache_requests_total{result="miss"} 1', lines)
+
+    def test__metrics__ledger_mismatches(self):
+        store = self.app.extensions['gudlft']
+        with self.app.test_client() as client:
+            self.assertNotIn("gudlft_ledger_mismatches", client.get("/metrics").data.decode("utf-8"))
+            store.registry.find_club_by_name("Simply Lift").points = 3
+            store.booking.reconcile()
+            lines = client.get("/metrics").data.decode("utf-8").splitlines()
+        self.assertIn('gudlft_ledger_mismatches 1', lines)
+
+    def test__metrics__disabled(self):
+        app = server.create_app({'GUDLFT_METRICS': False})
+        with app.test_client() as client:
+            self.assertEqual(404, client.get("/metrics").status_code)
+            response = client.post("/showSummary", data={"email": "john@simplylift.co"}, follow_redirects=True)
+            self.assertEqual(200, response.status_code)
+
+
+if __name__ == "__main__":
+    unittest.main()
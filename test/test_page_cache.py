@@ -0,0 +1,100 @@
+import sys
+import unittest
+
+import server
+from page_cache import PageCache
+
+
+class PageCacheTester(unittest.TestCase):
+    def test__put__least_recently_used_evicted(self):
+        size = sys.getsizeof("page1") + sys.getsizeof("key1")
+        cache = PageCache(max_bytes=2 * size)
+        cache.put("key1", "page1")
+        cache.put("key2", "page2")
+        self.assertEqual("page1", cache.get("key1"))
+        cache.put("key3", "page3")
+
+        self.assertIsNone(cache.get("key2"))
+        self.assertEqual("page1", cache.get("key1"))
+        self.assertEqual("page3", cache.get("key3"))
+        self.assertEqual((3, 1, 1), (cache.hits, cache.misses, cache.evictions))
+        self.assertEqual(2 * size, cache.size)
+
+    def test__put__too_large_ignored(self):
+        cache = PageCache(max_bytes=100)
+        cache.put("key", "page" * 100)
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.size)
+
+
+class PageCacheRoutesTester(unittest.TestCase):
+    def setUp(self):
+        self.app = server.create_app()
+        self.cache = self.app.extensions['page_cache']
+
+    def test__show_summary__served_from_cache(self):
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            first = client.get("/showSummary").data
+            second = client.get("/showSummary").data
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.cache.hits)
+
+    def test__show_summary__per_club(self):
+        with self.app.test_client() as client, self.app.test_client() as other:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            other.post("/showSummary", data={"email": "admin@irontemple.com"})
+            client.get("/showSummary")
+            response = other.get("/showSummary")
+        self.assertIn("Welcome, admin@irontemple.com", response.data.decode("utf-8"))
+        self.assertEqual(0, self.cache.hits)
+
+    def test__clubs__shared_by_clubs(self):
+        with self.app.test_client() as client, self.app.test_client() as other:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            other.post("/showSummary", data={"email": "admin@irontemple.com"})
+            client.get("/clubs")
+            other.get("/clubs")
+        self.assertEqual(1, self.cache.hits)
+
+    def test__purchase_places__pages_involved_rendered_again(self):
+        """
+        Plot:
+            A club books places on Fall Classic, after another club displayed its booking pages
+        Result:
+            Only the booking page of Fall Classic is rendered again, showing the places left
+        """
+        with self.app.test_client() as client, self.app.test_client() as other:
+            other.post("/showSummary", data={"email": "john@simplylift.co"})
+            other.get("/book/Fall%20Classic/Simply%20Lift")
+            other.get("/book/Spring%20Festival/Simply%20Lift")
+            client.post("/showSummary", data={"email": "admin@irontemple.com"})
+            client.post("/purchasePlaces", data={"competition": "Fall Classic", "places": "1"})
+
+            hits, misses = self.cache.hits, self.cache.misses
+            other.get("/book/Spring%20Festival/Simply%20Lift")
+            response = other.get("/book/Fall%20Classic/Simply%20Lift")
+        self.assertEqual((hits + 1, misses + 1), (self.cache.hits, self.cache.misses))
+        self.assertIn("Places available: 12", response.data.decode("utf-8"))
+
+    def test__flashed_messages__not_cached(self):
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            client.get("/showSummary")
+            response = client.post(
+                "/purchasePlaces", data={"competition": "Fall Classic", "places": "1"}, follow_redirects=True
+            )
+            self.assertIn("Great-booking complete!", response.data.decode("utf-8"))
+            response = client.get("/showSummary")
+        self.assertNotIn("Great-booking complete!", response.data.decode("utf-8"))
+
+    def test__disabled(self):
+        app = server.create_app({'GUDLFT_PAGE_CACHE_BYTES': 0})
+        self.assertNotIn('page_cache', app.extensions)
+        with app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            self.assertEqual(200, client.get("/showSummary").status_code)
+
+
+if __name__ == "__main__":
+    unittest.main()
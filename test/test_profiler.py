@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import Mock
+
+import server
+from profiler import SamplingProfiler
+
+
+class SamplingProfilerTester(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = SamplingProfiler(self.directory, os.path.dirname(server.__file__), max_watched=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test__sample__collapsed_from_application_frame(self):
+        self.profiler.watched.add(threading.get_ident())
+        sampler = threading.Thread(target=self.profiler.sample)
+        sampler.start()
+        sampler.join()
+
+        (stack, count), = self.profiler.stacks.items()
+        self.assertEqual(1, count)
+        self.assertTrue(stack.startswith("test_profiler.py:test__sample__collapsed_from_application_frame;"))
+
+        path = self.profiler.roll()
+        with open(path) as profile:
+            self.assertEqual(f"{stack} 1\n", profile.read())
+        self.assertIsNone(self.profiler.roll())
+
+    def test__start__bounded(self):
+        self.profiler._thread = Mock()
+        self.assertTrue(self.profiler.start(1))
+        self.assertFalse(self.profiler.start(2))
+        self.profiler.stop(1)
+        self.assertTrue(self.profiler.start(2))
+
+
+class ProfilerTester(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def profiled_requests(self, headers, **config):
+        app = server.create_app({'GUDLFT_PROFILE_DIR': self.directory, **config})
+        sampler = app.extensions['profiler'].sampler = Mock()
+        with app.test_client() as client:
+            client.get("/", headers=headers)
+        return sampler.start.call_count, sampler.stop.call_count
+
+    def test__profile__header(self):
+        self.assertEqual((1, 1), self.profiled_requests({"X-Gudlft-Profile": "1"}))
+        self.assertEqual((0, 0), self.profiled_requests({}))
+
+    def test__profile__token(self):
+        config = {'GUDLFT_PROFILE_TOKEN': "secret"}
+        self.assertEqual((0, 0), self.profiled_requests({"X-Gudlft-Profile": "1"}, **config))
+        self.assertEqual((1, 1), self.profiled_requests({"X-Gudlft-Profile": "secret"}, **config))
+
+    def test__profile__rate(self):
+        self.assertEqual((1, 1), self.profiled_requests({}, GUDLFT_PROFILE_RATE=1.0))
+
+    def test__profile__disabled(self):
+        app = server.create_app()
+        self.assertNotIn('profiler', app.extensions)
+
+
+if __name__ == "__main__":
+    unittest.main()
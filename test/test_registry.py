@@ -0,0 +1,46 @@
+import datetime
+import unittest
+
+from entities import Club
+from entities import Competition
+from registry import Registry
+
+
+DATE = datetime.datetime(2100, 1, 1)
+
+
+class RegistryTester(unittest.TestCase):
+    def setUp(self):
+        self.clubs = [Club("club1", "club1@mail.com", 2), Club("club2", "club2@mail.com", 20)]
+        self.competitions = [Competition("competition1", DATE, 21), Competition("competition2", DATE, 22)]
+        self.registry = Registry(self.clubs, self.competitions)
+
+    def test__find__same_entities(self):
+        """
+        Indexes point to the entities of the loaded lists, not to copies
+        """
+        self.assertIs(self.clubs[1], self.registry.find_club_by_email("club2@mail.com"))
+        self.assertIs(self.clubs[0], self.registry.find_club_by_name("club1"))
+        self.assertIs(self.competitions[1], self.registry.find_competition("competition2"))
+
+    def test__find__unknown(self):
+        self.assertIsNone(self.registry.find_club_by_email("stuff@mail.com"))
+        self.assertIsNone(self.registry.find_club_by_name("stuff"))
+        self.assertIsNone(self.registry.find_competition("stuff"))
+
+    def test__update_club__reindexed(self):
+        club = self.clubs[0]
+        self.registry.update_club(club, points=1, email="new@mail.com")
+        self.assertEqual(1, self.clubs[0].points)
+        self.assertIsNone(self.registry.find_club_by_email("club1@mail.com"))
+        self.assertIs(club, self.registry.find_club_by_email("new@mail.com"))
+
+    def test__update_competition__reindexed(self):
+        competition = self.competitions[0]
+        self.registry.update_competition(competition, name="renamed", number_of_places=20)
+        self.assertIsNone(self.registry.find_competition("competition1"))
+        self.assertEqual(20, self.registry.find_competition("renamed").number_of_places)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+import server
+from entities import Competition
+from schedule import CompetitionSchedule
+from schedule import parse_date
+
+
+class CompetitionScheduleTester(unittest.TestCase):
+    def setUp(self):
+        self.competitions = [
+            Competition("competition3", datetime.datetime(2022, 3, 1), 10),
+            Competition("competition1", datetime.datetime(2022, 1, 1), 10),
+            Competition("competition2", datetime.datetime(2022, 2, 1), 10)
+        ]
+        self.schedule = CompetitionSchedule(self.competitions)
+
+    def test__parse_date(self):
+        self.assertEqual(datetime.datetime(2020, 3, 27, 10, 0), parse_date("2020-03-27 10:00:00"))
+
+    def test__split__at_boundary(self):
+        moment = datetime.datetime(2022, 2, 1)
+        self.assertEqual(["competition1"], [c.name for c in self.schedule.past(moment)])
+        self.assertEqual(["competition2", "competition3"], [c.name for c in self.schedule.upcoming(moment)])
+
+    def test__last_started(self):
+        self.assertIsNone(self.schedule.last_started(datetime.datetime(2022, 1, 1)))
+        self.assertEqual(datetime.datetime(2022, 2, 1), self.schedule.last_started(datetime.datetime(2022, 2, 15)))
+
+    def test__split__moves_with_time(self):
+        self.assertEqual(3, len(list(self.schedule.upcoming(datetime.datetime(2021, 1, 1)))))
+        self.assertEqual(3, len(self.schedule.past(datetime.datetime(2023, 1, 1))))
+
+
+class IsPastTester(unittest.TestCase):
+    def setUp(self):
+        self.app = server.create_app()
+
+    def test__show_summary__competition_becomes_past(self):
+        """
+        Plot:
+            A club looks at its summary before and after "New Competition" takes place
+        Result:
+            Its booking link disappears, without the server being restarted
+        """
+        with self.app.test_client() as client:
+            client.post("/showSummary", data={"email": "john@simplylift.co"})
+            with patch("server.now", return_value=datetime.datetime(2022, 12, 12, 13, 0)):
+                response = client.get("/showSummary")
+            self.assertIn(b"/book/New%20Competition/Simply%20Lift", response.data)
+
+            with patch("server.now", return_value=datetime.datetime(2022, 12, 12, 15, 0)):
+                response = client.get("/showSummary")
+            self.assertNotIn(b"/book/New%20Competition/Simply%20Lift", response.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from itsdangerous import URLSafeTimedSerializer
+
+import server
+
+
+class CookieSessionTester(unittest.TestCase):
+    def setUp(self):
+        self.app = server.create_app()
+        self.serializer = self.app.session_interface.get_signing_serializer(self.app)
+
+    def test__dumps__uncompressed(self):
+        session = {"club": "Simply Lift", "_flashes": [("message", "Great-booking complete!")] * 20}
+        cookie = self.serializer.dumps(session)
+        self.assertFalse(cookie.startswith("."))
+        self.assertEqual(session["club"], self.serializer.loads(cookie)["club"])
+
+    def test__loads__compressed(self):
+        """
+        Plot:
+            A browser sends a session cookie compressed the default way
+        Result:
+            The session is still read
+        """
+        compressing = URLSafeTimedSerializer(
+            self.app.secret_key,
+            salt=self.serializer.salt,
+            serializer=self.serializer.serializer,
+            signer_kwargs=self.serializer.signer_kwargs,
+        )
+        cookie = compressing.dumps({"club": "Simply Lift" * 20})
+        self.assertTrue(cookie.startswith("."))
+        self.assertEqual("Simply Lift" * 20, self.serializer.loads(cookie)["club"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import datetime
+import multiprocessing
+import random
+import unittest
+from unittest.mock import patch
+
+import booking
+from entities import Club
+from entities import Competition
+from listing import Page
+from shared import SharedBookingService
+from shared import SharedRegistry
+
+
+def book_in_worker(registry, seed, bookings, results):
+    """
+    Runs in a forked worker, with its own copy of the entities
+    """
+    # high enough for the counters to run out first
+    service = SharedBookingService(registry, places_max_limit=1000)
+    randomizer = random.Random(seed)
+    booked = 0
+    for _ in range(bookings):
+        club = registry.find_club_by_name(f"club{randomizer.randrange(6)}")
+        competition = registry.find_competition(f"competition{randomizer.randrange(3)}")
+        places = randomizer.randint(1, 4)
+        try:
+            service.purchase(club, competition, places)
+        except booking.BookingError:
+            continue
+        booked += places
+    results.put(booked)
+
+
+def book_one_by_one(registry, count, results):
+    service = SharedBookingService(registry)
+    booked = 0
+    for _ in range(count):
+        try:
+            service.purchase(registry.find_club_by_name("club0"), registry.find_competition("competition0"), 1)
+        except booking.OverMaxLimit:
+            continue
+        booked += 1
+    results.put(booked)
+
+
+class SharedRegistryTester(unittest.TestCase):
+    WORKERS = 4
+
+    def setUp(self):
+        self.clubs = [Club(f"club{i}", f"club{i}@mail.com", 100) for i in range(6)]
+        self.competitions = [Competition(f"competition{i}", datetime.datetime(2100, 1, 1), 150) for i in range(3)]
+        self.registry = SharedRegistry(self.clubs, self.competitions)
+
+    def test__update__visible_through_lookups(self):
+        service = SharedBookingService(self.registry)
+        service.purchase(self.registry.find_club_by_name("club0"), self.registry.find_competition("competition1"), 3)
+        self.assertEqual(97, self.registry.points[0])
+        self.assertEqual(147, self.registry.places[1])
+        self.clubs[0].points = -1
+        self.assertEqual(97, self.registry.find_club_by_email("club0@mail.com").points)
+        self.assertEqual(97, self.registry.clubs[0].points)
+
+    def test__page__only_items_shown_refreshed(self):
+        """
+        Plot:
+            Another process took points from club3, then the second page of 2 clubs and of 1 competition is read
+        Result:
+            Only the clubs and the competition of the pages are refreshed, club3 with its new points
+        """
+        self.registry.points[3] = 42
+        refresh_club = self.registry.refresh_club
+        refresh_competition = self.registry.refresh_competition
+        with patch.object(self.registry, "refresh_club", side_effect=refresh_club) as refreshed_clubs, \
+                patch.object(self.registry, "refresh_competition", side_effect=refresh_competition) as refreshed:
+            clubs = list(Page(self.registry.clubs, number=2, size=2))
+            competitions = list(Page(self.registry.competitions_by_date(), number=2, size=1))
+        self.assertEqual(["club2", "club3"], [club.name for club in clubs])
+        self.assertEqual(42, clubs[1].points)
+        self.assertEqual(2, refreshed_clubs.call_count)
+        self.assertEqual([self.competitions[1]], competitions)
+        self.assertEqual(1, refreshed.call_count)
+
+    def test__workers__totals_conserved(self):
+        """
+        Plot:
+            Several forked workers book concurrently on the same shared dataset
+        Result:
+            Points spent, places taken and places reported booked by the workers all match,
+            and no counter goes negative
+        """
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [
+            context.Process(target=book_in_worker, args=(self.registry, seed, 300, results))
+            for seed in range(self.WORKERS)
+        ]
+        for worker in workers:
+            worker.start()
+        booked = sum(results.get(timeout=30) for _ in workers)
+        for worker in workers:
+            worker.join()
+
+        points = list(self.registry.points)
+        places = list(self.registry.places)
+        self.assertTrue(all(value >= 0 for value in points + places))
+        self.assertEqual(booked, 600 - sum(points))
+        self.assertEqual(booked, 450 - sum(places))
+        # the workers together ask for far more than is available
+        self.assertEqual(450, booked)
+
+    def test__workers__max_limit_shared(self):
+        """
+        Plot:
+            Four forked workers each book 1 place 10 times for club0 on competition0
+        Result:
+            12 places are booked in all, the max limit, and the club holds them in this process too
+        """
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [context.Process(target=book_one_by_one, args=(self.registry, 10, results)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        booked = sum(results.get(timeout=30) for _ in workers)
+        for worker in workers:
+            worker.join()
+        service = SharedBookingService(self.registry)
+        club = self.registry.find_club_by_name("club0")
+        self.assertEqual(12, booked)
+        self.assertEqual(88, club.points)
+        self.assertEqual({"competition0": 12}, service.holdings(club))
+        with self.assertRaises(booking.OverMaxLimit):
+            service.purchase(club, self.registry.find_competition("competition0"), 1)
+
+    def test__held__pairs_kept_apart(self):
+        service = SharedBookingService(self.registry)
+        for club, competition in [("club0", "competition0"), ("club5", "competition2"), ("club0", "competition2")]:
+            service.purchase(self.registry.find_club_by_name(club), self.registry.find_competition(competition), 2)
+        service.cancel(
+            self.registry.find_club_by_name("club0"), self.registry.find_competition("competition0"), 1
+        )
+        self.assertEqual(1, self.registry.held("club0", "competition0"))
+        self.assertEqual(2, self.registry.held("club0", "competition2"))
+        self.assertEqual(0, self.registry.held("club5", "competition0"))
+        self.assertEqual(
+            {"competition0": 1, "competition2": 2}, service.holdings(self.registry.find_club_by_name("club0"))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
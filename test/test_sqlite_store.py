@@ -0,0 +1,135 @@
+import datetime
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+import booking
+import server
+from sqlite_store import SqliteBookingService
+from sqlite_store import SqliteRegistry
+
+
+def book_in_process(path, bookings):
+    registry = SqliteRegistry(path)
+    service = SqliteBookingService(registry)
+    booked = 0
+    for booking_number in range(bookings):
+        club = registry.find_club_by_name("Simply Lift")
+        competition = registry.find_competition(("Spring Festival", "Fall Classic")[booking_number % 2])
+        try:
+            service.purchase(club, competition, 1)
+        except booking.BookingError:
+            continue
+        booked += 1
+    return booked
+
+
+class SqliteStoreTester(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "gudlft.db")
+        self.registry = SqliteRegistry(self.path)
+        self.registry.import_json(server.load_clubs(), server.load_competitions())
+        self.service = SqliteBookingService(self.registry)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test__import_json__same_entities(self):
+        self.assertEqual(server.load_clubs(), self.registry.clubs)
+        self.assertEqual(server.load_competitions(), self.registry.competitions)
+        self.assertEqual("Iron Temple", self.registry.find_club_by_email("admin@irontemple.com").name)
+        self.assertIsNone(self.registry.find_club_by_email("stuff@mail.com"))
+        self.assertIsNone(self.registry.find_competition("stuff"))
+
+    def test__last_started(self):
+        self.assertIsNone(self.registry.last_started(datetime.datetime(2020, 3, 27, 10, 0)))
+        self.assertEqual(
+            datetime.datetime(2020, 10, 22, 13, 30),
+            self.registry.last_started(datetime.datetime(2021, 1, 1))
+        )
+
+    def test__purchase__counters_updated(self):
+        club = self.registry.find_club_by_name("Simply Lift")
+        competition = self.registry.find_competition("Spring Festival")
+        self.service.purchase(club, competition, 3)
+        self.assertEqual(11, club.points)
+        self.assertEqual(22, competition.number_of_places)
+        self.assertEqual(11, self.registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(22, self.registry.find_competition("Spring Festival").number_of_places)
+
+    def test__purchase__rejected_and_rolled_back(self):
+        club = self.registry.find_club_by_name("Iron Temple")
+        competition = self.registry.find_competition("Spring Festival")
+        with self.assertRaisesRegex(booking.NotEnoughPoints, r"\(4\)"):
+            self.service.purchase(club, competition, 5)
+        with self.assertRaises(booking.OverMaxLimit):
+            self.service.purchase(self.registry.find_club_by_name("Simply Lift"), competition, 13)
+        with self.assertRaises(booking.NotEnoughPlaces):
+            self.service.purchase(self.registry.find_club_by_name("Simply Lift"), competition, 26)
+        self.assertEqual(4, self.registry.find_club_by_name("Iron Temple").points)
+        self.assertEqual(14, self.registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(25, self.registry.find_competition("Spring Festival").number_of_places)
+
+    def test__purchase_many__rejected_bookings_rolled_back(self):
+        version = self.registry.data_version
+        competition = self.registry.find_competition("Spring Festival")
+        results = self.service.purchase_many([
+            (self.registry.find_club_by_name("Iron Temple"), competition, 3),
+            (self.registry.find_club_by_name("Iron Temple"), competition, 3),
+            (self.registry.find_club_by_name("She Lifts"), competition, 12),
+        ])
+        self.assertEqual("committed", results[0].state)
+        self.assertIsInstance(results[1], booking.NotEnoughPoints)
+        self.assertEqual("committed", results[2].state)
+        self.assertEqual(1, self.registry.find_club_by_name("Iron Temple").points)
+        self.assertEqual(10, self.registry.find_competition("Spring Festival").number_of_places)
+        self.assertNotEqual(version, self.registry.data_version)
+
+    def test__purchase__max_limit_across_bookings(self):
+        club = self.registry.find_club_by_name("Simply Lift")
+        competition = self.registry.find_competition("Spring Festival")
+        self.service.purchase(club, competition, 8)
+        with self.assertRaisesRegex(booking.OverMaxLimit, "8 places already booked"):
+            self.service.purchase(club, competition, 5)
+        self.service.reserve(club, competition, 4).cancel()
+        self.assertEqual({"Spring Festival": 8}, self.service.holdings(club))
+        self.assertEqual([8, 4, -4], [entry.places for entry in self.service.ledger.history("Simply Lift")])
+        self.assertEqual(6, self.registry.find_club_by_name("Simply Lift").points)
+
+    def test__cancel__negative_places_refused(self):
+        club = self.registry.find_club_by_name("Simply Lift")
+        competition = self.registry.find_competition("Spring Festival")
+        self.service.purchase(club, competition, 2)
+        with self.assertRaises(booking.InvalidPlaces):
+            self.service.cancel(club, competition, -4, moment=datetime.datetime(2020, 1, 1))
+        with self.assertRaises(booking.InvalidPlaces):
+            self.service.purchase(club, competition, -4)
+        self.assertEqual(12, self.registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(23, self.registry.find_competition("Spring Festival").number_of_places)
+
+    def test__purchase__shared_between_processes(self):
+        """
+        Plot:
+            Four processes book one place at a time from the same club, on two competitions in turn
+        Result:
+            The club spends exactly its 14 points, whatever the interleaving,
+            without holding more than 12 places on a competition
+        """
+        with multiprocessing.get_context("spawn").Pool(4) as pool:
+            booked = sum(pool.starmap(book_in_process, [(self.path, 10)] * 4))
+        self.assertEqual(14, booked)
+        self.assertEqual(0, self.registry.find_club_by_name("Simply Lift").points)
+        holdings = self.service.holdings(self.registry.find_club_by_name("Simply Lift"))
+        self.assertEqual(14, sum(holdings.values()))
+        self.assertTrue(all(places <= booking.PLACES_MAX_LIMIT for places in holdings.values()))
+        places_left = self.registry.find_competition("Spring Festival").number_of_places
+        places_left += self.registry.find_competition("Fall Classic").number_of_places
+        self.assertEqual(25 + 13 - 14, places_left)
+        self.assertEqual(14, len(self.service.ledger.history("Simply Lift")))
+        self.assertEqual([], self.service.reconcile())
+
+
+if __name__ == "__main__":
+    unittest.main()
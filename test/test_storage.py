@@ -0,0 +1,140 @@
+import datetime
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import server
+from booking import BookingService
+from entities import Club
+from entities import Competition
+from ledger import Ledger
+from registry import Registry
+from storage import WalStorage
+from storage import WriteAheadLog
+
+
+class WalStorageTester(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def start(self, **options):
+        """
+        Loads the data the way the server does at startup
+        """
+        storage = WalStorage(self.directory.name, **options)
+        clubs_path, competitions_path = storage.snapshot_paths()
+        registry = Registry(server.load_clubs(clubs_path), server.load_competitions(competitions_path))
+        ledger = Ledger()
+        storage.replay(registry, ledger)
+        return storage, registry, BookingService(registry, storage, ledger=ledger)
+
+    def test__restart__bookings_replayed(self):
+        storage, registry, service = self.start()
+        service.purchase(registry.find_club_by_name("Simply Lift"), registry.find_competition("Spring Festival"), 2)
+        service.purchase(registry.find_club_by_name("Iron Temple"), registry.find_competition("Spring Festival"), 1)
+        storage.close()
+
+        storage, registry, _ = self.start()
+        self.assertEqual(12, registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(3, registry.find_club_by_name("Iron Temple").points)
+        self.assertEqual(22, registry.find_competition("Spring Festival").number_of_places)
+        storage.close()
+
+    def test__restart__cancellation_replayed(self):
+        storage, registry, service = self.start()
+        club = registry.find_club_by_name("Simply Lift")
+        service.reserve(club, registry.find_competition("Fall Classic"), 2).cancel()
+        storage.close()
+
+        storage, registry, _ = self.start()
+        self.assertEqual(14, registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(13, registry.find_competition("Fall Classic").number_of_places)
+        storage.close()
+
+    def test__restart__torn_record_ignored(self):
+        storage, registry, service = self.start()
+        service.purchase(registry.find_club_by_name("Simply Lift"), registry.find_competition("Spring Festival"), 2)
+        storage.close()
+        with open(storage.log.path, 'ab') as log:
+            log.write(b'{"club":"Simply Lift","compe')
+
+        storage, registry, _ = self.start()
+        self.assertEqual(12, registry.find_club_by_name("Simply Lift").points)
+        storage.close()
+
+    def test__restart__booking_of_removed_club_skipped(self):
+        """
+        Plot:
+            The log holds a booking of a club no longer in the JSON files, between two bookings of Simply Lift
+        Result:
+            It is skipped with a warning, the bookings of Simply Lift are replayed
+        """
+        storage, registry, service = self.start()
+        service.purchase(registry.find_club_by_name("Simply Lift"), registry.find_competition("Spring Festival"), 1)
+        storage.record_booking("Closed Club", "Spring Festival", 2)
+        service.purchase(registry.find_club_by_name("Simply Lift"), registry.find_competition("Spring Festival"), 1)
+        storage.close()
+
+        with self.assertLogs("storage", "WARNING") as logs:
+            storage, registry, _ = self.start()
+        self.assertEqual(12, registry.find_club_by_name("Simply Lift").points)
+        self.assertEqual(23, registry.find_competition("Spring Festival").number_of_places)
+        self.assertIn("Closed Club", logs.output[0])
+        storage.close()
+
+    def test__compact__snapshot_replaces_log(self):
+        storage, registry, service = self.start()
+        service.purchase(registry.find_club_by_name("Simply Lift"), registry.find_competition("Spring Festival"), 2)
+        service.compact()
+        service.purchase(registry.find_club_by_name("Simply Lift"), registry.find_competition("Spring Festival"), 1)
+        storage.close()
+        self.assertEqual(["bookings.00000001.wal", "snapshot.json"], sorted(os.listdir(self.directory.name)))
+
+        storage, registry, _ = self.start()
+        self.assertEqual(11, registry.find_club_by_name("Simply Lift").points)
+        competition = registry.find_competition("Spring Festival")
+        self.assertEqual(22, competition.number_of_places)
+        self.assertEqual(datetime.datetime(2020, 3, 27, 10, 0), competition.date)
+        storage.close()
+
+    def test__restart__places_held_kept_through_compaction(self):
+        """
+        Plot:
+            Simply Lift books 2 places, the log is compacted, it books 1 more, then the server restarts
+        Result:
+            The ledger holds the 3 places, from the snapshot and the log, and agrees with the counters
+        """
+        storage, registry, service = self.start()
+        service.purchase(registry.find_club_by_name("Simply Lift"), registry.find_competition("Spring Festival"), 2)
+        service.compact()
+        service.purchase(registry.find_club_by_name("Simply Lift"), registry.find_competition("Spring Festival"), 1)
+        storage.close()
+
+        storage, registry, service = self.start()
+        club = registry.find_club_by_name("Simply Lift")
+        self.assertEqual({"Spring Festival": 3}, service.holdings(club))
+        self.assertEqual([], service.reconcile())
+        storage.close()
+
+    def test__group_commit__every_booking_logged(self):
+        storage, registry, service = self.start()
+        clubs = [Club(f"club{i}", f"club{i}@mail.com", 100) for i in range(32)]
+        competitions = [Competition(f"competition{i}", datetime.datetime(2030, 1, 1), 100) for i in range(8)]
+        registry.load(clubs, competitions)
+
+        def book(i):
+            # at most 7 places per club and competition, under the max limit
+            service.purchase(clubs[i % 32], competitions[i % 8], 1)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(book, range(200)))
+        storage.close()
+        self.assertEqual(200, len(list(WriteAheadLog.read(storage.log.path))))
+
+
+if __name__ == "__main__":
+    unittest.main()
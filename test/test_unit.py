@@ -4,6 +4,8 @@ from unittest.mock import patch
 from unittest.mock import mock_open
 
 import server
+from entities import Club
+from entities import Competition
 
 
 class ServerTester(unittest.TestCase):
@@ -29,16 +31,8 @@ class ServerTester(unittest.TestCase):
     @patch("builtins.open", new_callable=mock_open, read_data=CLUBS)
     def test__load_clubs(self, _):
         expected_output = [
-            {
-                "name": "club1",
-                "email": "club1@mail.com",
-                "points": "2"
-            },
-            {
-                "name": "club2",
-                "email": "club2@mail.com",
-                "points": "20"
-            }
+            Club("club1", "club1@mail.com", 2),
+            Club("club2", "club2@mail.com", 20)
         ]
         output = server.load_clubs()
         self.assertEqual(expected_output, output)
@@ -67,26 +61,9 @@ class ServerTester(unittest.TestCase):
     @patch("builtins.open", new_callable=mock_open, read_data=COMPETITIONS)
     def test__load_competitions(self, _):
         expected_output = [
-            {
-                "name": "competition1",
-                "date": datetime.datetime(2020, 3, 27, 10, 0),
-                "numberOfPlaces": "21",
-                "is_past": True
-            },
-            {
-
-                "name": "competition2",
-                "date": datetime.datetime(2020, 4, 27, 11, 0),
-                "numberOfPlaces": "22",
-                "is_past": True
-        },
-            {
-
-                "name": "competition2",
-                "date": datetime.datetime(2022, 12, 27, 11, 0),
-                "numberOfPlaces": "23",
-                "is_past": False
-        }
+            Competition("competition1", datetime.datetime(2020, 3, 27, 10, 0), 21),
+            Competition("competition2", datetime.datetime(2020, 4, 27, 11, 0), 22),
+            Competition("competition2", datetime.datetime(2022, 12, 27, 11, 0), 23)
         ]
         output = server.load_competitions()
         self.assertEqual(expected_output, output)
@@ -0,0 +1,80 @@
+import threading
+import unittest
+
+from waitlist import Waitlist
+from waitlist import WaitlistAllocator
+
+
+class WaitlistTester(unittest.TestCase):
+    def setUp(self):
+        self.waitlist = Waitlist()
+
+    def test__head__first_come_first_served(self):
+        first = self.waitlist.join("club1", "competition1", 2)
+        self.waitlist.join("club2", "competition1", 3)
+        self.waitlist.join("club3", "competition2", 1)
+        self.assertIs(first, self.waitlist.head("competition1"))
+        self.assertEqual(2, self.waitlist.waiting("competition1"))
+        self.waitlist.allocate(first, 1)
+        self.assertIs(first, self.waitlist.head("competition1"))
+        self.assertEqual(1, first.places)
+        self.waitlist.allocate(first, 1)
+        self.assertEqual("allocated", first.state)
+        self.assertEqual(2, first.allocated)
+        self.assertEqual("club2", self.waitlist.head("competition1").club)
+        self.assertEqual(1, self.waitlist.waiting("competition1"))
+
+    def test__join__again_adds_places_keeping_the_turn(self):
+        self.waitlist.join("club1", "competition1", 2)
+        self.waitlist.join("club2", "competition1", 1)
+        entry = self.waitlist.join("club1", "competition1", 3)
+        self.assertEqual(5, entry.places)
+        self.assertIs(entry, self.waitlist.head("competition1"))
+        self.assertEqual(5, self.waitlist.waiting_for("club1", "competition1"))
+
+    def test__leave__skipped_at_the_head(self):
+        self.waitlist.join("club1", "competition1", 2)
+        self.waitlist.join("club2", "competition1", 1)
+        self.waitlist.join("club3", "competition1", 1)
+        self.assertEqual("left", self.waitlist.leave("club2", "competition1").state)
+        self.assertIsNone(self.waitlist.leave("club2", "competition1"))
+        self.waitlist.reject(self.waitlist.head("competition1"))
+        self.assertEqual("club3", self.waitlist.head("competition1").club)
+        self.assertEqual(1, self.waitlist.waiting("competition1"))
+        self.assertEqual({}, self.waitlist.entries("club2"))
+        self.assertEqual(["competition1"], list(self.waitlist.entries("club3")))
+
+
+class WaitlistAllocatorTester(unittest.TestCase):
+    def test__released__allocated_in_order_by_one_thread(self):
+        allocated = []
+        threads = set()
+
+        def allocate(competition_name):
+            allocated.append(competition_name)
+            threads.add(threading.current_thread().name)
+
+        allocator = WaitlistAllocator(allocate)
+        for name in ("competition1", "competition2", "competition1"):
+            allocator.released(name)
+        allocator.join()
+        self.assertEqual(["competition1", "competition2", "competition1"], allocated)
+        self.assertEqual({"gudlft-waitlist"}, threads)
+        # started again by the next release
+        allocator.released("competition3")
+        allocator.join()
+        self.assertEqual("competition3", allocated[-1])
+
+    def test__failure_logged(self):
+        def allocate(competition_name):
+            raise ValueError(competition_name)
+
+        allocator = WaitlistAllocator(allocate)
+        with self.assertLogs('waitlist', 'ERROR') as logs:
+            allocator.released("competition1")
+            allocator.join()
+        self.assertIn("Allocating the places released on competition1 failed", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
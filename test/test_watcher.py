@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from watcher import FileWatcher
+
+
+class FileWatcherTester(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'clubs.json')
+        with open(self.path, 'w') as source:
+            source.write('{"clubs": []}')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test__poll__reports_changed_files_once(self):
+        callback = Mock()
+        watcher = FileWatcher([self.path], callback)
+        self.assertEqual([], watcher.poll())
+
+        with open(self.path, 'w') as source:
+            source.write('{"clubs": [{}]}')
+        self.assertEqual([self.path], watcher.poll())
+        self.assertEqual([], watcher.poll())
+        callback.assert_called_once_with([self.path])
+
+    def test__poll__ignores_missing_file(self):
+        watcher = FileWatcher([self.path], Mock())
+        os.remove(self.path)
+        self.assertEqual([], watcher.poll())
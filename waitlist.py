@@ -0,0 +1,154 @@
+import collections
+import logging
+import queue
+import threading
+import time
+
+from entities import Entity
+
+
+logger = logging.getLogger(__name__)
+
+
+class WaitlistEntry(Entity):
+    """
+    Places a club waits for on a competition; state is 'waiting', 'allocated', 'left' or 'rejected'
+    """
+
+    __slots__ = ('club', 'competition', 'places', 'allocated', 'time', 'state')
+
+    def __init__(self, club, competition, places, allocated=0, time=None, state='waiting'):
+        self.club = club
+        self.competition = competition
+        self.places = places
+        self.allocated = allocated
+        self.time = time
+        self.state = state
+
+
+class Waitlist:
+    """
+    Clubs waiting for places on competitions, first come first served per competition.
+
+    Each competition has a queue of entries, and every waiting entry is also
+    indexed by club, so that joining, leaving and allocating the head of a
+    queue are constant time. An entry left is only marked so, and skipped
+    once it reaches the head.
+
+    The booking service changes the entries of a competition while holding
+    its lock. waiting() only reads a count, and may be called without it.
+    """
+
+    def __init__(self):
+        self._queues = {}
+        self._waiting = {}
+        self._counts = {}
+
+    def join(self, club_name, competition_name, places):
+        """
+        Puts the club at the end of the queue, or adds the places to its entry when already waiting
+        """
+        entry = self._waiting.get(club_name, {}).get(competition_name)
+        if entry is not None:
+            entry.places += places
+            return entry
+        entry = WaitlistEntry(club_name, competition_name, places, time=time.time())
+        self._queues.setdefault(competition_name, collections.deque()).append(entry)
+        self._waiting.setdefault(club_name, {})[competition_name] = entry
+        self._counts[competition_name] = self._counts.get(competition_name, 0) + 1
+        return entry
+
+    def leave(self, club_name, competition_name):
+        entry = self._waiting.get(club_name, {}).get(competition_name)
+        if entry is not None:
+            self._remove(entry, 'left')
+        return entry
+
+    def head(self, competition_name):
+        """
+        First entry still waiting on the competition, or None
+        """
+        entries = self._queues.get(competition_name)
+        while entries:
+            if entries[0].state == 'waiting':
+                return entries[0]
+            entries.popleft()
+        return None
+
+    def waiting(self, competition_name):
+        """
+        Number of clubs waiting on the competition
+        """
+        return self._counts.get(competition_name, 0)
+
+    def allocate(self, entry, places):
+        """
+        Counts places as booked for the entry, which leaves the queue once it has them all
+        """
+        entry.places -= places
+        entry.allocated += places
+        if not entry.places:
+            self._remove(entry, 'allocated')
+
+    def reject(self, entry):
+        self._remove(entry, 'rejected')
+
+    def _remove(self, entry, state):
+        del self._waiting[entry.club][entry.competition]
+        self._counts[entry.competition] -= 1
+        entry.state = state
+        entries = self._queues.get(entry.competition)
+        if entries and entries[0] is entry:
+            entries.popleft()
+
+    def entries(self, club_name):
+        """
+        Entries the club waits on, per competition name
+        """
+        return dict(self._waiting.get(club_name, {}))
+
+    def waiting_for(self, club_name, competition_name):
+        entry = self._waiting.get(club_name, {}).get(competition_name)
+        return entry.places if entry is not None else 0
+
+
+class WaitlistAllocator:
+    """
+    Thread allocating the places released on competitions to their waitlist, in the order they were released.
+
+    Request threads only put the competition in a queue. The thread is
+    started with the first release, and again after a fork, threads not
+    surviving it.
+    """
+
+    def __init__(self, allocate):
+        self.allocate = allocate
+        self._released = queue.SimpleQueue()
+        self._thread = None
+        self._starting = threading.Lock()
+
+    def released(self, competition_name):
+        self._released.put(competition_name)
+        if self._thread is None or not self._thread.is_alive():
+            with self._starting:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='gudlft-waitlist', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            competition_name = self._released.get()
+            if competition_name is None:
+                return
+            try:
+                self.allocate(competition_name)
+            except Exception:
+                logger.exception("Allocating the places released on %s failed", competition_name)
+
+    def join(self):
+        """
+        Waits for the places released so far to be allocated, then stops the thread
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._released.put(None)
+            self._thread.join()
@@ -0,0 +1,54 @@
+import logging
+import threading
+
+from dataset_cache import stamp
+
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatcher(threading.Thread):
+    """
+    Polls the modification time and size of files, calling back with the paths that changed.
+
+    Polling keeps it portable and dependency free; with the intervals used
+    here, one stat per file per second, it costs nothing measurable.
+    """
+
+    def __init__(self, paths, callback, interval=1.0):
+        super().__init__(name='gudlft-watcher', daemon=True)
+        self.paths = list(paths)
+        self.callback = callback
+        self.interval = interval
+        self.stamps = {path: self._stamp(path) for path in self.paths}
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            return stamp(path)
+        except OSError:
+            # being replaced by an editor, seen again at the next poll
+            return None
+
+    def poll(self):
+        changed = []
+        for path in self.paths:
+            current = self._stamp(path)
+            if current is not None and current != self.stamps[path]:
+                self.stamps[path] = current
+                changed.append(path)
+        if changed:
+            self.callback(changed)
+        return changed
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                # a half-written file must not stop the watcher, finishing the write changes it again
+                logger.exception("Reloading %s failed", ', '.join(self.paths))
+
+    def stop(self):
+        self._stopped.set()